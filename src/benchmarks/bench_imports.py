@@ -0,0 +1,125 @@
+"""benchmark of the cold start of the app and of the worker pool.
+Imports each entry module in a fresh interpreter with -X importtime and times the
+worker pool start up to the first answer, then fails when the median of any of
+them is over its budget, so that a heavy module imported at load time is caught.
+
+usage: python -m benchmarks.bench_imports --repeat 5 --budget niveshak=1500
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+# milliseconds, the medians of a 1 CPU container with some head room.
+BUDGETS = {"niveshak": 1500, "lib.scanner": 1200, "worker_pool": 2000}
+WORKER_POOL = "worker_pool"
+
+
+def import_time(module):
+    """return the cumulative import time of the module and of its direct imports, in
+    milliseconds."""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # "import time: self [us] | cumulative | imported package", the imports of a
+    # module listed before it, one level deeper.
+    children = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1:
+            children[name.strip()] = int(cumulative) / 1000
+        elif depth == 0 and name.strip() == module:
+            return int(cumulative) / 1000, children
+        elif depth == 0:
+            # the interpreter start up.
+            children = {}
+    raise ValueError(f"no import time of '{module}'.")
+
+
+def spin_up_time():
+    """return the milliseconds from starting the worker pool to a worker answering."""
+    completed = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_imports", "--spin-up"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(completed.stdout.split()[-1])
+
+
+def spin_up():
+    """start a worker pool of one worker in this fresh process and print the time."""
+    start = time.perf_counter()
+    from lib.worker_pool import WorkerPool, ping
+
+    pool = WorkerPool(size=1)
+    pool.acquire().submit(ping).result()
+    print(f"{(time.perf_counter() - start) * 1000:.1f}")
+    pool.shutdown()
+
+
+def parse_budgets(texts):
+    budgets = dict(BUDGETS)
+    for text in texts:
+        name, _, value = text.partition("=")
+        if name not in budgets or not value:
+            raise argparse.ArgumentTypeError(f"unknown budget '{text}'.")
+        budgets[name] = float(value)
+    return budgets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--budget",
+        nargs="+",
+        default=[],
+        help=f"name=milliseconds, of {', '.join(BUDGETS)}.",
+    )
+    parser.add_argument("--top", type=int, default=5, help="heaviest imports shown.")
+    # the pool start up, run by the benchmark in a child interpreter.
+    parser.add_argument("--spin-up", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.spin_up:
+        spin_up()
+        return
+    try:
+        budgets = parse_budgets(args.budget)
+    except argparse.ArgumentTypeError as err:
+        parser.error(str(err))
+
+    over = []
+    for name, budget in budgets.items():
+        children = {}
+        if name == WORKER_POOL:
+            samples = [spin_up_time() for _ in range(args.repeat)]
+        else:
+            samples = []
+            for _ in range(args.repeat):
+                total, children = import_time(name)
+                samples.append(total)
+        median = statistics.median(samples)
+        status = "ok"
+        if median > budget:
+            status = "OVER BUDGET"
+            over.append(name)
+        print(f"{name:>12}: {median:9.1f} ms, budget {budget:9.1f} ms  {status}")
+        heaviest = sorted(children.items(), key=lambda item: -item[1])[: args.top]
+        for child, millis in heaviest:
+            print(f"{'':>14}{child:<40} {millis:9.1f} ms")
+    if over:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
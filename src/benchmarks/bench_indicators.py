@@ -0,0 +1,166 @@
+"""micro-benchmark of the indicator computation.
+Compares the reference per-indicator talib calls, as the scan used to make them,
+against the indicator engine, both per symbol and over a stacked price matrix, and against peeking at a new bar with
+the incremental indicator state.
+
+usage: python -m benchmarks.bench_indicators --symbols 500 --bars 125
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from constants.stocks import NSE
+from lib.incremental import IncrementalIndicators
+from lib.indicators import IndicatorEngine
+
+
+def random_histories(symbols, bars, seed=0):
+    """return random walk OHLC frames, one per symbol."""
+    rng = np.random.default_rng(seed)
+    histories = []
+    for _ in range(symbols):
+        close = 100 + rng.standard_normal(bars).cumsum()
+        spread = np.abs(rng.standard_normal(bars))
+        histories.append(
+            pd.DataFrame(
+                {
+                    NSE.YF_HISTCOL_HIGH: close + spread,
+                    NSE.YF_HISTCOL_LOW: close - spread,
+                    NSE.YF_HISTCOL_CLOSE: close,
+                }
+            )
+        )
+    return histories
+
+
+def stock_rsi(history):
+    import talib
+
+    rsi_data = talib.RSI(history[NSE.YF_HISTCOL_CLOSE], int(NSE.DEFAULT_TIMEPERIOD))
+    return round(float(rsi_data.iloc[-1]), 2)
+
+
+def stock_bollinger_bands(history):
+    import talib
+
+    bband_data = talib.BBANDS(history[NSE.YF_HISTCOL_CLOSE], 20)
+    return [round(float(bb_data.iloc[-1]), 2) for bb_data in bband_data]
+
+
+def stock_adx(history):
+    import talib
+
+    adx_data = talib.ADX(
+        high=history[NSE.YF_HISTCOL_HIGH],
+        low=history[NSE.YF_HISTCOL_LOW],
+        close=history[NSE.YF_HISTCOL_CLOSE],
+        timeperiod=int(NSE.ADX_TIMEPERIOD),
+    )
+    return round(float(adx_data.iloc[-1]), 2)
+
+
+def stock_stochastic(history):
+    import talib
+
+    stoch_data = talib.STOCH(
+        high=history[NSE.YF_HISTCOL_HIGH],
+        low=history[NSE.YF_HISTCOL_LOW],
+        close=history[NSE.YF_HISTCOL_CLOSE],
+        fastk_period=10,
+    )
+    return [round(float(st_data.iloc[-1]), 2) for st_data in stoch_data]
+
+
+def stock_ema(history):
+    import talib
+
+    ema_data = talib.EMA(history[NSE.YF_HISTCOL_CLOSE], timeperiod=20)
+    return round(float(ema_data.iloc[-1]), 2)
+
+
+def per_method(histories):
+    """one talib call per indicator value, the bands and the stochastic per use."""
+    for history in histories:
+        stock_rsi(history)
+        stock_adx(history)
+        stock_bollinger_bands(history)
+        stock_bollinger_bands(history)
+        stock_bollinger_bands(history)
+        stock_stochastic(history)
+        stock_stochastic(history)
+        stock_ema(history)
+
+
+def engine_per_symbol(histories):
+    engine = IndicatorEngine()
+    for history in histories:
+        engine.compute_frame(
+            history, NSE.YF_HISTCOL_HIGH, NSE.YF_HISTCOL_LOW, NSE.YF_HISTCOL_CLOSE
+        )
+
+
+def engine_matrix(matrices):
+    IndicatorEngine().compute_matrix(*matrices)
+
+
+def incremental_peek(states):
+    for state, bar in states:
+        state.peek(*bar)
+
+
+def timed(func, arg, repeat):
+    """return the best wall time in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=125)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    histories = random_histories(args.symbols, args.bars)
+    matrices = [
+        np.vstack([history[col].to_numpy() for history in histories])
+        for col in (NSE.YF_HISTCOL_HIGH, NSE.YF_HISTCOL_LOW, NSE.YF_HISTCOL_CLOSE)
+    ]
+
+    # seeded once from the history, the new bar is the latest one again.
+    states = [
+        (
+            IncrementalIndicators.from_history(
+                history, NSE.YF_HISTCOL_HIGH, NSE.YF_HISTCOL_LOW, NSE.YF_HISTCOL_CLOSE
+            ),
+            tuple(
+                float(history[col].iloc[-1])
+                for col in (
+                    NSE.YF_HISTCOL_HIGH,
+                    NSE.YF_HISTCOL_LOW,
+                    NSE.YF_HISTCOL_CLOSE,
+                )
+            ),
+        )
+        for history in histories
+    ]
+
+    print(f"{args.symbols} symbols x {args.bars} bars, best of {args.repeat}")
+    for name, func, arg in (
+        ("per method", per_method, histories),
+        ("engine per symbol", engine_per_symbol, histories),
+        ("engine matrix", engine_matrix, matrices),
+        ("incremental peek", incremental_peek, states),
+    ):
+        print(f"{name:>20}: {timed(func, arg, args.repeat):9.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
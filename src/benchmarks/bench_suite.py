@@ -0,0 +1,350 @@
+"""benchmark suite over the replay data provider.
+Runs the watchlist scan end to end, the indicator computation, the display frame
+assembly and the watchlist loading at several watchlist sizes, each case in a fresh
+interpreter, and saves the throughput, latency percentiles and peak RSS as JSON.
+
+usage: python -m benchmarks.bench_suite --sizes 10 100 500 2000 --baseline old.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from constants.config import Configuration, FetchBackend, ReplayMode
+from constants.stocks import NSE, RawInfoKeysYF
+from lib.indicators import IndicatorEngine
+from lib.nifty import Nifty
+from lib.replay import ReplayProvider
+from lib.scanner import Scanner
+from lib.wathclists import Watchlists
+from lib.worker_pool import WorkerPool
+from niveshak import Niveshak
+
+CASES = ["scan", "indicators", "arrange", "watchlists"]
+LIST_SIZE = 50
+
+
+def synthetic_fixtures(fixtures_dir, symbols, bars=125, seed=0):
+    """record random walk quotes and OHLCV history of the symbols as yfinance fixtures."""
+    rng = np.random.default_rng(seed)
+    replay = ReplayProvider(fixtures_dir, Configuration.LIVE_DATA_LIB, latency=0)
+    dates = pd.bdate_range(end=datetime.date.today(), periods=bars, tz="Asia/Kolkata")
+    for symbol in symbols:
+        close = 100 + rng.standard_normal(bars).cumsum()
+        spread = np.abs(rng.standard_normal(bars))
+        history = pd.DataFrame(
+            {
+                NSE.YF_HISTCOL_OPEN: close + rng.uniform(-1, 1, bars) * spread,
+                NSE.YF_HISTCOL_HIGH: close + spread,
+                NSE.YF_HISTCOL_LOW: close - spread,
+                NSE.YF_HISTCOL_CLOSE: close,
+                NSE.YF_HISTCOL_VOLUME: rng.integers(1e4, 1e6, bars).astype(float),
+            },
+            index=dates.rename(NSE.YF_HISTCOL_SORTER),
+        )
+        replay.record_history(symbol, history)
+        replay.record_quotes(
+            symbol,
+            {
+                RawInfoKeysYF.LAST_PRICE: close[-1],
+                RawInfoKeysYF.LAST_CLOSE: close[-2],
+                RawInfoKeysYF.INTRADAY_HIGH: close[-1] + spread[-1],
+                RawInfoKeysYF.INTRADAY_LOW: close[-1] - spread[-1],
+                RawInfoKeysYF.NAME: f"{symbol} Limited",
+                RawInfoKeysYF.YEAR_HIGH: close.max(),
+                RawInfoKeysYF.YEAR_LOW: close.min(),
+                NSE.YF_QUOTE_TIME: int(dates[-1].timestamp()),
+            },
+        )
+
+
+def watchlist_symbols(fixtures_dir, size):
+    """return a watchlist of the given size, cycling through the recorded symbols."""
+    recorded = ReplayProvider(fixtures_dir, Configuration.LIVE_DATA_LIB).symbols()
+    return [recorded[idx % len(recorded)] for idx in range(size)]
+
+
+def bench_scan(symbols, repeat):
+    """end to end scan, the latency of a symbol is the time until its row arrives."""
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        scan_start = time.perf_counter()
+        for _ in Scanner.stream(symbols):
+            latencies.append(time.perf_counter() - scan_start)
+    return time.perf_counter() - start, latencies
+
+
+def bench_indicators(symbols, repeat):
+    """indicator computation of every symbol history, as the scan does it."""
+    replay = ReplayProvider(latency=0)
+    histories = [replay.history(symbol) for symbol in symbols]
+    engine = IndicatorEngine()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for history in histories:
+            call_start = time.perf_counter()
+            engine.compute_frame(
+                history, NSE.YF_HISTCOL_HIGH, NSE.YF_HISTCOL_LOW, NSE.YF_HISTCOL_CLOSE
+            )
+            latencies.append(time.perf_counter() - call_start)
+    return time.perf_counter() - start, latencies
+
+
+def bench_arrange(symbols, repeat):
+    """assembly of the display frame out of the scanned rows."""
+    replay = ReplayProvider(latency=0)
+    rows = [
+        Nifty().get_stock_info(symbol, replay.history(symbol), replay.quotes(symbol))
+        for symbol in symbols
+    ]
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        call_start = time.perf_counter()
+        Niveshak.arrange_display_columns(pd.DataFrame(rows))
+        latencies.append(time.perf_counter() - call_start)
+    return time.perf_counter() - start, latencies
+
+
+def bench_watchlists(symbols, repeat):
+    """loading of all the watchlists, the symbols are split in lists of LIST_SIZE."""
+    with tempfile.TemporaryDirectory() as lists_dir:
+        for idx in range(0, len(symbols), LIST_SIZE):
+            with open(os.path.join(lists_dir, f"list-{idx:05d}"), "w") as fh:
+                fh.write("\n".join(symbols[idx : idx + LIST_SIZE]))
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            call_start = time.perf_counter()
+            Watchlists().get_all_lists(lists_dir)
+            latencies.append(time.perf_counter() - call_start)
+    return time.perf_counter() - start, latencies
+
+
+class WorkersRSS(threading.Thread):
+    """samples the summed RSS of the pool workers while the case runs.
+
+    the workers are children of the fork server, not of this process, so that
+    RUSAGE_CHILDREN does not see them; their RSS is read from /proc instead.
+    """
+
+    INTERVAL = 0.05
+
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.stopped = threading.Event()
+        # KiB, None until a worker is seen.
+        self.peak = None
+
+    def run(self):
+        while not self.stopped.wait(self.INTERVAL):
+            self.sample()
+
+    def stop(self):
+        """stop sampling, return the peak in MB, None if the case had no workers."""
+        self.stopped.set()
+        self.join()
+        self.sample()
+        return None if self.peak is None else round(self.peak / 1024, 1)
+
+    def sample(self):
+        pool = WorkerPool._shared
+        executor = pool.executor if pool else None
+        pids = list(getattr(executor, "_processes", None) or {})
+        if not pids:
+            return
+        total = 0
+        for pid in pids:
+            try:
+                with open(f"/proc/{pid}/status") as fh:
+                    total += next(
+                        int(line.split()[1]) for line in fh if line.startswith("VmRSS:")
+                    )
+            except (OSError, StopIteration):
+                # the worker exited, e.g. recycled, or there is no /proc.
+                continue
+        self.peak = max(self.peak or 0, total)
+
+
+def run_case(case, size, repeat, result_path):
+    """run the case in this fresh process, so that the peak RSS is its own."""
+    symbols = watchlist_symbols(Configuration.REPLAY_DIR, size)
+    func = globals()[f"bench_{case}"]
+    workers_rss = WorkersRSS()
+    workers_rss.start()
+    seconds, latencies = func(symbols, repeat)
+    peak_workers_rss_mb = workers_rss.stop()
+    latencies_ms = np.array(latencies) * 1000
+    with open(result_path, "w") as fh:
+        json.dump(
+            {
+                "case": case,
+                "symbols": size,
+                "repeat": repeat,
+                "seconds": round(seconds, 4),
+                "throughput": round(size * repeat / seconds, 2),
+                "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+                "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+                # ru_maxrss is in KiB on linux.
+                "peak_rss_mb": round(
+                    resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1
+                ),
+                "peak_workers_rss_mb": peak_workers_rss_mb,
+            },
+            fh,
+        )
+
+
+def configure(fixtures_dir, latency, backend, work_dir):
+    """replay the fixtures, and keep the caches and the provider state and metrics
+    away from the real ones."""
+    Configuration.REPLAY_MODE = ReplayMode.REPLAY
+    Configuration.REPLAY_DIR = fixtures_dir
+    Configuration.REPLAY_LATENCY = latency
+    Configuration.FETCH_BACKEND = backend or Configuration.FETCH_BACKEND
+    Configuration.QUOTE_CACHE_PATH = os.path.join(work_dir, "quotes.sqlite")
+    Configuration.HISTORY_CACHE_DIR = os.path.join(work_dir, "history")
+    Configuration.PROVIDER_STATE_PATH = os.path.join(work_dir, "providers.sqlite")
+    Configuration.INSTRUMENTATION_PATH = os.path.join(
+        work_dir, "instrumentation.sqlite"
+    )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_path):
+    """print the change of the throughput and the p99 latency against the baseline."""
+    with open(baseline_path) as fh:
+        baseline = {
+            (result["case"], result["symbols"]): result
+            for result in json.load(fh)["results"]
+        }
+    print(f"\nagainst {baseline_path}")
+    for result in results:
+        old = baseline.get((result["case"], result["symbols"]))
+        if old:
+            print(
+                f"{result['case']:>12} {result['symbols']:>6}: "
+                f"throughput {result['throughput'] / old['throughput'] - 1:+8.1%}, "
+                f"p99 {result['p99_ms'] / old['p99_ms'] - 1:+8.1%}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 500, 2000])
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--fixtures", help="recorded fixtures, random walk ones are generated if unset."
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0, help="simulated provider latency, seconds."
+    )
+    parser.add_argument("--backend", choices=[FetchBackend.PROCESS, FetchBackend.ASYNC])
+    parser.add_argument("--output", help="results file, bench-<commit>.json if unset.")
+    parser.add_argument("--baseline", help="earlier results file to compare against.")
+    # the options of a single case, run by the suite in a child interpreter.
+    parser.add_argument("--case", choices=CASES, help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        configure(args.fixtures, args.latency, args.backend, args.work_dir)
+        run_case(args.case, args.size, args.repeat, args.result)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        fixtures_dir = args.fixtures or os.path.join(work_dir, "fixtures")
+        configure(fixtures_dir, args.latency, args.backend, work_dir)
+        if not args.fixtures:
+            synthetic_fixtures(
+                fixtures_dir, [f"SYN{idx:04d}.NS" for idx in range(max(args.sizes))]
+            )
+
+        for case in args.cases:
+            for size in args.sizes:
+                # a fresh work dir per case, so that every quote is replayed.
+                case_dir = os.path.join(work_dir, f"{case}-{size}")
+                os.makedirs(case_dir)
+                result_path = os.path.join(case_dir, "result.json")
+                subprocess.run(
+                    [
+                        sys.executable,
+                        "-m",
+                        "benchmarks.bench_suite",
+                        f"--case={case}",
+                        f"--size={size}",
+                        f"--repeat={args.repeat}",
+                        f"--fixtures={fixtures_dir}",
+                        f"--latency={args.latency}",
+                        f"--backend={Configuration.FETCH_BACKEND}",
+                        f"--work-dir={case_dir}",
+                        f"--result={result_path}",
+                    ],
+                    stdout=subprocess.DEVNULL,
+                    check=True,
+                )
+                with open(result_path) as fh:
+                    result = json.load(fh)
+                results.append(result)
+                workers = ""
+                if result["peak_workers_rss_mb"] is not None:
+                    workers = f" ({result['peak_workers_rss_mb']:.1f} MB workers)"
+                print(
+                    f"{case:>12} {size:>6}: {result['throughput']:>12.1f} symbols/s, "
+                    f"p50 {result['p50_ms']:9.3f} ms, p99 {result['p99_ms']:9.3f} ms, "
+                    f"peak rss {result['peak_rss_mb']:7.1f} MB{workers}"
+                )
+
+    commit = git_commit()
+    output = args.output or f"bench-{commit}.json"
+    with open(output, "w") as fh:
+        json.dump(
+            {
+                "commit": commit,
+                "date": datetime.datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+                "backend": Configuration.FETCH_BACKEND,
+                "latency": args.latency,
+                "fixtures": args.fixtures or "synthetic",
+                "results": results,
+            },
+            fh,
+            indent=2,
+        )
+    print(f"saved the results in '{output}'.")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
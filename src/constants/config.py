@@ -1,4 +1,8 @@
 import logging
+import os
+import tempfile
+
+from constants.datafiles import DataFiles
 
 
 class Configuration:
@@ -6,10 +10,141 @@ class Configuration:
 
     LOG_LEVEL = logging.INFO
     LIVE_DATA_TIMEOUT = 120
-    CONCURRENCY = 10
+    # worker processes of the long lived pool, 0 sizes it after the CPUs and the I/O wait.
+    WORKER_POOL_SIZE = 0
+    WORKER_POOL_MAX = 32
+    # tasks after which a worker is replaced, to bound leaks of the provider libraries.
+    WORKER_MAX_TASKS = 500
+    # seconds between the health checks of the pool, and to wait on one.
+    WORKER_HEALTH_INTERVAL = 60
+    WORKER_HEALTH_TIMEOUT = 10
+    # "process" fetches in a pool of worker processes, "async" from a single event loop.
+    FETCH_BACKEND = "process"
+    ASYNC_CONCURRENCY = 100
+    # requests per second and burst size allowed to each data provider.
+    PROVIDER_RATE = {"yfinance": 20, "nsepython": 3}
+    PROVIDER_BURST = 10
+    PROVIDER_STATE_PATH = DataFiles.PROVIDER_STATE
+    # retries back off exponentially with jitter, in seconds.
+    RETRY_ATTEMPTS = 3
+    RETRY_BASE_DELAY = 1
+    RETRY_MAX_DELAY = 30
+    # consecutive failures that stop the calls to a provider for the cool down seconds.
+    BREAKER_THRESHOLD = 5
+    BREAKER_COOLDOWN = 60
+    # the other provider is asked too when the fastest one has not answered within the
+    # quantile of its latency histogram; the default deadline in seconds until enough
+    # calls are counted, the buckets of the histogram in seconds. off by default, the
+    # hedges double the calls to the providers when they are slow.
+    HEDGED_REQUESTS = False
+    # threads of the hedges of a process, no hedge is made while they are all busy.
+    HEDGE_THREADS = 4
+    HEDGE_QUANTILE = 0.95
+    HEDGE_MIN_SAMPLES = 20
+    HEDGE_DEFAULT_DEADLINE = 3.0
+    HEDGE_MIN_DEADLINE = 0.25
+    LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120]
+    # seconds of the epochs during which the scan of a symbol is shared by all the lists.
+    SCAN_EPOCH = 5 * 60
+    # minimum seconds between re-rendering the table while the results stream in.
+    STREAM_REFRESH_INTERVAL = 0.5
+    # directory of the shared scan result matrix, a memory backed one where available.
+    RESULT_BUFFER_DIR = (
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    )
+    # seconds between the quote polls of the live mode, and the threads polling the
+    # providers without a multi-ticker endpoint.
+    LIVE_POLL_INTERVAL = 5
+    LIVE_POLL_THREADS = 8
+    # TOML file of the trade signal rules.
+    SIGNAL_RULES = DataFiles.SIGNAL_RULES
+    # timeframe of the bars of the indicators and of the headless scans, see Timeframe.
+    TIMEFRAME = "1d"
+    # years of daily bars backtested, the cost of each side of a trade in basis points,
+    # and the symbols backtested per worker task.
+    BACKTEST_YEARS = 10
+    BACKTEST_COST_BPS = 10
+    BACKTEST_CHUNK_SIZE = 25
+    # indicator parameter grids of the sweeps, the parameters left out keep the
+    # IndicatorEngine defaults; the parameter sets are ranked by a backtest summary
+    # metric, and swept over blocks of up to the chunk size symbols.
+    SWEEP_GRID = {
+        "adx_period": [7, 10, 14],
+        "bb_period": [15, 20, 25],
+        "fastk_period": [10, 14, 21],
+        "slowk_period": [3, 5],
+        "slowd_period": [3, 5],
+    }
+    SWEEP_RANK_BY = "MEDIAN_RETURN"
+    SWEEP_CHUNK_SIZE = 100
+    # symbols listed by the top queries of the universe screener.
+    SCREENER_TOP_K = 20
+    # number of symbols fetched per multi-ticker history request.
+    BULK_CHUNK_SIZE = 50
+    # keep the historical data on disk and only fetch the newer bars.
+    HISTORY_CACHE = True
+    HISTORY_CACHE_DIR = DataFiles.HISTORY_CACHE
+    # nsepython daily bars ingested in bulk from the NSE bhavcopy files into the history
+    # cache instead of per symbol history calls, the file of the day is published in
+    # the evening.
+    BHAVCOPY_HISTORY = True
+    BHAVCOPY_DIR = DataFiles.BHAVCOPY
+    BHAVCOPY_READY_HOUR = 19
+    # shared quote cache, TTLs are in seconds and can be overridden per field of the
+    # stock information, the same for both providers; a quote is fresh for the shortest
+    # TTL of the fields read by the caller.
+    QUOTE_CACHE = True
+    QUOTE_CACHE_PATH = DataFiles.QUOTE_CACHE
+    QUOTE_CACHE_SIZE = 2000
+    QUOTE_TTL = 60
+    QUOTE_FIELD_TTL = {
+        "NAME": 24 * 60 * 60,
+        "YEAR_HIGH": 60 * 60,
+        "YEAR_LOW": 60 * 60,
+    }
+    QUOTE_INFLIGHT_TIMEOUT = 30
+    # seconds between the writes of the hit counters and access times of a process.
+    QUOTE_FLUSH_INTERVAL = 5
+    # headless scan snapshots, the page reads them while they are younger than max age seconds.
+    SNAPSHOT_DIR = DataFiles.SNAPSHOTS
+    SNAPSHOT_MAX_AGE = 15 * 60
+    SNAPSHOT_KEEP = 10
+    # per-stage timers and counters of the scans, also switched on by the environment.
+    INSTRUMENTATION = os.environ.get("NIVESHAK_INSTRUMENTATION", "0") != "0"
+    INSTRUMENTATION_PATH = DataFiles.INSTRUMENTATION
+    # seconds after which the NSE security lists of the symbol master are refreshed.
+    SYMBOL_MASTER_REFRESH = 24 * 60 * 60
+    # "record" saves the fetched quotes and history as fixtures, "replay" serves them
+    # instead of calling the provider, after the given latency in seconds.
+    REPLAY_MODE = "off"
+    REPLAY_DIR = DataFiles.REPLAY_FIXTURES
+    REPLAY_LATENCY = 0
     LIVE_DATA_LIB = "yfinance"
 
 
 class LiveDataLibrary:
     NSEPYTHON = "nsepython"
     YFINANCE = "yfinance"
+
+
+class FetchBackend:
+    PROCESS = "process"
+    ASYNC = "async"
+
+
+class Timeframe:
+    M15 = "15m"
+    H1 = "1h"
+    D1 = "1d"
+    W1 = "1wk"
+    ALL = [M15, H1, D1, W1]
+    # the timeframe fetched and stored, the others are resampled out of it.
+    BASE = {M15: M15, H1: M15, D1: D1, W1: D1}
+    # pandas resampling of the base bars, the NSE session opens at 9:15.
+    RESAMPLE = {H1: {"rule": "1h", "offset": "15min"}, W1: {"rule": "W-FRI"}}
+
+
+class ReplayMode:
+    OFF = "off"
+    RECORD = "record"
+    REPLAY = "replay"
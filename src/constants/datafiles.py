@@ -1,7 +1,34 @@
+import os
 from enum import StrEnum
 
+# the data files live in the package, wherever the app is started from.
+DATA_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"
+)
+
 
 class DataFiles(StrEnum):
     # files containing list of symbols to track.
-    WATCHLISTS = "src/data/watchlists"
-    NSE_WATCHLISTS = "src/data/nse-watchlists"
+    WATCHLISTS = os.path.join(DATA_DIR, "watchlists")
+    NSE_WATCHLISTS = os.path.join(DATA_DIR, "nse-watchlists")
+
+    # trade signal rules.
+    SIGNAL_RULES = os.path.join(DATA_DIR, "signal_rules.toml")
+
+    # local on-disk cache of the historical data.
+    HISTORY_CACHE = os.path.join(DATA_DIR, "cache", "history")
+    # NSE bhavcopy files ingested into the history cache.
+    BHAVCOPY = os.path.join(DATA_DIR, "cache", "bhavcopy")
+    # shared cache of the live quotes.
+    QUOTE_CACHE = os.path.join(DATA_DIR, "cache", "quotes.sqlite")
+    # shared rate limiter and circuit breaker state of the data providers.
+    PROVIDER_STATE = os.path.join(DATA_DIR, "cache", "providers.sqlite")
+    # NSE security lists backing the symbol master.
+    SYMBOL_MASTER_EQUITY = os.path.join(DATA_DIR, "cache", "EQUITY_L.csv")
+    SYMBOL_MASTER_ETF = os.path.join(DATA_DIR, "cache", "eq_etfseclist.csv")
+    # snapshots of the headless scans of all the watchlists.
+    SNAPSHOTS = os.path.join(DATA_DIR, "cache", "snapshots")
+    # stage timers and counters of the scans.
+    INSTRUMENTATION = os.path.join(DATA_DIR, "cache", "instrumentation.sqlite")
+    # recorded quotes and history served by the replay provider.
+    REPLAY_FIXTURES = os.path.join(DATA_DIR, "fixtures")
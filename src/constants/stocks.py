@@ -54,18 +54,37 @@ class NSE(StrEnum):
     DATE_FORMAT = "%d-%m-%Y"
     LOOKBACK_DAYS = "180"
     YF_LOOKBACK_PERIOD = "6mo"
+    # yfinance serves the intraday bars of the last 60 days only.
+    INTRADAY_LOOKBACK_DAYS = "59"
+    YF_INTRADAY_LOOKBACK_PERIOD = "60d"
 
     # Historical data columns.
+    HISTCOL_OPEN = "CH_OPENING_PRICE"
     HISTCOL_CLOSE = "CH_CLOSING_PRICE"
     HISTCOL_HIGH = "CH_TRADE_HIGH_PRICE"
     HISTCOL_LOW = "CH_TRADE_LOW_PRICE"
+    HISTCOL_VOLUME = "CH_TOT_TRADED_QTY"
     HISTCOL_SORTER = "CH_TIMESTAMP"
 
+    YF_HISTCOL_OPEN = "Open"
     YF_HISTCOL_CLOSE = "Close"
     YF_HISTCOL_HIGH = "High"
     YF_HISTCOL_LOW = "Low"
+    YF_HISTCOL_VOLUME = "Volume"
     YF_HISTCOL_SORTER = "Date"
 
+    # Time of the last trade in the quotes.
+    QUOTE_TIME = "lastUpdateTime"
+    QUOTE_TIME_FORMAT = "%d-%b-%Y %H:%M:%S"
+    YF_QUOTE_TIME = "regularMarketTime"
+
     # Indicator settings.
     DEFAULT_TIMEPERIOD = "14"
     ADX_TIMEPERIOD = "10"
+    BB_TIMEPERIOD = "20"
+    EMA_TIMEPERIOD = "20"
+    # Use the values for Stochastic Oscillator 10,3,3 for aggressive short term swing trading.
+    # Use the values for Stochastic Oscillator 21,5,5 for conservative medium term swing trading.
+    STOCH_FASTK_PERIOD = "10"
+    STOCH_SLOWK_PERIOD = "3"
+    STOCH_SLOWD_PERIOD = "3"
@@ -0,0 +1,266 @@
+"""class to implement the backtests of the trade signal rules.
+The indicators and the signal rules of the scans are evaluated over the full history
+arrays of a symbol at once, and the entries and exits of the backtest rules are
+simulated at the next open with trading costs. The symbols are backtested in chunks
+by the worker pool, only their metrics travel back.
+"""
+
+import argparse
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+from constants.config import Configuration, LiveDataLibrary, Timeframe
+from constants.stocks import InfoKeys, NSE
+from lib.history_store import HistoryStore
+from lib.indicators import IndicatorEngine
+from lib.nifty_live import NiftyLive
+from lib.signal_rules import SignalRules
+from lib.utils import Utils
+from lib.worker_pool import WorkerPool
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class Backtester:
+    """Long only backtest of the signal rules, symbol by symbol."""
+
+    # the history providers have no long intraday history.
+    TIMEFRAMES = [Timeframe.D1, Timeframe.W1]
+    BARS_PER_YEAR = {Timeframe.D1: 252, Timeframe.W1: 52}
+
+    def __init__(self, years=None, cost_bps=None, timeframe=None):
+        self.years = years or Configuration.BACKTEST_YEARS
+        self.cost = (
+            Configuration.BACKTEST_COST_BPS if cost_bps is None else cost_bps
+        ) / 10000
+        self.timeframe = timeframe or Timeframe.D1
+        self.columns = [
+            NSE.YF_HISTCOL_OPEN,
+            NSE.YF_HISTCOL_HIGH,
+            NSE.YF_HISTCOL_LOW,
+            NSE.YF_HISTCOL_CLOSE,
+        ]
+        if Configuration.LIVE_DATA_LIB == LiveDataLibrary.NSEPYTHON:
+            self.columns = [
+                NSE.HISTCOL_OPEN,
+                NSE.HISTCOL_HIGH,
+                NSE.HISTCOL_LOW,
+                NSE.HISTCOL_CLOSE,
+            ]
+
+    @staticmethod
+    def rounded(value):
+        return round(float(value), 2)
+
+    def signals(self, high, low, close, series=None):
+        """return the entry and exit masks of the bars, as the scan would signal them.
+
+        the prices may be a block of symbols x bars, with their indicator series given.
+        """
+        if series is None:
+            series = IndicatorEngine().series(high, low, close)
+        # the scan sees the indicators rounded.
+        columns = {
+            InfoKeys.ADX: np.round(series["adx"], 2).ravel(),
+            InfoKeys.STOCH_K: np.round(series["stoch_k"], 2).ravel(),
+            InfoKeys.STOCH_D: np.round(series["stoch_d"], 2).ravel(),
+            InfoKeys.BB_HIGH: np.round(series["bb_high"], 2).ravel(),
+            InfoKeys.BB_LOW: np.round(series["bb_low"], 2).ravel(),
+            InfoKeys.LAST_PRICE: np.ravel(close),
+        }
+        rules = SignalRules.shared()
+        codes, _ = rules.evaluate(
+            columns, set(rules.backtest["entry"]) | set(rules.backtest["exit"])
+        )
+        # no trades before every indicator warmed up.
+        ready = np.logical_and.reduce(
+            [~np.isnan(values) for values in columns.values()]
+        )
+        entry = ready & rules.matches(codes, rules.backtest["entry"])
+        exit_ = ready & rules.matches(codes, rules.backtest["exit"])
+        return entry.reshape(np.shape(close)), exit_.reshape(np.shape(close))
+
+    def simulate(self, open_, high, low, close):
+        """return the metrics of trading the signals of the closes at the next opens."""
+        metrics = self.simulate_block(
+            *(np.atleast_2d(prices) for prices in (open_, high, low, close)),
+            IndicatorEngine().series(high, low, close),
+        )
+        return {key: values[0].item() for key, values in metrics.items()}
+
+    def simulate_block(self, open_, high, low, close, series):
+        """return the metrics of every symbol of a block of symbols x bars, as arrays."""
+        entry, exit_ = self.signals(high, low, close, series)
+        # the position wanted after each close, held from the next open.
+        wanted = pd.DataFrame(np.where(entry, 1.0, np.where(exit_, 0.0, np.nan)))
+        wanted = wanted.ffill(axis=1).fillna(0.0).to_numpy(dtype=bool)
+        held = np.zeros_like(wanted)
+        held[:, 1:] = wanted[:, :-1]
+        before = np.zeros_like(held)
+        before[:, 1:] = held[:, :-1]
+        prev_close = np.concatenate((close[:, :1], close[:, :-1]), axis=1)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            returns = np.select(
+                [held & before, held & ~before, ~held & before],
+                [
+                    close / prev_close - 1,
+                    (close / open_) * (1 - self.cost) - 1,
+                    (open_ / prev_close) * (1 - self.cost) - 1,
+                ],
+                default=0.0,
+            )
+        returns = np.nan_to_num(returns)
+        equity = np.cumprod(1 + returns, axis=1)
+        drawdown = equity / np.maximum.accumulate(equity, axis=1) - 1
+
+        # the bars of a trade run from its entry to its exit bar, both included, no
+        # trade is open at the first bar of a symbol.
+        opened = held & ~before
+        trades = opened.sum(axis=1)
+        in_trade = (held | before).ravel()
+        trade_ids = np.cumsum(opened.ravel()) - 1
+        trade_returns = np.expm1(
+            np.bincount(
+                trade_ids[in_trade],
+                weights=np.log1p(returns.ravel()[in_trade]),
+                minlength=trades.sum(),
+            )
+        )
+        wins = np.bincount(
+            np.repeat(np.arange(len(close)), trades),
+            weights=trade_returns > 0,
+            minlength=len(close),
+        ).astype(int)
+        years = close.shape[1] / self.BARS_PER_YEAR[self.timeframe]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "BARS": np.full(len(close), close.shape[1]),
+                "TRADES": trades,
+                "WINS": wins,
+                "HIT_RATE": np.round(np.where(trades, wins * 100 / trades, np.nan), 2),
+                "RETURN": np.round((equity[:, -1] - 1) * 100, 2),
+                "BUY_HOLD": np.round((close[:, -1] / close[:, 0] - 1) * 100, 2),
+                "MAX_DRAWDOWN": np.round(drawdown.min(axis=1) * 100, 2),
+                "EXPOSURE": np.round(held.mean(axis=1) * 100, 2),
+                "CAGR": np.round((equity[:, -1] ** (1 / years) - 1) * 100, 2),
+            }
+
+    def load(self, symbol):
+        """return the open, high, low and close arrays of the symbol, None without
+        enough history."""
+        history = NiftyLive.get_long_history(symbol, self.years)
+        if len(history) == 0:
+            logging.error(f"no history to backtest '{symbol}'.")
+            return None
+        history = (
+            HistoryStore().bars(history, self.timeframe).dropna(subset=self.columns)
+        )
+        if len(history) <= IndicatorEngine().lookback():
+            logging.error(f"not enough history to backtest '{symbol}'.")
+            return None
+        return [IndicatorEngine.as_array(history[col]) for col in self.columns]
+
+    def run_symbol(self, symbol):
+        """return the metrics of the symbol, None without enough history."""
+        prices = self.load(symbol)
+        if prices is None:
+            return None
+        return {InfoKeys.SYMBOL: symbol, **self.simulate(*prices)}
+
+    @staticmethod
+    def run_chunk(symbols, years, cost_bps, timeframe):
+        """backtest the symbols in a worker, only one history is held at a time."""
+        backtester = Backtester(years, cost_bps, timeframe)
+        return [
+            metrics
+            for metrics in map(backtester.run_symbol, symbols)
+            if metrics is not None
+        ]
+
+    @staticmethod
+    def load_chunk(symbols, years, cost_bps, timeframe):
+        """load the price arrays of the symbols in a worker, see load."""
+        return list(map(Backtester(years, cost_bps, timeframe).load, symbols))
+
+    def map_chunks(self, func, symbols):
+        """run the function over chunks of the symbols in the worker pool, return the
+        chunks and the results of each one, in order."""
+        chunks = Utils.chunks(symbols, Configuration.BACKTEST_CHUNK_SIZE)
+        futures = WorkerPool.shared().submit_all(
+            func,
+            [
+                (chunk, self.years, self.cost * 10000, self.timeframe)
+                for chunk in chunks
+            ],
+        )
+        return [
+            (chunk, future.result().value) for chunk, future in zip(chunks, futures)
+        ]
+
+    def run(self, symbols):
+        """return the metrics of every symbol backtested in the worker pool."""
+        results = []
+        for _, metrics in self.map_chunks(
+            Backtester.run_chunk, list(dict.fromkeys(symbols))
+        ):
+            results.extend(metrics)
+        return pd.DataFrame(results)
+
+    def load_all(self, symbols):
+        """return the price arrays of the symbols with enough history, loaded in the
+        worker pool."""
+        return {
+            symbol: prices
+            for chunk, chunk_prices in self.map_chunks(
+                Backtester.load_chunk, list(dict.fromkeys(symbols))
+            )
+            for symbol, prices in zip(chunk, chunk_prices)
+            if prices is not None
+        }
+
+    @staticmethod
+    def summary(results):
+        """return the metrics over all the symbols, the trades pooled."""
+        trades = results["TRADES"].sum()
+        return {
+            "SYMBOLS": len(results),
+            "TRADES": int(trades),
+            "HIT_RATE": (
+                Backtester.rounded(results["WINS"].sum() * 100 / trades)
+                if trades
+                else np.nan
+            ),
+            "MEDIAN_RETURN": Backtester.rounded(results["RETURN"].median()),
+            "MEDIAN_BUY_HOLD": Backtester.rounded(results["BUY_HOLD"].median()),
+            "MEDIAN_CAGR": Backtester.rounded(results["CAGR"].median()),
+            "WORST_DRAWDOWN": Backtester.rounded(results["MAX_DRAWDOWN"].min()),
+        }
+
+
+if __name__ == "__main__":
+    from lib.symbol_registry import SymbolRegistry
+
+    parser = argparse.ArgumentParser(description="backtest the trade signal rules.")
+    parser.add_argument("watchlists", nargs="+", help="watchlists to backtest.")
+    parser.add_argument("--years", type=int, default=Configuration.BACKTEST_YEARS)
+    parser.add_argument(
+        "--cost-bps", type=float, default=Configuration.BACKTEST_COST_BPS
+    )
+    parser.add_argument(
+        "--timeframe", choices=Backtester.TIMEFRAMES, default=Timeframe.D1
+    )
+    args = parser.parse_args()
+
+    registry = SymbolRegistry.shared()
+    registry.sync()
+    symbols = [symbol for name in args.watchlists for symbol in registry.symbols(name)]
+    backtest_df = Backtester(args.years, args.cost_bps, args.timeframe).run(symbols)
+    if backtest_df.empty:
+        logging.error("nothing to backtest.")
+        sys.exit(1)
+    print(backtest_df.sort_values("RETURN", ascending=False).to_string(index=False))
+    print(pd.Series(Backtester.summary(backtest_df)).to_string())
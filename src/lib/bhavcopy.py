@@ -0,0 +1,251 @@
+"""class to implement the bulk ingestion of the NSE bhavcopy files.
+NSE publishes every trading day a single bhavcopy CSV with the bar of every listed
+symbol. The files are downloaded once, parsed with a vectorized reader and every
+symbol's bars upserted into the history store of nsepython, so that the daily bars
+of the watchlists need no per symbol history call.
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import re
+import sys
+from urllib.parse import quote
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from constants.config import Configuration, LiveDataLibrary
+from constants.stocks import NSE
+from lib.history_store import HistoryStore
+from lib.resilience import ProviderError, ProviderGuard
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+IST = ZoneInfo("Asia/Kolkata")
+
+
+class Bhavcopy:
+    """Daily NSE bhavcopy files, parsed and upserted into the history store."""
+
+    URL = "https://nsearchives.nseindia.com/content/cm/{file_name}"
+    FILE_NAME = "BhavCopy_NSE_CM_0_0_0_{date:%Y%m%d}_F_0000.csv.zip"
+    FILE_PATTERN = re.compile(r"BhavCopy_NSE_CM_0_0_0_(\d{8})_F_0000\.csv(\.zip)?$")
+    FAILED_FILE = "failed"
+    SYMBOL = "SYMBOL"
+    SERIES = "SERIES"
+    # the columns of the UDiFF bhavcopy and of the legacy one, to the history ones.
+    FORMATS = [
+        (
+            {
+                "TckrSymb": SYMBOL,
+                "SctySrs": SERIES,
+                "TradDt": NSE.HISTCOL_SORTER,
+                "OpnPric": NSE.HISTCOL_OPEN,
+                "HghPric": NSE.HISTCOL_HIGH,
+                "LwPric": NSE.HISTCOL_LOW,
+                "ClsPric": NSE.HISTCOL_CLOSE,
+                "TtlTradgVol": NSE.HISTCOL_VOLUME,
+            },
+            "%Y-%m-%d",
+        ),
+        (
+            {
+                "SYMBOL": SYMBOL,
+                "SERIES": SERIES,
+                "TIMESTAMP": NSE.HISTCOL_SORTER,
+                "OPEN": NSE.HISTCOL_OPEN,
+                "HIGH": NSE.HISTCOL_HIGH,
+                "LOW": NSE.HISTCOL_LOW,
+                "CLOSE": NSE.HISTCOL_CLOSE,
+                "TOTTRDQTY": NSE.HISTCOL_VOLUME,
+            },
+            "%d-%b-%Y",
+        ),
+    ]
+
+    def __init__(self, bhavcopy_dir=None, store=None):
+        self.bhavcopy_dir = bhavcopy_dir or Configuration.BHAVCOPY_DIR
+        self.store = store or HistoryStore(source=LiveDataLibrary.NSEPYTHON)
+
+    @staticmethod
+    def read(path):
+        """return the bars of the equity series of a bhavcopy file, zipped or not."""
+        # the legacy files pad some of the column names with spaces.
+        header = [col.strip() for col in pd.read_csv(path, nrows=0).columns]
+        for columns, date_format in Bhavcopy.FORMATS:
+            if set(columns) <= set(header):
+                break
+        else:
+            raise ValueError(f"unknown bhavcopy format of '{path}'.")
+
+        bars = pd.read_csv(
+            path,
+            header=0,
+            names=header,
+            usecols=list(columns),
+            dtype={
+                col: str
+                for col, name in columns.items()
+                if name in (Bhavcopy.SYMBOL, Bhavcopy.SERIES, NSE.HISTCOL_SORTER)
+            },
+            skipinitialspace=True,
+        ).rename(columns=columns)
+        bars = bars[bars[Bhavcopy.SERIES].str.strip() == NSE.STOCK_CODE]
+        bars[Bhavcopy.SYMBOL] = bars[Bhavcopy.SYMBOL].str.strip()
+        bars[NSE.HISTCOL_SORTER] = pd.to_datetime(
+            bars[NSE.HISTCOL_SORTER].str.strip(), format=date_format
+        )
+        return bars.drop(columns=Bhavcopy.SERIES)
+
+    @staticmethod
+    def store_key(symbol: str):
+        """return the key of the symbol in the history store, as the fetches key it."""
+        return quote(symbol, safe="SBIN.NS")
+
+    def ingest(self, paths, symbols=None):
+        """upsert the bars of the bhavcopy files into the history store, of the given
+        symbols only or of all of them; return the number of bars ingested.
+
+        the symbols are the history store keys, see store_key.
+        """
+        frames = []
+        for path in paths:
+            try:
+                frames.append(self.read(path))
+            except (OSError, ValueError, KeyError) as err:
+                logging.error(f"failed to read the bhavcopy '{path}'.")
+                logging.error(str(err))
+        if not frames:
+            return 0
+        bars = pd.concat(frames, ignore_index=True)
+        bars[Bhavcopy.SYMBOL] = bars[Bhavcopy.SYMBOL].map(self.store_key)
+        if symbols is not None:
+            bars = bars[bars[Bhavcopy.SYMBOL].isin(set(symbols))]
+        bars = bars.set_index(NSE.HISTCOL_SORTER)
+        # a single upsert per symbol, whatever the number of files.
+        for symbol, symbol_bars in bars.groupby(Bhavcopy.SYMBOL, sort=False):
+            self.store.append(symbol, symbol_bars.drop(columns=Bhavcopy.SYMBOL))
+        logging.info(f"ingested {len(bars)} bars from {len(frames)} bhavcopy files.")
+        return len(bars)
+
+    def path(self, date):
+        return os.path.join(self.bhavcopy_dir, self.FILE_NAME.format(date=date))
+
+    def downloaded_dates(self):
+        """return the dates of the downloaded bhavcopy files, in order."""
+        if not os.path.isdir(self.bhavcopy_dir):
+            return []
+        return sorted(
+            datetime.datetime.strptime(match.group(1), "%Y%m%d").date()
+            for match in map(self.FILE_PATTERN.match, os.listdir(self.bhavcopy_dir))
+            if match
+        )
+
+    def latest_date(self):
+        """return the date of the latest downloaded bhavcopy, None if none is."""
+        dates = self.downloaded_dates()
+        return dates[-1] if dates else None
+
+    @property
+    def failed_path(self):
+        """file holding the date of a failed download, until a sync gets past it."""
+        return os.path.join(self.bhavcopy_dir, self.FAILED_FILE)
+
+    def ingested_dates(self):
+        """return the first and the last date of the ingested bhavcopy files, the one
+        of every trading day in between is; None if none is or if the last sync failed
+        to download one."""
+        dates = self.downloaded_dates()
+        if not dates or os.path.isfile(self.failed_path):
+            return None
+        return dates[0], dates[-1]
+
+    def download(self, date):
+        """download the bhavcopy of the date, return its path or None if NSE has none,
+        i.e. no trading on the date; raise ProviderError if the download failed."""
+        import requests
+
+        def get(url):
+            response = requests.get(
+                url, headers={"User-Agent": "Mozilla/5.0"}, timeout=30
+            )
+            # the other failures are retried by the guard.
+            if response.status_code != 404:
+                response.raise_for_status()
+            return response
+
+        file_name = self.FILE_NAME.format(date=date)
+        guard = ProviderGuard.shared(LiveDataLibrary.NSEPYTHON)
+        response = guard.call(get, self.URL.format(file_name=file_name))
+        if response.status_code == 404:
+            logging.info(f"no bhavcopy for {date}.")
+            return None
+        path = self.path(date)
+        os.makedirs(self.bhavcopy_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as fh:
+            fh.write(response.content)
+        os.replace(tmp_path, path)
+        return path
+
+    def sync(self, days=None, symbols=None):
+        """download and ingest the bhavcopy files published since the latest one, going
+        back at most the given days; return the paths ingested.
+
+        a day is done once its file is downloaded or NSE has none for it; the sync stops
+        at the first failed download, the next one starts again from it. only the bars
+        of the stored symbols and of the given ones are ingested, of all the symbols
+        when none are given.
+        """
+        now = datetime.datetime.now(IST)
+        start = now.date() - datetime.timedelta(days or int(NSE.LOOKBACK_DAYS))
+        latest = self.latest_date()
+        if latest is not None:
+            start = max(start, latest + datetime.timedelta(1))
+        end = now.date()
+        if now.hour < Configuration.BHAVCOPY_READY_HOUR:
+            end -= datetime.timedelta(1)
+        paths = []
+        failed = None
+        for date in pd.bdate_range(start, end):
+            try:
+                path = self.download(date.date())
+            except ProviderError as err:
+                logging.error(f"failed to download the bhavcopy of {date.date()}.")
+                logging.error(str(err))
+                failed = date.date()
+                break
+            if path:
+                paths.append(path)
+        if paths:
+            if symbols is not None:
+                symbols = set(self.store.symbols()) | set(map(self.store_key, symbols))
+            self.ingest(paths, symbols)
+        if failed:
+            os.makedirs(self.bhavcopy_dir, exist_ok=True)
+            with open(self.failed_path, "w") as fh:
+                fh.write(f"{failed}\n")
+        elif os.path.isfile(self.failed_path):
+            os.remove(self.failed_path)
+        return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ingest the NSE bhavcopy files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    sync_parser = commands.add_parser(
+        "sync", help="download and ingest the files since the latest one."
+    )
+    sync_parser.add_argument(
+        "--days", type=int, default=int(NSE.LOOKBACK_DAYS), help="days to go back."
+    )
+    ingest_parser = commands.add_parser("ingest", help="ingest local bhavcopy files.")
+    ingest_parser.add_argument("paths", nargs="+", help="bhavcopy CSV files, or zips.")
+    args = parser.parse_args()
+
+    if args.command == "sync":
+        Bhavcopy().sync(args.days)
+    else:
+        Bhavcopy().ingest(args.paths)
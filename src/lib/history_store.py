@@ -0,0 +1,136 @@
+"""class to implement the local on-disk store of the historical data.
+Each symbol is kept in its own parquet file, grouped by the live data library. The
+bars are indexed by tz-naive exchange time, whichever call fetched them.
+"""
+
+import datetime
+import logging
+import os
+import sys
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from constants.config import Configuration, LiveDataLibrary, Timeframe
+from constants.stocks import NSE
+from lib.timeframes import Timeframes
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class HistoryStore:
+    """Parquet backed OHLC history keyed by symbol, data source and base timeframe."""
+
+    def __init__(self, cache_dir=None, source=None, timeframe=None):
+        self.cache_dir = cache_dir or Configuration.HISTORY_CACHE_DIR
+        self.source = source or Configuration.LIVE_DATA_LIB
+        self.timeframe = Timeframes.base(timeframe)
+
+        self.columns = [
+            NSE.YF_HISTCOL_OPEN,
+            NSE.YF_HISTCOL_HIGH,
+            NSE.YF_HISTCOL_LOW,
+            NSE.YF_HISTCOL_CLOSE,
+            NSE.YF_HISTCOL_VOLUME,
+        ]
+        if self.source == LiveDataLibrary.NSEPYTHON:
+            self.columns = [
+                NSE.HISTCOL_OPEN,
+                NSE.HISTCOL_HIGH,
+                NSE.HISTCOL_LOW,
+                NSE.HISTCOL_CLOSE,
+                NSE.HISTCOL_VOLUME,
+            ]
+
+    def path(self, symbol: str):
+        """return the parquet file path for the symbol, the daily bars at the top."""
+        source_dir = os.path.join(self.cache_dir, self.source)
+        if self.timeframe != Timeframe.D1:
+            source_dir = os.path.join(source_dir, self.timeframe)
+        return os.path.join(source_dir, quote(symbol, safe="") + ".parquet")
+
+    def symbols(self):
+        """return the symbols having a stored history."""
+        source_dir = os.path.dirname(self.path(""))
+        if not os.path.isdir(source_dir):
+            return []
+        return [
+            unquote(name[: -len(".parquet")])
+            for name in os.listdir(source_dir)
+            if name.endswith(".parquet")
+        ]
+
+    def load(self, symbol: str):
+        """return the stored history of the symbol, empty if not stored yet."""
+        path = self.path(symbol)
+        if not os.path.isfile(path):
+            return pd.DataFrame(columns=self.columns)
+        try:
+            return self.exchange_time(pd.read_parquet(path))
+        except (OSError, ValueError) as err:
+            logging.error(f"failed to read the stored history of '{symbol}'.")
+            logging.error(str(err))
+            return pd.DataFrame(columns=self.columns)
+
+    def append(self, symbol: str, new_data, stored=None):
+        """merge the newer bars into the stored history and return the merged frame.
+
+        the latest stored bar is replaced, as it may have been an incomplete day.
+        """
+        if stored is None:
+            stored = self.load(symbol)
+        if new_data is None or len(new_data) == 0:
+            return stored
+
+        merged = self.merge(stored, new_data)
+        self.save(symbol, merged)
+        return merged
+
+    def merge(self, stored, new_data):
+        """return the stored history with the newer bars, without storing it."""
+        if new_data is None or len(new_data) == 0:
+            return stored
+        stored = self.exchange_time(stored)
+        new_data = self.exchange_time(new_data)
+        new_data = new_data[[col for col in self.columns if col in new_data.columns]]
+        merged = new_data if stored.empty else pd.concat([stored, new_data])
+        return merged[~merged.index.duplicated(keep="last")].sort_index()
+
+    @staticmethod
+    def exchange_time(history):
+        """return the history indexed by the tz-naive exchange time of its bars.
+
+        yf.download dates the bars tz-naive while Ticker.history and the chart API date
+        them in the exchange time zone, both end up in the same file.
+        """
+        if isinstance(history.index, pd.DatetimeIndex) and history.index.tz is not None:
+            history = history.copy()
+            history.index = history.index.tz_localize(None)
+        return history
+
+    def save(self, symbol: str, history):
+        """atomically write the history of the symbol."""
+        path = self.path(symbol)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            history.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+        except (OSError, ValueError) as err:
+            logging.error(f"failed to store the history of '{symbol}'.")
+            logging.error(str(err))
+
+    @staticmethod
+    def lookback_window(history, days=None):
+        """return only the bars inside the lookback window, of the timeframe by default."""
+        if len(history) == 0:
+            return history
+        days = days or Timeframes.lookback_days()
+        start = pd.Timestamp(datetime.datetime.now() - datetime.timedelta(days))
+        if history.index.tz is not None:
+            start = start.tz_localize(history.index.tz)
+        return history[history.index >= start]
+
+    def bars(self, history, timeframe):
+        """return the bars of the timeframe out of the stored base bars."""
+        return Timeframes.resample(history, timeframe, self.columns)
@@ -0,0 +1,330 @@
+"""class to implement the incremental indicator state.
+The indicators of a symbol are seeded once from its stored history and then
+advanced in O(1) per new bar, matching talib. The in-progress bar of the day is
+peeked at without changing the state, so that every intraday tick is O(1) too.
+"""
+
+import math
+from collections import deque
+
+from constants.stocks import NSE
+from lib.indicators import Indicators
+
+NAN = float("nan")
+
+
+class MonotonicWindow:
+    """running max (or min) of the last period values, with O(1) amortized updates."""
+
+    def __init__(self, period, is_max=True):
+        self.period = period
+        self.sign = 1 if is_max else -1
+        self.count = 0
+        # (index, signed value) pairs with decreasing signed values.
+        self.entries = deque()
+
+    def update(self, value):
+        signed = self.sign * value
+        while self.entries and self.entries[-1][1] <= signed:
+            self.entries.pop()
+        self.entries.append((self.count, signed))
+        self.count += 1
+        if self.entries[0][0] <= self.count - 1 - self.period:
+            self.entries.popleft()
+        return self.sign * self.entries[0][1]
+
+    def peek(self, value):
+        """return the extreme of the window if the value came next."""
+        best = self.sign * value
+        if self.entries:
+            # only the front entry can fall out of the window on the next value.
+            index, entry = self.entries[0]
+            if index <= self.count - self.period and len(self.entries) > 1:
+                index, entry = self.entries[1]
+            if index > self.count - self.period:
+                best = max(best, entry)
+        return self.sign * best
+
+
+class RollingMean:
+    """mean (and population deviation) of the last period values."""
+
+    def __init__(self, period):
+        self.period = period
+        self.values = deque(maxlen=period)
+        self.total = 0.0
+        self.squares = 0.0
+        self.updates = 0
+
+    def next_sums(self, value):
+        total = self.total + value
+        squares = self.squares + value * value
+        if len(self.values) == self.period:
+            total -= self.values[0]
+            squares -= self.values[0] * self.values[0]
+        return total, squares
+
+    def update(self, value):
+        self.total, self.squares = self.next_sums(value)
+        self.values.append(value)
+        self.updates += 1
+        # re-sum once per window, so that the floating point error does not build up.
+        if self.updates % self.period == 0:
+            self.total = math.fsum(self.values)
+            self.squares = math.fsum(v * v for v in self.values)
+        return self.stats(self.total, self.squares, len(self.values))
+
+    def peek(self, value):
+        total, squares = self.next_sums(value)
+        return self.stats(total, squares, min(len(self.values) + 1, self.period))
+
+    def stats(self, total, squares, count):
+        if count < self.period:
+            return NAN, NAN
+        mean = total / self.period
+        return mean, math.sqrt(max(squares / self.period - mean * mean, 0.0))
+
+
+class IncrementalEMA:
+    """EMA seeded with the SMA of the first period closes, like talib."""
+
+    def __init__(self, period=int(NSE.EMA_TIMEPERIOD)):
+        self.period = period
+        self.factor = 2.0 / (period + 1)
+        # closes seen, and their sum until the EMA is seeded.
+        self.state = (0, 0.0)
+
+    def step(self, state, close):
+        count, value = state
+        count += 1
+        if count < self.period:
+            return (count, value + close), NAN
+        if count == self.period:
+            value = (value + close) / self.period
+        else:
+            value += (close - value) * self.factor
+        return (count, value), value
+
+    def update(self, close):
+        self.state, value = self.step(self.state, close)
+        return value
+
+    def peek(self, close):
+        return self.step(self.state, close)[1]
+
+
+class IncrementalRSI:
+    """Wilder smoothed RSI, like talib."""
+
+    def __init__(self, period=int(NSE.DEFAULT_TIMEPERIOD)):
+        self.period = period
+        # closes seen, previous close, average (or summed) gain and loss.
+        self.state = (0, NAN, 0.0, 0.0)
+
+    def step(self, state, close):
+        count, previous, gain, loss = state
+        count += 1
+        if count == 1:
+            return (count, close, gain, loss), NAN
+        move = close - previous
+        up, down = max(move, 0.0), max(-move, 0.0)
+        moves = count - 1
+        if moves < self.period:
+            return (count, close, gain + up, loss + down), NAN
+        if moves == self.period:
+            gain, loss = (gain + up) / self.period, (loss + down) / self.period
+        else:
+            gain = (gain * (self.period - 1) + up) / self.period
+            loss = (loss * (self.period - 1) + down) / self.period
+        total = gain + loss
+        value = 0.0 if abs(total) < 1e-8 else 100 * gain / total
+        return (count, close, gain, loss), value
+
+    def update(self, close):
+        self.state, value = self.step(self.state, close)
+        return value
+
+    def peek(self, close):
+        return self.step(self.state, close)[1]
+
+
+class IncrementalADX:
+    """Wilder smoothed ADX over +DM, -DM and the true range, like talib."""
+
+    def __init__(self, period=int(NSE.ADX_TIMEPERIOD)):
+        self.period = period
+        # bars seen, previous bar, smoothed +DM, -DM and TR, and the (summed) ADX.
+        self.state = (0, (NAN, NAN, NAN), (0.0, 0.0, 0.0), 0.0)
+
+    def directional_index(self, plus, minus, ranges):
+        """return the DX of the smoothed moves, None where talib skips the bar."""
+        if abs(ranges) < 1e-8:
+            return None
+        plus_di, minus_di = 100 * plus / ranges, 100 * minus / ranges
+        if abs(plus_di + minus_di) < 1e-8:
+            return None
+        return 100 * abs(minus_di - plus_di) / (plus_di + minus_di)
+
+    def step(self, state, high, low, close):
+        count, (prev_high, prev_low, prev_close), smoothed, adx = state
+        count += 1
+        bar = (high, low, close)
+        if count == 1:
+            return (count, bar, smoothed, adx), NAN
+
+        period = self.period
+        diff_plus, diff_minus = high - prev_high, prev_low - low
+        plus_dm = diff_plus if diff_plus > 0 and diff_plus > diff_minus else 0.0
+        minus_dm = diff_minus if diff_minus > 0 and diff_plus < diff_minus else 0.0
+        true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        moves = count - 1
+        if moves < period:
+            plus, minus, ranges = smoothed
+            smoothed = (plus + plus_dm, minus + minus_dm, ranges + true_range)
+            return (count, bar, smoothed, adx), NAN
+        smoothed = tuple(
+            value - value / period + move
+            for value, move in zip(smoothed, (plus_dm, minus_dm, true_range))
+        )
+
+        dx = self.directional_index(*smoothed)
+        dx_count = moves - period + 1
+        value = NAN
+        if dx_count <= period:
+            # the first ADX is the mean of the first DX values, the skipped ones as 0.
+            adx += dx or 0.0
+            if dx_count == period:
+                adx /= period
+                value = adx
+        else:
+            if dx is not None:
+                adx = (adx * (period - 1) + dx) / period
+            value = adx
+        return (count, bar, smoothed, adx), value
+
+    def update(self, high, low, close):
+        self.state, value = self.step(self.state, high, low, close)
+        return value
+
+    def peek(self, high, low, close):
+        return self.step(self.state, high, low, close)[1]
+
+
+class IncrementalBBands:
+    """Bollinger bands of the SMA and 2 population deviations, like talib."""
+
+    def __init__(self, period=int(NSE.BB_TIMEPERIOD), deviations=2.0):
+        self.window = RollingMean(period)
+        self.deviations = deviations
+
+    def bands(self, mean, deviation):
+        spread = self.deviations * deviation
+        return mean + spread, mean, mean - spread
+
+    def update(self, close):
+        return self.bands(*self.window.update(close))
+
+    def peek(self, close):
+        return self.bands(*self.window.peek(close))
+
+
+class IncrementalStochastic:
+    """slow stochastic of SMA smoothed %K and %D, like talib."""
+
+    def __init__(
+        self,
+        fastk_period=int(NSE.STOCH_FASTK_PERIOD),
+        slowk_period=int(NSE.STOCH_SLOWK_PERIOD),
+        slowd_period=int(NSE.STOCH_SLOWD_PERIOD),
+    ):
+        self.highest = MonotonicWindow(fastk_period, is_max=True)
+        self.lowest = MonotonicWindow(fastk_period, is_max=False)
+        self.fastk_period = fastk_period
+        self.slow_k = RollingMean(slowk_period)
+        self.slow_d = RollingMean(slowd_period)
+
+    @staticmethod
+    def fast_k(close, highest, lowest):
+        ranges = highest - lowest
+        return (close - lowest) * 100 / ranges if ranges != 0 else 0.0
+
+    def update(self, high, low, close):
+        highest = self.highest.update(high)
+        lowest = self.lowest.update(low)
+        if self.highest.count < self.fastk_period:
+            return NAN, NAN
+        slow_k = self.slow_k.update(self.fast_k(close, highest, lowest))[0]
+        if math.isnan(slow_k):
+            return NAN, NAN
+        slow_d = self.slow_d.update(slow_k)[0]
+        return (NAN, NAN) if math.isnan(slow_d) else (slow_k, slow_d)
+
+    def peek(self, high, low, close):
+        if self.highest.count + 1 < self.fastk_period:
+            return NAN, NAN
+        fast_k = self.fast_k(close, self.highest.peek(high), self.lowest.peek(low))
+        slow_k = self.slow_k.peek(fast_k)[0]
+        if math.isnan(slow_k):
+            return NAN, NAN
+        slow_d = self.slow_d.peek(slow_k)[0]
+        return (NAN, NAN) if math.isnan(slow_d) else (slow_k, slow_d)
+
+
+class IncrementalIndicators:
+    """All the indicators of a symbol, advanced bar by bar."""
+
+    def __init__(self):
+        self.rsi = IncrementalRSI()
+        self.adx = IncrementalADX()
+        self.bbands = IncrementalBBands()
+        self.stoch = IncrementalStochastic()
+        self.ema = IncrementalEMA()
+        self.bars = 0
+
+    @classmethod
+    def from_history(cls, history, high_col, low_col, close_col):
+        """return the state seeded with every bar of the history frame."""
+        state = cls()
+        for high, low, close in zip(
+            history[high_col].to_numpy(dtype=float),
+            history[low_col].to_numpy(dtype=float),
+            history[close_col].to_numpy(dtype=float),
+        ):
+            state.update(high, low, close)
+        return state
+
+    @staticmethod
+    def latest(rsi, adx, bands, stoch, ema):
+        bb_high, bb_mid, bb_low = bands
+        stoch_k, stoch_d = stoch
+        return Indicators(
+            rsi=round(rsi, 2),
+            adx=round(adx, 2),
+            bb_high=round(bb_high, 2),
+            bb_mid=round(bb_mid, 2),
+            bb_low=round(bb_low, 2),
+            stoch_k=round(stoch_k, 2),
+            stoch_d=round(stoch_d, 2),
+            ema_20=round(ema, 2),
+        )
+
+    def update(self, high, low, close):
+        """add a completed bar, return the latest values like IndicatorEngine.compute."""
+        self.bars += 1
+        return self.latest(
+            self.rsi.update(close),
+            self.adx.update(high, low, close),
+            self.bbands.update(close),
+            self.stoch.update(high, low, close),
+            self.ema.update(close),
+        )
+
+    def peek(self, high, low, close):
+        """return the latest values with the in-progress bar, the state is unchanged."""
+        return self.latest(
+            self.rsi.peek(close),
+            self.adx.peek(high, low, close),
+            self.bbands.peek(close),
+            self.stoch.peek(high, low, close),
+            self.ema.peek(close),
+        )
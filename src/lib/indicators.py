@@ -0,0 +1,267 @@
+"""class to implement the indicator engine.
+Every configured indicator is computed once per price series, directly on
+contiguous float64 arrays, for a single symbol or for a stacked price matrix.
+"""
+
+from typing import NamedTuple
+
+import numpy as np
+
+from constants.stocks import NSE
+from lib.instrumentation import Instrumentation
+
+
+class Indicators(NamedTuple):
+    """latest indicator values, arrays of values when computed over a matrix."""
+
+    rsi: float
+    adx: float
+    bb_high: float
+    bb_mid: float
+    bb_low: float
+    stoch_k: float
+    stoch_d: float
+    ema_20: float
+    # full indicator series keyed by field name, only when requested.
+    series: dict = None
+
+
+class IndicatorEngine:
+    """Computes RSI, ADX, Bollinger bands, Stochastic and EMA in one pass."""
+
+    def __init__(
+        self,
+        rsi_period=int(NSE.DEFAULT_TIMEPERIOD),
+        adx_period=int(NSE.ADX_TIMEPERIOD),
+        bb_period=int(NSE.BB_TIMEPERIOD),
+        ema_period=int(NSE.EMA_TIMEPERIOD),
+        fastk_period=int(NSE.STOCH_FASTK_PERIOD),
+        slowk_period=int(NSE.STOCH_SLOWK_PERIOD),
+        slowd_period=int(NSE.STOCH_SLOWD_PERIOD),
+    ):
+        self.rsi_period = rsi_period
+        self.adx_period = adx_period
+        self.bb_period = bb_period
+        self.ema_period = ema_period
+        self.fastk_period = fastk_period
+        self.slowk_period = slowk_period
+        self.slowd_period = slowd_period
+
+    @staticmethod
+    def as_array(values):
+        """return the values as a contiguous float64 array without copying if possible."""
+        return np.ascontiguousarray(values, dtype=np.float64)
+
+    def series(self, high, low, close):
+        """return the full series of every indicator."""
+        import talib
+
+        high = self.as_array(high)
+        low = self.as_array(low)
+        close = self.as_array(close)
+
+        with Instrumentation.stage("indicator_rsi"):
+            rsi = talib.RSI(close, self.rsi_period)
+        with Instrumentation.stage("indicator_adx"):
+            adx = talib.ADX(high, low, close, timeperiod=self.adx_period)
+        with Instrumentation.stage("indicator_bbands"):
+            bb_high, bb_mid, bb_low = talib.BBANDS(close, self.bb_period)
+        with Instrumentation.stage("indicator_stoch"):
+            stoch_k, stoch_d = talib.STOCH(
+                high,
+                low,
+                close,
+                fastk_period=self.fastk_period,
+                slowk_period=self.slowk_period,
+                slowd_period=self.slowd_period,
+            )
+        with Instrumentation.stage("indicator_ema"):
+            ema_20 = talib.EMA(close, timeperiod=self.ema_period)
+        return {
+            "rsi": rsi,
+            "adx": adx,
+            "bb_high": bb_high,
+            "bb_mid": bb_mid,
+            "bb_low": bb_low,
+            "stoch_k": stoch_k,
+            "stoch_d": stoch_d,
+            "ema_20": ema_20,
+        }
+
+    def compute(self, high, low, close, with_series=False):
+        """return the latest values of every indicator for a single symbol."""
+        series = self.series(high, low, close)
+        latest = {
+            name: round(float(values[-1]), 2) if len(values) else float("nan")
+            for name, values in series.items()
+        }
+        return Indicators(**latest, series=series if with_series else None)
+
+    def compute_frame(self, history, high_col, low_col, close_col, with_series=False):
+        """return the latest values of every indicator for a history frame."""
+        return self.compute(
+            history[high_col].to_numpy(),
+            history[low_col].to_numpy(),
+            history[close_col].to_numpy(),
+            with_series=with_series,
+        )
+
+    def compute_matrix(self, high, low, close):
+        """return the latest values for a matrix of symbols x bars, one array per field.
+
+        rows may be left padded with NaN for symbols with a shorter history, rows
+        starting at the same bar are computed together with vectorized kernels.
+        """
+        high = self.as_array(high)
+        low = self.as_array(low)
+        close = self.as_array(close)
+
+        latest = {
+            field: np.full(close.shape[0], np.nan) for field in Indicators._fields[:-1]
+        }
+        valid = ~np.isnan(close)
+        starts = valid.argmax(axis=1)
+        for start in np.unique(starts):
+            rows = np.flatnonzero((starts == start) & valid[:, start])
+            gaps = ~valid[rows, start:].all(axis=1)
+            bars = close.shape[1] - start
+            if bars > self.lookback():
+                block = rows[~gaps]
+                values = self.latest_block(
+                    high[block, start:], low[block, start:], close[block, start:]
+                )
+                for field, field_values in values.items():
+                    latest[field][block] = field_values
+                rows = rows[gaps]
+            # talib does not accept NaN in between the values, they end up NaN.
+            for row in rows:
+                series = self.series(
+                    high[row, start:], low[row, start:], close[row, start:]
+                )
+                for field, field_values in series.items():
+                    latest[field][row] = field_values[-1]
+        latest = {field: np.round(values, 2) for field, values in latest.items()}
+        return Indicators(**latest)
+
+    def lookback(self):
+        """return the number of bars needed before all the indicators have a value."""
+        return max(
+            self.rsi_period,
+            2 * self.adx_period - 1,
+            self.bb_period - 1,
+            self.ema_period - 1,
+            self.fastk_period + self.slowk_period + self.slowd_period - 3,
+        )
+
+    def latest_block(self, high, low, close):
+        """return the latest values for a block of gap free rows, matching talib."""
+        bb_mid, bb_dev = self.latest_bbands(close)
+        stoch_k, stoch_d = self.latest_stoch(high, low, close)
+        return {
+            "rsi": self.latest_rsi(close),
+            "adx": self.latest_adx(high, low, close),
+            "bb_high": bb_mid + 2 * bb_dev,
+            "bb_mid": bb_mid,
+            "bb_low": bb_mid - 2 * bb_dev,
+            "stoch_k": stoch_k,
+            "stoch_d": stoch_d,
+            "ema_20": self.latest_ema(close),
+        }
+
+    def latest_ema(self, close):
+        period = self.ema_period
+        factor = 2.0 / (period + 1)
+        # the recursions walk the bars, so keep each bar contiguous in memory.
+        close = np.ascontiguousarray(close.T)
+        ema = close[:period].mean(axis=0)
+        for bar in close[period:]:
+            ema += (bar - ema) * factor
+        return ema
+
+    def latest_rsi(self, close):
+        period = self.rsi_period
+        diff = np.diff(close, axis=1).T
+        moves = np.ascontiguousarray(
+            np.stack([np.maximum(diff, 0.0), np.maximum(-diff, 0.0)], axis=1)
+        )
+        avg_moves = moves[:period].sum(axis=0) / period
+        for bar in moves[period:]:
+            avg_moves *= period - 1
+            avg_moves += bar
+            avg_moves /= period
+        avg_gain, avg_loss = avg_moves
+        total = avg_gain + avg_loss
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(np.abs(total) < 1e-8, 0.0, 100 * avg_gain / total)
+
+    def latest_adx(self, high, low, close):
+        period = self.adx_period
+        high = np.ascontiguousarray(high.T)
+        low = np.ascontiguousarray(low.T)
+        close = np.ascontiguousarray(close.T)
+        diff_plus = high[1:] - high[:-1]
+        diff_minus = low[:-1] - low[1:]
+        is_minus = (diff_minus > 0) & (diff_plus < diff_minus)
+        is_plus = ~is_minus & (diff_plus > 0) & (diff_plus > diff_minus)
+
+        # bars x (+DM, -DM, TR) x symbols, Wilder smoothed together.
+        moves = np.empty((len(diff_plus), 3, high.shape[1]))
+        np.multiply(diff_plus, is_plus, out=moves[:, 0])
+        np.multiply(diff_minus, is_minus, out=moves[:, 1])
+        np.subtract(high[1:], low[1:], out=moves[:, 2])
+        np.maximum(moves[:, 2], np.abs(high[1:] - close[:-1]), out=moves[:, 2])
+        np.maximum(moves[:, 2], np.abs(low[1:] - close[:-1]), out=moves[:, 2])
+
+        smoothed = np.empty_like(moves[period - 1 :])
+        running = moves[: period - 1].sum(axis=0)
+        for idx, bar in enumerate(moves[period - 1 :]):
+            running -= running / period
+            running += bar
+            smoothed[idx] = running
+
+        plus, minus, ranges = smoothed.transpose(1, 0, 2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # talib skips the bars where the range or the DI sum is zero.
+            ranges = np.where(np.abs(ranges) < 1e-8, np.nan, ranges)
+            plus_di = 100 * plus / ranges
+            minus_di = 100 * minus / ranges
+            di_sum = plus_di + minus_di
+            di_sum = np.where(np.abs(di_sum) < 1e-8, np.nan, di_sum)
+            dx = 100 * np.abs(minus_di - plus_di) / di_sum
+
+        adx = np.nan_to_num(dx[:period]).sum(axis=0) / period
+        skipped = np.isnan(dx[period:])
+        for bar_dx, bar_skipped in zip(dx[period:], skipped):
+            if bar_skipped.any():
+                adx = np.where(bar_skipped, adx, (adx * (period - 1) + bar_dx) / period)
+            else:
+                adx *= period - 1
+                adx += bar_dx
+                adx /= period
+        return adx
+
+    def latest_bbands(self, close):
+        window = close[:, -self.bb_period :]
+        mean = window.mean(axis=1)
+        variance = (window * window).mean(axis=1) - mean * mean
+        return mean, np.sqrt(np.maximum(variance, 0.0))
+
+    def latest_stoch(self, high, low, close):
+        bars = self.slowk_period + self.slowd_period - 1
+        span = self.fastk_period + bars - 1
+        highest = np.lib.stride_tricks.sliding_window_view(
+            high[:, -span:], self.fastk_period, axis=1
+        ).max(axis=2)
+        lowest = np.lib.stride_tricks.sliding_window_view(
+            low[:, -span:], self.fastk_period, axis=1
+        ).min(axis=2)
+        ranges = highest - lowest
+        fast_k = np.where(
+            ranges != 0,
+            (close[:, -bars:] - lowest) * 100 / np.where(ranges, ranges, 1),
+            0.0,
+        )
+        slow_k = np.lib.stride_tricks.sliding_window_view(
+            fast_k, self.slowk_period, axis=1
+        ).mean(axis=2)
+        return slow_k[:, -1], slow_k[:, -self.slowd_period :].mean(axis=1)
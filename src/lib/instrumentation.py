@@ -0,0 +1,234 @@
+"""class to implement the hot path instrumentation.
+Stage timers and counters are accumulated in memory by each process and flushed
+into a local SQLite database, so that the scan is measured inside the worker
+processes too. When switched off, a stage is a shared no-op context manager.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from constants.config import Configuration
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class NullStage:
+    """stage used while the instrumentation is off."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+class StageTimer:
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class Instrumentation:
+    """Per-stage timers and counters of the scans, aggregated across processes."""
+
+    _shared = None
+
+    def __init__(self, path=None):
+        self.path = path or Configuration.INSTRUMENTATION_PATH
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        # stage name to [calls, seconds, max seconds] and counter name to value.
+        self.stages = {}
+        self.counters = {}
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS stages (name TEXT PRIMARY KEY, "
+                "calls INTEGER, seconds REAL, max_seconds REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL)"
+            )
+
+    @classmethod
+    def shared(cls):
+        """return the recorder of the current process."""
+        if cls._shared is None or cls._shared.pid != os.getpid():
+            cls._shared = cls()
+        return cls._shared
+
+    @staticmethod
+    def stage(name):
+        """return a context manager timing the stage, a no-op one when switched off."""
+        if not Configuration.INSTRUMENTATION:
+            return NULL_STAGE
+        return StageTimer(Instrumentation.shared(), name)
+
+    @staticmethod
+    def count(name, value=1):
+        """add to the counter, nothing when switched off."""
+        if Configuration.INSTRUMENTATION:
+            recorder = Instrumentation.shared()
+            with recorder.lock:
+                recorder.counters[name] = recorder.counters.get(name, 0) + value
+
+    @staticmethod
+    def flush():
+        """write what this process recorded since the last flush, e.g. once per symbol."""
+        if Configuration.INSTRUMENTATION:
+            Instrumentation.shared().write()
+
+    def observe(self, name, seconds):
+        with self.lock:
+            calls, total, longest = self.stages.get(name, (0, 0.0, 0.0))
+            self.stages[name] = (calls + 1, total + seconds, max(longest, seconds))
+
+    def write(self):
+        with self.lock:
+            stages, self.stages = self.stages, {}
+            counters, self.counters = self.counters, {}
+            if not stages and not counters:
+                return
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT INTO stages VALUES (?, ?, ?, ?) ON CONFLICT(name) DO UPDATE "
+                    "SET calls = calls + excluded.calls, seconds = seconds + excluded.seconds, "
+                    "max_seconds = MAX(max_seconds, excluded.max_seconds)",
+                    [(name, *values) for name, values in stages.items()],
+                )
+                self.conn.executemany(
+                    "INSERT INTO counters VALUES (?, ?) ON CONFLICT(name) DO UPDATE "
+                    "SET value = value + excluded.value",
+                    counters.items(),
+                )
+
+    def snapshot(self):
+        """return the totals of all the processes since the last reset."""
+        self.write()
+        with self.lock:
+            stages = self.conn.execute(
+                "SELECT name, calls, seconds, max_seconds FROM stages ORDER BY name"
+            ).fetchall()
+            counters = self.conn.execute(
+                "SELECT name, value FROM counters ORDER BY name"
+            ).fetchall()
+        return {
+            "stages": {
+                name: {"calls": calls, "seconds": seconds, "max_seconds": longest}
+                for name, calls, seconds, longest in stages
+            },
+            "counters": dict(counters),
+        }
+
+    def reset(self):
+        with self.lock, self.conn:
+            self.stages, self.counters = {}, {}
+            self.conn.execute("DELETE FROM stages")
+            self.conn.execute("DELETE FROM counters")
+
+    @staticmethod
+    def breakdown(before, after):
+        """return the calls and seconds of every stage between two snapshots."""
+        rows = []
+        for name, stats in after["stages"].items():
+            old = before["stages"].get(name, {"calls": 0, "seconds": 0.0})
+            calls = stats["calls"] - old["calls"]
+            if calls:
+                seconds = stats["seconds"] - old["seconds"]
+                rows.append(
+                    {
+                        "stage": name,
+                        "calls": calls,
+                        "seconds": round(seconds, 3),
+                        "mean_ms": round(seconds * 1000 / calls, 3),
+                    }
+                )
+        return sorted(rows, key=lambda row: row["seconds"], reverse=True)
+
+    @staticmethod
+    def prometheus(snapshot):
+        """return the snapshot in the Prometheus text exposition format."""
+        lines = [
+            "# TYPE niveshak_stage_calls_total counter",
+            "# TYPE niveshak_stage_seconds_total counter",
+            "# TYPE niveshak_stage_max_seconds gauge",
+        ]
+        for name, stats in snapshot["stages"].items():
+            lines.append(
+                f'niveshak_stage_calls_total{{stage="{name}"}} {stats["calls"]}'
+            )
+            lines.append(
+                f'niveshak_stage_seconds_total{{stage="{name}"}} {stats["seconds"]}'
+            )
+            lines.append(
+                f'niveshak_stage_max_seconds{{stage="{name}"}} {stats["max_seconds"]}'
+            )
+        lines.append("# TYPE niveshak_events_total counter")
+        for name, value in snapshot["counters"].items():
+            lines.append(f'niveshak_events_total{{name="{name}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """serves /metrics in the Prometheus text format and /metrics.json."""
+
+    def do_GET(self):
+        snapshot = Instrumentation.shared().snapshot()
+        if self.path == "/metrics":
+            body = Instrumentation.prometheus(snapshot)
+            content_type = "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body = json.dumps(snapshot)
+            content_type = "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="export the scan instrumentation.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="serve the metrics over HTTP.")
+    serve_parser.add_argument("--port", type=int, default=9108)
+    dump_parser = commands.add_parser("dump", help="dump the metrics as JSON.")
+    dump_parser.add_argument("path", nargs="?", help="output file, stdout if unset.")
+    commands.add_parser("reset", help="clear the metrics.")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        HTTPServer(("", args.port), MetricsHandler).serve_forever()
+    elif args.command == "dump":
+        dump = json.dumps(Instrumentation.shared().snapshot(), indent=2)
+        if args.path:
+            with open(args.path, "w") as fh:
+                fh.write(dump)
+        else:
+            print(dump)
+    else:
+        Instrumentation.shared().reset()
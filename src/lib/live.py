@@ -0,0 +1,109 @@
+"""class to implement the live intraday mode.
+The rows of a scanned watchlist are kept up to date from the in-progress daily bars
+of its symbols. Only the symbols whose bar moved since the previous poll get their
+indicators (peeked from the incremental state) and trade signal recomputed.
+"""
+
+import datetime
+import logging
+import sys
+from urllib.parse import quote
+
+import pandas as pd
+
+from constants.config import Configuration
+from constants.stocks import InfoKeys, RawInfoKeys
+from lib.incremental import IncrementalIndicators
+from lib.instrumentation import Instrumentation
+from lib.nifty import Nifty
+from lib.nifty_live import NiftyLive
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class LiveBoard:
+    """Rows of a watchlist patched in place from the polled live bars."""
+
+    def __init__(self, name, rows):
+        self.name = name
+        # only the rows having quotes can follow the price.
+        self.rows = {
+            row[InfoKeys.SYMBOL]: row
+            for row in rows
+            if row and pd.notna(row.get(InfoKeys.LAST_PRICE))
+        }
+        self.table = pd.DataFrame(rows).set_index(InfoKeys.SYMBOL, drop=False)
+        self.table.index.name = None
+        self.states = {}
+        self.bars = {}
+        self.polled_at = None
+
+    def seed(self, bars):
+        """seed the indicator state of the symbols from the bars before their live bar."""
+        nifty = Nifty()
+        bulk_history = NiftyLive.get_historical_data_bulk(list(bars))
+        for symbol, bar in bars.items():
+            history = NiftyLive.slice_historical_data(bulk_history, symbol)
+            if history is None:
+                history = NiftyLive.get_historical_data(quote(symbol, safe="SBIN.NS"))
+            if len(history) == 0:
+                continue
+            # the stored history may already hold an incomplete bar of the live day.
+            history = history[history.index.date < bar.date]
+            self.states[symbol] = IncrementalIndicators.from_history(
+                history,
+                nifty.stock_history_high,
+                nifty.stock_history_low,
+                nifty.stock_history_close,
+            )
+
+    def poll(self):
+        """fetch the live bars, update the rows that moved and return their symbols."""
+        with Instrumentation.stage("live_poll"):
+            bars = NiftyLive.get_live_bars(list(self.rows))
+        self.polled_at = datetime.datetime.now()
+        unseeded = {
+            symbol: bar for symbol, bar in bars.items() if symbol not in self.bars
+        }
+        if unseeded:
+            with Instrumentation.stage("live_seed"):
+                self.seed(unseeded)
+
+        changed = []
+        with Instrumentation.stage("live_update"):
+            for symbol, bar in bars.items():
+                previous = self.bars.get(symbol)
+                if bar == previous:
+                    continue
+                state = self.states.get(symbol)
+                if previous and state and bar.date > previous.date:
+                    # the day of the previous bar closed, it becomes part of the history.
+                    state.update(previous.high, previous.low, previous.close)
+                self.bars[symbol] = bar
+                self.update_row(symbol, bar, state)
+                changed.append(symbol)
+            if changed:
+                self.patch_table(changed)
+        Instrumentation.count("live_rows_changed", len(changed))
+        Instrumentation.flush()
+        return changed
+
+    def update_row(self, symbol, bar, state):
+        """apply the bar to the row, and recompute its indicators and trade signal."""
+        row = self.rows[symbol]
+        row[InfoKeys.LAST_PRICE] = bar.close
+        row[RawInfoKeys.INTRADAY_HIGH.name] = bar.high
+        row[RawInfoKeys.INTRADAY_LOW.name] = bar.low
+        if not state or not state.bars:
+            return
+        nifty = Nifty()
+        nifty.stock_info = row
+        nifty.add_indicators(state.peek(bar.high, bar.low, bar.close))
+        row[InfoKeys.EMA_DELTA] = nifty.stock_ema_delta()
+        nifty.guess_trade_signal()
+
+    def patch_table(self, symbols):
+        """overwrite the changed rows of the table, the others are left untouched."""
+        changed = pd.DataFrame([self.rows[symbol] for symbol in symbols], index=symbols)
+        columns = [col for col in changed.columns if col in self.table.columns]
+        self.table.loc[symbols, columns] = changed[columns]
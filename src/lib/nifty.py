@@ -4,14 +4,14 @@ import sys
 from pprint import pformat
 from urllib.parse import quote
 
-import curl_cffi
-import requests
-import talib
-import yfinance as yf
-
-from constants.config import Configuration, LiveDataLibrary
-from constants.stocks import RawInfoKeys, NSE, InfoKeys, RawInfoKeysYF
+from constants.config import Configuration, ReplayMode
+from constants.stocks import RawInfoKeys, InfoKeys
+from lib.indicators import IndicatorEngine
+from lib.instrumentation import Instrumentation
 from lib.nifty_live import NiftyLive
+from lib.providers import Providers
+from lib.signal_rules import SignalRules
+from lib.symbol_master import SymbolMaster
 from lib.utils import Utils
 
 logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
@@ -20,207 +20,145 @@ logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
 class Nifty:
     """Implements all the NSE related ops."""
 
+    # the stock information fields read out of the quotes, see QUOTE_FIELD_TTL.
+    QUOTE_FIELDS = [key.name for key in RawInfoKeys] + [InfoKeys.NAME]
+
     def __init__(self):
         self.stock_info = None
         self.stock_history = None
         self.safe_symbol = None
+        self.symbol_info = None
 
-        self.stock_history_close = NSE.YF_HISTCOL_CLOSE
-        self.stock_history_high = NSE.YF_HISTCOL_HIGH
-        self.stock_history_low = NSE.YF_HISTCOL_LOW
+        self.provider = Providers.get()
+        _, high_col, low_col, close_col, _ = self.provider.HISTORY_COLUMNS
+        self.stock_history_close = close_col
+        self.stock_history_high = high_col
+        self.stock_history_low = low_col
 
-        if Configuration.LIVE_DATA_LIB == LiveDataLibrary.NSEPYTHON:
-            self.stock_history_close = NSE.HISTCOL_CLOSE
-            self.stock_history_high = NSE.HISTCOL_HIGH
-            self.stock_history_low = NSE.HISTCOL_LOW
+    def get_stock_info(
+        self, symbol: str, stock_history=None, raw_info=None, timeframe=None
+    ):
+        """fetch individual stock information, the indicators on bars of the timeframe.
 
-    def get_stock_info(self, symbol: str):
-        """fetch individual stock information."""
+        when the history or the quotes are already fetched, they are not fetched again.
+        """
 
         self.stock_info = {InfoKeys.SYMBOL: symbol}
         self.safe_symbol = quote(symbol, safe="SBIN.NS")
-        self.validate_symbol()
-        raw_info = None
-        try:
-            raw_info = NiftyLive.get_stock_quotes(self.safe_symbol)
-        except requests.exceptions.JSONDecodeError as json_err:
-            logging.error(f"failed to get stock into for '{symbol}'.")
-            logging.error(str(json_err))
-
-        if raw_info and (
-            Configuration.LIVE_DATA_LIB == LiveDataLibrary.YFINANCE
-            or (
-                Configuration.LIVE_DATA_LIB == LiveDataLibrary.NSEPYTHON
-                and raw_info.get("info")
-            )
-        ):
+        self.symbol_info = None
+        with Instrumentation.stage("validate"):
+            valid = self.validate_symbol()
+        if not valid:
+            Instrumentation.count("symbols_invalid")
+            Instrumentation.flush()
+            return None
+        if raw_info is None:
+            try:
+                with Instrumentation.stage("fetch_quote"):
+                    raw_info = NiftyLive.get_stock_quotes(
+                        self.safe_symbol, self.QUOTE_FIELDS
+                    )
+            except ValueError as json_err:
+                logging.error(f"failed to get stock into for '{symbol}'.")
+                logging.error(str(json_err))
+
+        if self.provider.has_quotes(raw_info):
             logging.debug(pformat(raw_info))
         else:
             logging.error(f"failed to get info on '{symbol}'.")
+            Instrumentation.count("symbols_without_info")
+            Instrumentation.flush()
             return None
 
         logging.debug(f"fetching information on '{self.stock_info[InfoKeys.SYMBOL]}'.")
-        if Configuration.LIVE_DATA_LIB == LiveDataLibrary.YFINANCE:
-            for infokey in RawInfoKeysYF:
-                self.stock_info[infokey.name] = raw_info.get(infokey, 0)
-
-            # For ETFs YF does not give currentPrice, but populates regularMarketPrice
-            # So, manually populate that column in case of ETFs
-            if (
-                self.stock_info[InfoKeys.LAST_PRICE] == 0
-                and RawInfoKeysYF.ETF_LAST_PRICE in raw_info
-            ):
-                self.stock_info[InfoKeys.LAST_PRICE] = raw_info[
-                    RawInfoKeysYF.ETF_LAST_PRICE
-                ]
-            self.stock_info.pop(RawInfoKeysYF.ETF_LAST_PRICE.name)
-
-            # Handle when company name could not be fetched.
-            if self.stock_info[InfoKeys.NAME] == 0:
-                self.stock_info[InfoKeys.NAME] = str(self.stock_info[InfoKeys.NAME])
-        else:
-            for infokey in RawInfoKeys:
-                # construct the key to fetch the value.
-                infoval = raw_info
-                for key in infokey.value:
-                    infoval = infoval.get(key)
-                    if not infoval:
-                        break
-                self.stock_info[infokey.name] = infoval
+        quotes = self.provider.normalize_quotes(raw_info)
+        for infokey in RawInfoKeys:
+            self.stock_info[infokey.name] = quotes[infokey.name]
+        # Handle when company name could not be fetched.
+        self.stock_info[InfoKeys.NAME] = quotes[InfoKeys.NAME] or (
+            self.symbol_info.name if self.symbol_info else ""
+        )
         del raw_info
         logging.debug("stock info")
         logging.debug(pprint.pformat(self.stock_info))
 
-        self.stock_history = NiftyLive.get_historical_data(self.safe_symbol)
+        self.stock_history = stock_history
+        if self.stock_history is None:
+            with Instrumentation.stage("fetch_history"):
+                self.stock_history = NiftyLive.get_historical_data(
+                    self.safe_symbol, timeframe
+                )
         logging.debug(pprint.pformat(self.stock_history))
         if len(self.stock_history) != 0 and not self.stock_history.empty:
-            # Add the calculated indicators.
-            self.stock_info[InfoKeys.RSI] = self.stock_rsi()
-            self.stock_info[InfoKeys.ADX] = self.stock_adx()
-            self.stock_info[InfoKeys.BB_HIGH] = self.stock_bollinger_bands()[0]
-            self.stock_info[InfoKeys.BB_AVG] = self.stock_bollinger_bands()[1]
-            self.stock_info[InfoKeys.BB_LOW] = self.stock_bollinger_bands()[2]
-            self.stock_info[InfoKeys.STOCH_K] = self.stock_stochastic()[0]
-            self.stock_info[InfoKeys.STOCH_D] = self.stock_stochastic()[1]
-            self.stock_info[InfoKeys.EMA_20] = self.stock_ema()
+            # Add the calculated indicators, each one computed once.
+            with Instrumentation.stage("indicators"):
+                self.add_indicators(self.stock_indicators())
 
             # Deduce signal for trade.
-            self.stock_info[InfoKeys.EMA_DELTA] = self.stock_ema_delta()
-            self.guess_trade_signal()
+            with Instrumentation.stage("signal"):
+                self.stock_info[InfoKeys.EMA_DELTA] = self.stock_ema_delta()
+                self.guess_trade_signal()
+        else:
+            Instrumentation.count("symbols_without_history")
 
         logging.debug(pformat(self.stock_info))
+        Instrumentation.count("symbols")
+        Instrumentation.flush()
         return self.stock_info
 
-    def stock_rsi(self):
-        rsi_data = talib.RSI(
-            self.stock_history[self.stock_history_close], int(NSE.DEFAULT_TIMEPERIOD)
+    def stock_indicators(self, with_series=False):
+        """compute all the indicators on the stock history in one pass."""
+        return IndicatorEngine().compute_frame(
+            self.stock_history,
+            self.stock_history_high,
+            self.stock_history_low,
+            self.stock_history_close,
+            with_series=with_series,
         )
-        return round(float(rsi_data.iloc[-1]), 2)
 
-    def stock_bollinger_bands(self):
-        bband_data = talib.BBANDS(self.stock_history[self.stock_history_close], 20)
-        return [round(float(bb_data.iloc[-1]), 2) for bb_data in bband_data]
-
-    def stock_adx(self):
-
-        adx_data = talib.ADX(
-            high=self.stock_history[self.stock_history_high],
-            low=self.stock_history[self.stock_history_low],
-            close=self.stock_history[self.stock_history_close],
-            timeperiod=int(NSE.ADX_TIMEPERIOD),
-        )
-        return round(float(adx_data.iloc[-1]), 2)
-
-    def stock_stochastic(self):
-        # Use the values for Stochastic Oscillator 10,3,3 for aggressive short term swing trading.
-        # Use the values for Stochastic Oscillator 21,5,5 for conservative medium term swing trading.
-        stoch_data = talib.STOCH(
-            high=self.stock_history[self.stock_history_high],
-            low=self.stock_history[self.stock_history_low],
-            close=self.stock_history[self.stock_history_close],
-            fastk_period=10,
-        )
-        return [round(float(st_data.iloc[-1]), 2) for st_data in stoch_data]
-
-    def stock_ema(self):
-        ema_data = talib.EMA(
-            self.stock_history[self.stock_history_close], timeperiod=20
-        )
-        return round(float(ema_data.iloc[-1]), 2)
+    def add_indicators(self, indicators):
+        """add the latest indicator values to the stock info."""
+        self.stock_info[InfoKeys.RSI] = indicators.rsi
+        self.stock_info[InfoKeys.ADX] = indicators.adx
+        self.stock_info[InfoKeys.BB_HIGH] = indicators.bb_high
+        self.stock_info[InfoKeys.BB_AVG] = indicators.bb_mid
+        self.stock_info[InfoKeys.BB_LOW] = indicators.bb_low
+        self.stock_info[InfoKeys.STOCH_K] = indicators.stoch_k
+        self.stock_info[InfoKeys.STOCH_D] = indicators.stoch_d
+        self.stock_info[InfoKeys.EMA_20] = indicators.ema_20
 
     def stock_ema_delta(self):
         return Utils.percentage_diff(
             self.stock_info[InfoKeys.LAST_PRICE], self.stock_info[InfoKeys.EMA_20]
         )
 
-    def find_adx_trend(self):
-        """return value of ADX strength."""
-        adx_strength = 0
-        msg = ""
-        if 0 < self.stock_info[InfoKeys.ADX] <= 25:
-            msg = "Weak"
-        elif 25 < self.stock_info[InfoKeys.ADX] <= 50:
-            msg = "Strong"
-            adx_strength = 1
-        elif 50 < self.stock_info[InfoKeys.ADX] <= 75:
-            msg = "Fairly Strong"
-            adx_strength = 2
-        elif self.stock_info[InfoKeys.ADX] > 75:
-            msg = "Extremely Strong"
-            adx_strength = 3
-
-        self.stock_info[InfoKeys.SIGNAL] = msg
-        return adx_strength
-
-    def find_stoch_trend(self):
-        """return value of Stochastic strength."""
-        msg = ""
+    def guess_trade_signal(self):
+        """label the trade signal with the signal rules."""
         stoch_diff = Utils.percentage_diff(
             self.stock_info[InfoKeys.STOCH_D], self.stock_info[InfoKeys.STOCH_K]
         )
         self.stock_info[InfoKeys.STOCH_DELTA] = f"{stoch_diff}%"
-
-        if -7.5 <= stoch_diff <= 7.5:
-            msg = "Breakout"
-        elif (
-            self.stock_info[InfoKeys.STOCH_K] > 80
-            or self.stock_info[InfoKeys.STOCH_K] < 20
-        ):
-            msg = "Reversal"
-        elif 20 < self.stock_info[InfoKeys.STOCH_K] < 80:
-            if stoch_diff < -7.5:
-                msg = "Uptrend"
-            else:
-                msg = "Downtrend"
-
-        if self.stock_info[InfoKeys.STOCH_K] > self.stock_info[InfoKeys.STOCH_D]:
-            msg += " Rise"
-        else:
-            msg += " Fall"
-        self.stock_info[InfoKeys.SIGNAL] += f" {msg}"
-
-    def find_bb_trend(self):
-        """return Bollinger band signal"""
-        msg = ""
-
-        if self.stock_info[InfoKeys.LAST_PRICE] > self.stock_info[InfoKeys.BB_HIGH]:
-            msg = "Sell."
-        elif self.stock_info[InfoKeys.LAST_PRICE] < self.stock_info[InfoKeys.BB_LOW]:
-            msg = "Buy."
-        else:
-            msg = "."
-        self.stock_info[InfoKeys.SIGNAL] += f" {msg}"
-
-    def guess_trade_signal(self):
-        self.find_adx_trend()
-        self.find_stoch_trend()
-        self.find_bb_trend()
+        self.stock_info[InfoKeys.SIGNAL] = SignalRules.shared().signal_row(
+            self.stock_info
+        )
 
     def validate_symbol(self):
-        """validate the stock ticker symbol"""
-        yf_ticker = yf.Ticker(self.safe_symbol)
-        try:
-            yf_ticker.isin
-        except curl_cffi.requests.exceptions.HTTPError:
-            logging.error(f"invalid stock symbol: {self.safe_symbol}.")
-            self.safe_symbol = "SBIN.NS"
+        """validate the stock ticker symbol against the symbol master, without any
+        network calls.
+
+        return False for an invalid symbol, it has no stock information then.
+        """
+        if Configuration.REPLAY_MODE == ReplayMode.REPLAY:
+            # the recorded fixtures are served as they are, without any network calls.
+            return True
+
+        master = SymbolMaster.shared()
+        if not master.is_covered(self.safe_symbol):
+            # the master cannot tell, e.g. the indices, the quotes fetch tells then.
+            return True
+        self.symbol_info = master.lookup(self.safe_symbol)
+        if self.symbol_info is None:
+            # no network calls for a symbol the exchange does not list.
+            logging.error(f"'{self.safe_symbol}' is not in the symbol master.")
+            return False
+        return True
@@ -0,0 +1,292 @@
+"""class to implement the asyncio based live data fetching.
+A single pooled HTTP client (keep-alive, HTTP/2) serves hundreds of concurrent
+symbol fetches from one process, bounded by a semaphore and the provider rate limit.
+"""
+
+import asyncio
+import datetime
+import logging
+import queue
+import sys
+import threading
+from urllib.parse import quote
+
+import pandas as pd
+
+from constants.config import Configuration, LiveDataLibrary, ReplayMode, Timeframe
+from constants.stocks import NSE, RawInfoKeysYF
+from lib.history_store import HistoryStore
+from lib.instrumentation import Instrumentation
+from lib.nifty_live import NiftyLive
+from lib.providers import NSEProvider
+from lib.quote_cache import QuoteCache
+from lib.replay import ReplayProvider
+from lib.resilience import ProviderGuard
+from lib.timeframes import Timeframes
+from lib.utils import Utils
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class NiftyAsync:
+    """Fetches quotes and history of many symbols concurrently."""
+
+    YF_CHART_URL = "https://query1.finance.yahoo.com/v8/finance/chart/{symbol}"
+    NSE_HOME_URL = "https://www.nseindia.com"
+    NSE_QUOTE_URL = "https://www.nseindia.com/api/quote-equity"
+    NSE_HISTORY_URL = "https://www.nseindia.com/api/historicalOR/cm/equity"
+
+    def __init__(self, concurrency=None):
+        self.concurrency = concurrency or Configuration.ASYNC_CONCURRENCY
+        self.session = None
+        self.semaphore = None
+        self.guard = ProviderGuard.shared(Configuration.LIVE_DATA_LIB)
+        self.nse_warmed_up = None
+
+    async def __aenter__(self):
+        from curl_cffi.requests import AsyncSession
+
+        self.session = AsyncSession(
+            max_clients=self.concurrency,
+            impersonate="chrome",
+            timeout=Configuration.LIVE_DATA_TIMEOUT,
+        )
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def get_json(self, url, params=None):
+        """GET the url as JSON on the pooled session, guarded against provider failures."""
+        async with self.semaphore:
+            return await self.guard.call_async(self.get_json_once, url, params)
+
+    async def get_json_once(self, url, params=None):
+        response = await self.session.get(url, params=params)
+        response.raise_for_status()
+        return response.json()
+
+    async def warm_up_nse(self):
+        """NSE only serves its API with the cookies set by the home page."""
+        if self.nse_warmed_up is None:
+            self.nse_warmed_up = asyncio.ensure_future(
+                self.session.get(self.NSE_HOME_URL)
+            )
+        warm_up = self.nse_warmed_up
+        try:
+            await warm_up
+        except Exception:
+            # the next request warms up again instead of failing on the cached error.
+            if self.nse_warmed_up is warm_up:
+                self.nse_warmed_up = None
+            raise
+
+    async def get_symbol_data(self, symbol: str, timeframe=None, fields=None):
+        """return the quotes and the history of the symbol, like NiftyLive does.
+
+        the cached quotes are fresh for the given fields, see QuoteCache.ttl.
+        """
+        safe_symbol = quote(symbol, safe="SBIN.NS")
+        timeframe = timeframe or Configuration.TIMEFRAME
+        base = Timeframes.base(timeframe)
+        if Configuration.REPLAY_MODE == ReplayMode.REPLAY:
+            return await self.replay_symbol_data(safe_symbol, timeframe)
+
+        store = HistoryStore(timeframe=base) if Configuration.HISTORY_CACHE else None
+        # the parquet reads and writes run off the event loop.
+        stored_data = (
+            await asyncio.to_thread(store.load, safe_symbol) if store else None
+        )
+        last_timestamp = NiftyLive.last_stored_timestamp(stored_data)
+
+        meta = {}
+        if Configuration.LIVE_DATA_LIB == LiveDataLibrary.YFINANCE:
+            historical_data, meta = await self.yf_chart(
+                safe_symbol, last_timestamp, base
+            )
+        elif NiftyLive.from_bhavcopy(last_timestamp):
+            historical_data = pd.DataFrame()
+        elif base == Timeframe.D1:
+            historical_data = await self.nse_history(safe_symbol, last_timestamp)
+        else:
+            logging.error(f"no {base} bars from {Configuration.LIVE_DATA_LIB}.")
+            historical_data = pd.DataFrame()
+        if store:
+            historical_data = await asyncio.to_thread(
+                store.append, safe_symbol, historical_data, stored_data
+            )
+        if historical_data.empty:
+            logging.error(f"failed to get any data, check the symbol '{symbol}'.")
+            historical_data = {}
+        else:
+            historical_data = HistoryStore.lookback_window(
+                historical_data.sort_index(), Timeframes.lookback_days(timeframe)
+            )
+
+        async def fetch_quotes(safe_symbol):
+            if Configuration.LIVE_DATA_LIB == LiveDataLibrary.YFINANCE:
+                # the previous close falls back on the daily bars only.
+                daily_data = historical_data if base == Timeframe.D1 else {}
+                return self.yf_quotes(meta, daily_data)
+            return await self.nse_quotes(safe_symbol)
+
+        if Configuration.QUOTE_CACHE:
+            stock_quotes = await QuoteCache.shared().get_or_fetch_async(
+                safe_symbol, fetch_quotes, fields
+            )
+        else:
+            stock_quotes = await fetch_quotes(safe_symbol)
+        if Configuration.REPLAY_MODE == ReplayMode.RECORD:
+            replay = ReplayProvider()
+            if stock_quotes:
+                replay.record_quotes(safe_symbol, stock_quotes)
+            if len(historical_data) != 0:
+                replay.record_history(safe_symbol, historical_data, base)
+        if len(historical_data) != 0:
+            historical_data = HistoryStore().bars(historical_data, timeframe)
+        return stock_quotes, historical_data
+
+    @staticmethod
+    async def replay_symbol_data(symbol: str, timeframe=None):
+        """return the recorded quotes and history, waiting on the loop instead of blocking it."""
+        await asyncio.sleep(2 * Configuration.REPLAY_LATENCY)
+        replay = ReplayProvider(latency=0)
+        historical_data = replay.history(symbol, Timeframes.base(timeframe))
+        if not historical_data.empty:
+            historical_data = HistoryStore().bars(
+                HistoryStore.lookback_window(
+                    historical_data, Timeframes.lookback_days(timeframe)
+                ),
+                timeframe or Configuration.TIMEFRAME,
+            )
+        return replay.quotes(symbol), historical_data if len(historical_data) else {}
+
+    async def yf_chart(self, symbol: str, last_timestamp=None, interval=Timeframe.D1):
+        """return the bars of the interval and the chart meta data of the symbol."""
+        params = {"interval": interval, "includeAdjustedClose": "true"}
+        if last_timestamp is None:
+            params["range"] = Timeframes.yf_lookback_period(interval)
+        else:
+            params["period1"] = int(last_timestamp.normalize().timestamp())
+            params["period2"] = int(datetime.datetime.now().timestamp())
+
+        payload = await self.get_json(self.YF_CHART_URL.format(symbol=symbol), params)
+        result = payload["chart"]["result"][0]
+        meta = result["meta"]
+        if not result.get("timestamp"):
+            return pd.DataFrame(), meta
+
+        bars = result["indicators"]["quote"][0]
+        index = (
+            pd.to_datetime(result["timestamp"], unit="s", utc=True)
+            .tz_convert(meta["exchangeTimezoneName"])
+            .rename(NSE.YF_HISTCOL_SORTER)
+        )
+        if interval == Timeframe.D1:
+            index = index.normalize()
+        historical_data = pd.DataFrame(
+            {
+                NSE.YF_HISTCOL_OPEN: bars["open"],
+                NSE.YF_HISTCOL_HIGH: bars["high"],
+                NSE.YF_HISTCOL_LOW: bars["low"],
+                NSE.YF_HISTCOL_CLOSE: bars["close"],
+                NSE.YF_HISTCOL_VOLUME: bars["volume"],
+            },
+            index=index,
+            dtype="float64",
+        ).dropna(how="all")
+
+        # adjust for splits and dividends like yfinance does with auto_adjust.
+        adjclose = result["indicators"].get("adjclose")
+        if adjclose:
+            ratio = (
+                pd.Series(adjclose[0]["adjclose"], index=historical_data.index)
+                / historical_data[NSE.YF_HISTCOL_CLOSE]
+            )
+            for col in (
+                NSE.YF_HISTCOL_OPEN,
+                NSE.YF_HISTCOL_HIGH,
+                NSE.YF_HISTCOL_LOW,
+                NSE.YF_HISTCOL_CLOSE,
+            ):
+                historical_data[col] *= ratio
+        return historical_data, meta
+
+    @staticmethod
+    def yf_quotes(meta, historical_data):
+        """map the chart meta data onto the yfinance info keys."""
+        previous_close = meta.get("previousClose")
+        if previous_close is None and len(historical_data) > 1:
+            previous_close = float(historical_data[NSE.YF_HISTCOL_CLOSE].iloc[-2])
+        return {
+            RawInfoKeysYF.ETF_LAST_PRICE: meta.get("regularMarketPrice"),
+            RawInfoKeysYF.LAST_PRICE: meta.get("regularMarketPrice"),
+            RawInfoKeysYF.LAST_CLOSE: previous_close,
+            RawInfoKeysYF.INTRADAY_HIGH: meta.get("regularMarketDayHigh"),
+            RawInfoKeysYF.INTRADAY_LOW: meta.get("regularMarketDayLow"),
+            RawInfoKeysYF.NAME: meta.get("longName") or meta.get("shortName"),
+            RawInfoKeysYF.YEAR_HIGH: meta.get("fiftyTwoWeekHigh"),
+            RawInfoKeysYF.YEAR_LOW: meta.get("fiftyTwoWeekLow"),
+        }
+
+    async def nse_quotes(self, symbol: str):
+        await self.warm_up_nse()
+        return await self.get_json(self.NSE_QUOTE_URL, {"symbol": symbol})
+
+    async def nse_history(self, symbol: str, last_timestamp=None):
+        await self.warm_up_nse()
+        start_date = Utils.get_lookback_date()
+        if last_timestamp is not None:
+            start_date = Utils.get_ist_date(dateval=last_timestamp)
+        payload = await self.get_json(
+            self.NSE_HISTORY_URL,
+            {
+                "symbol": symbol,
+                "series": f'["{NSE.STOCK_CODE}"]',
+                "from": start_date,
+                "to": Utils.get_ist_date(dateval=datetime.datetime.now()),
+            },
+        )
+        historical_data = pd.DataFrame.from_records(payload.get("data", []))
+        if historical_data.empty:
+            return historical_data
+        return NSEProvider.index_history(historical_data)
+
+    async def fetch_all(self, symbols: list, results, timeframe=None, fields=None):
+        """fetch every symbol concurrently, putting (symbol, quotes, history) on results."""
+
+        async def fetch_one(symbol):
+            try:
+                with Instrumentation.stage("fetch_async"):
+                    stock_quotes, historical_data = await self.get_symbol_data(
+                        symbol, timeframe, fields
+                    )
+            except Exception as err:
+                logging.error(f"failed to fetch data for stock symbol {symbol}: {err}")
+                stock_quotes, historical_data = None, {}
+            results.put((symbol, stock_quotes, historical_data))
+
+        await asyncio.gather(*(fetch_one(symbol) for symbol in symbols))
+
+    @staticmethod
+    def iter_fetch(symbols: list, timeout=None, timeframe=None, fields=None):
+        """yield (symbol, quotes, history) of every symbol in completion order.
+
+        the event loop runs in a background thread, so that the caller can keep
+        rendering; raises TimeoutError when nothing completes within the timeout.
+        """
+        NiftyLive.sync_bhavcopy(symbols)
+        results = queue.Queue()
+
+        async def run():
+            async with NiftyAsync() as fetcher:
+                await fetcher.fetch_all(symbols, results, timeframe, fields)
+
+        thread = threading.Thread(target=asyncio.run, args=(run(),), daemon=True)
+        thread.start()
+        for _ in symbols:
+            try:
+                yield results.get(timeout=timeout or Configuration.LIVE_DATA_TIMEOUT)
+            except queue.Empty:
+                raise TimeoutError
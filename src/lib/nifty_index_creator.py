@@ -1,36 +1,202 @@
+"""class to implement the maintenance of the index watchlists.
+The NSE index constituent CSVs are streamed once each into sets of symbols, out of
+which the watchlists are computed as unions, differences or bands of nested indices,
+e.g. NIFTY 50-100 out of NIFTY 100 and NIFTY 50. The watchlist files are replaced
+atomically and the symbols added and removed are reported, so that only the added
+ones need their history fetched.
+"""
+
+import argparse
 import csv
-import pprint
+import logging
+import os
 import sys
-from collections import defaultdict
+from typing import NamedTuple
+from urllib.parse import quote
+
+from constants.config import Configuration, LiveDataLibrary
+from constants.datafiles import DataFiles
+from lib.wathclists import Watchlists
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class IndexDiff(NamedTuple):
+    """symbols added to and removed from a watchlist."""
+
+    name: str
+    added: list
+    removed: list
 
 
 class NiftyIndexCreator:
-    def read_index_symbols(selfi, csv_name):
-        print(f"reading csv file '{csv_name}'.")
-        columns = defaultdict(list)  # Dictionary to store column data
-
-        with open(csv_name, "r") as csv_file:
-            csv_reader = csv.DictReader(csv_file)
-            for row in csv_reader:
-                for col_name, value in row.items():
-                    if col_name == "Symbol":
-                        columns[col_name.lower()].append(value + ".NS")
-        return columns["symbol"]
+    """Index watchlists out of the NSE index constituent CSVs."""
+
+    SYMBOL_COLUMN = "Symbol"
+    YF_SUFFIX = ".NS"
+
+    def __init__(self, watchlists_dir=None, library=None):
+        library = library or Configuration.LIVE_DATA_LIB
+        self.suffix = "" if library == LiveDataLibrary.NSEPYTHON else self.YF_SUFFIX
+        self.watchlists_dir = watchlists_dir or (
+            DataFiles.NSE_WATCHLISTS
+            if library == LiveDataLibrary.NSEPYTHON
+            else DataFiles.WATCHLISTS
+        )
+        # the symbols of each CSV, in the order of the CSV, read once.
+        self.indices = {}
+
+    def read_index_symbols(self, csv_name):
+        """return the watchlist symbols of an index CSV, in its order, each once."""
+        if csv_name not in self.indices:
+            logging.info(f"reading csv file '{csv_name}'.")
+            with open(csv_name, newline="") as csv_file:
+                reader = csv.DictReader(csv_file, skipinitialspace=True)
+                reader.fieldnames = [col.strip() for col in reader.fieldnames or []]
+                if self.SYMBOL_COLUMN not in reader.fieldnames:
+                    raise ValueError(f"no {self.SYMBOL_COLUMN} column in '{csv_name}'.")
+                self.indices[csv_name] = list(
+                    dict.fromkeys(
+                        f"{symbol}{self.suffix}"
+                        for row in reader
+                        if (symbol := (row[self.SYMBOL_COLUMN] or "").strip())
+                    )
+                )
+        return self.indices[csv_name]
+
+    def union(self, csv_names):
+        """return the symbols of any of the indices, in the order first seen."""
+        symbols = {}
+        for csv_name in csv_names:
+            symbols.update(dict.fromkeys(self.read_index_symbols(csv_name)))
+        return list(symbols)
+
+    def difference(self, csv_name, exclude_csv_names):
+        """return the symbols of the index that are in none of the excluded ones."""
+        excluded = set(self.union(exclude_csv_names))
+        return [
+            symbol
+            for symbol in self.read_index_symbols(csv_name)
+            if symbol not in excluded
+        ]
+
+    def bands(self, csv_names):
+        """return the bands of nested indices given from the smallest, e.g. NIFTY 50,
+        100, 200 and 500 into 50, 50-100, 100-200 and 200-500.
+
+        a symbol belongs to the band of the smallest index holding it.
+        """
+        seen = set()
+        bands = []
+        for csv_name in csv_names:
+            band = [
+                symbol
+                for symbol in self.read_index_symbols(csv_name)
+                if symbol not in seen
+            ]
+            seen.update(band)
+            bands.append(band)
+        return bands
+
+    def path(self, name):
+        return os.path.join(self.watchlists_dir, name)
+
+    def diff(self, name, symbols):
+        """return the symbols added to and removed from the watchlist."""
+        current = []
+        if os.path.isfile(self.path(name)):
+            current = [
+                symbol for symbol in Watchlists.read_symbols(self.path(name)) if symbol
+            ]
+        current_set, symbols_set = set(current), set(symbols)
+        return IndexDiff(
+            name,
+            [symbol for symbol in symbols if symbol not in current_set],
+            [symbol for symbol in current if symbol not in symbols_set],
+        )
+
+    def write(self, name, symbols, dry_run=False):
+        """replace the watchlist with the symbols, return the diff to the old one."""
+        diff = self.diff(name, symbols)
+        if dry_run or not (diff.added or diff.removed):
+            return diff
+        os.makedirs(self.watchlists_dir, exist_ok=True)
+        self.save(self.path(name), symbols)
+        return diff
+
+    @staticmethod
+    def save(path, symbols):
+        """write the watchlist file, readers see either the old or the new one."""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fh:
+            fh.writelines(f"{symbol}\n" for symbol in symbols)
+        os.replace(tmp_path, path)
+        logging.info(f"wrote {len(symbols)} symbols to '{path}'.")
 
     def write_updated_index(self, csv1, csv2, dest):
-        smaller_list = self.read_index_symbols(csv1)
-        bigger_list = self.read_index_symbols(csv2)
+        """write the symbols of the bigger index csv2 missing from csv1 to dest."""
+        self.save(dest, self.difference(csv2, [csv1]))
 
-        print(f"before update index size: {len(bigger_list)}")
-        _ = [bigger_list.remove(symbol) for symbol in smaller_list]
-        print(f"after update index size: {len(bigger_list)}")
+    @staticmethod
+    def fetch_history(diffs):
+        """fetch the history of the added symbols into the history cache, the others
+        already have theirs."""
+        from lib.nifty_live import NiftyLive
 
-        # write updated index file.
-        with open(dest, "w") as file:
-            for symbol in bigger_list:
-                file.write(symbol + "\n")
+        added = list(dict.fromkeys(symbol for diff in diffs for symbol in diff.added))
+        if added and Configuration.HISTORY_CACHE:
+            bulk_history = NiftyLive.get_historical_data_bulk(added)
+            for symbol in added:
+                if NiftyLive.slice_historical_data(bulk_history, symbol) is None:
+                    NiftyLive.get_historical_data(quote(symbol, safe="SBIN.NS"))
+        return added
 
 
 if __name__ == "__main__":
-    obj = NiftyIndexCreator()
-    obj.write_updated_index(sys.argv[1], sys.argv[2], sys.argv[3])
+    parser = argparse.ArgumentParser(description="maintain the index watchlists.")
+    parser.add_argument("--dir", help="watchlists directory, the library's by default.")
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the diff, write nothing."
+    )
+    parser.add_argument(
+        "--fetch-history",
+        action="store_true",
+        help="fetch the history of the added symbols.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    bands_parser = commands.add_parser(
+        "bands", help="bands of nested indices, e.g. NIFTY 50, 100, 200 and 500."
+    )
+    bands_parser.add_argument("csvs", nargs="+", help="index CSVs, smallest first.")
+    bands_parser.add_argument(
+        "--names", nargs="+", required=True, help="watchlist of each band."
+    )
+    union_parser = commands.add_parser("union", help="symbols of any of the indices.")
+    union_parser.add_argument("csvs", nargs="+", help="index CSVs.")
+    union_parser.add_argument("--name", required=True, help="watchlist to write.")
+    difference_parser = commands.add_parser(
+        "difference", help="symbols of the first index in none of the others."
+    )
+    difference_parser.add_argument("csvs", nargs="+", help="index CSVs.")
+    difference_parser.add_argument("--name", required=True, help="watchlist to write.")
+    args = parser.parse_args()
+
+    creator = NiftyIndexCreator(args.dir)
+    if args.command == "bands":
+        if len(args.names) != len(args.csvs):
+            parser.error("one watchlist name per index CSV.")
+        lists = dict(zip(args.names, creator.bands(args.csvs)))
+    elif args.command == "union":
+        lists = {args.name: creator.union(args.csvs)}
+    else:
+        lists = {args.name: creator.difference(args.csvs[0], args.csvs[1:])}
+
+    diffs = [
+        creator.write(name, symbols, args.dry_run) for name, symbols in lists.items()
+    ]
+    for diff in diffs:
+        print(f"{diff.name}: {len(diff.added)} added, {len(diff.removed)} removed")
+        print("".join(f"+{symbol}\n" for symbol in diff.added), end="")
+        print("".join(f"-{symbol}\n" for symbol in diff.removed), end="")
+    if args.fetch_history and not args.dry_run:
+        creator.fetch_history(diffs)
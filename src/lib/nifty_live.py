@@ -2,75 +2,415 @@
 This separate class is a collection of static methods to allow caching.
 """
 
+import concurrent.futures
+import datetime
 import logging
 import pprint
 import sys
-import time
+from typing import NamedTuple
+from urllib.parse import quote
+from zoneinfo import ZoneInfo
 
-import requests
-import yfinance as yf
-from nsepython import nse_eq, equity_history
+import pandas as pd
 
-from constants.config import Configuration, LiveDataLibrary
-from constants.stocks import NSE
+from constants.config import Configuration, LiveDataLibrary, ReplayMode
+from constants.stocks import NSE, InfoKeys, RawInfoKeys
+from lib.bhavcopy import Bhavcopy
+from lib.history_store import HistoryStore
+from lib.providers import NSEProvider, Provider, Providers
+from lib.quote_cache import QuoteCache
+from lib.replay import ReplayProvider
+from lib.resilience import ProviderError, ProviderGuard
+from lib.timeframes import Timeframes
 from lib.utils import Utils
 
 logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
 
+IST = ZoneInfo("Asia/Kolkata")
+
+
+class LiveBar(NamedTuple):
+    """in-progress daily bar of a symbol."""
+
+    date: datetime.date
+    high: float
+    low: float
+    close: float
+
 
 class NiftyLive:
 
     @staticmethod
-    def get_stock_quotes(symbol: str):
-        """fetch individual stock information."""
-        unsafe_session = requests.session()
-        unsafe_session.verify = False
-        attempts = 3
-        stock_quotes = {}
-        while attempts > 0:
-            try:
-                stock_quotes = None
-                if Configuration.LIVE_DATA_LIB == LiveDataLibrary.YFINANCE:
-                    stock_quotes = yf.Ticker(symbol).info
-                else:
-                    stock_quotes = nse_eq(symbol)
-                break
-            except requests.exceptions.JSONDecodeError as e:
-                print(f"failed to fetch data for stock symbol {symbol}")
-                attempts -= 1
-                time.sleep(3)
+    def get_stock_quotes(symbol: str, fields=None):
+        """get individual stock information, served from the quote cache when fresh.
+
+        the stock information fields read out of the quote decide the TTL of the cached
+        quote, see Configuration.QUOTE_FIELD_TTL.
+        """
+        if not Configuration.QUOTE_CACHE:
+            return NiftyLive.fetch_stock_quotes(symbol)
+        return QuoteCache.shared().get_or_fetch(
+            symbol, NiftyLive.fetch_stock_quotes, fields
+        )
+
+    @staticmethod
+    def fetch_stock_quotes(symbol: str):
+        """fetch individual stock information.
+
+        the calls are rate limited and retried by the provider guard.
+        """
+        if Configuration.REPLAY_MODE == ReplayMode.REPLAY:
+            return ReplayProvider().quotes(symbol)
+
+        stock_quotes = None
+        try:
+            # served by the other provider too when the configured one is slow.
+            stock_quotes = Providers.fetch_quotes(symbol)
+        except ProviderError as err:
+            logging.error(f"failed to fetch data for stock symbol {symbol}: {err}")
+        if Configuration.REPLAY_MODE == ReplayMode.RECORD and stock_quotes:
+            ReplayProvider().record_quotes(symbol, stock_quotes)
         logging.debug(symbol)
         logging.debug(pprint.pformat(stock_quotes))
         return stock_quotes
 
     @staticmethod
-    def get_historical_data(symbol: str):
-        """get historical data for any stock."""
-        unsafe_session = requests.session()
-        unsafe_session.verify = False
-        historical_data = None
-        if Configuration.LIVE_DATA_LIB == LiveDataLibrary.YFINANCE:
-            yf_ticker = yf.Ticker(symbol)
-            historical_data = yf_ticker.history(period=NSE.YF_LOOKBACK_PERIOD)
-        else:
+    def get_historical_data(symbol: str, timeframe=None):
+        """get historical data for any stock, in bars of the timeframe.
+
+        the bars of the base timeframe are fetched and the timeframe resampled out of
+        them; with the history cache enabled only the bars after the last stored one
+        are fetched.
+        """
+        timeframe = timeframe or Configuration.TIMEFRAME
+        base = Timeframes.base(timeframe)
+        days = Timeframes.lookback_days(timeframe)
+        if Configuration.REPLAY_MODE == ReplayMode.REPLAY:
+            historical_data = ReplayProvider().history(symbol, base)
+            if historical_data.empty:
+                return {}
+            return HistoryStore().bars(
+                HistoryStore.lookback_window(historical_data, days), timeframe
+            )
+        if base not in Timeframes.available():
+            logging.error(f"no {base} bars from {Configuration.LIVE_DATA_LIB}.")
+            return {}
+
+        store = HistoryStore(timeframe=base) if Configuration.HISTORY_CACHE else None
+        stored_data = store.load(symbol) if store else None
+        last_timestamp = NiftyLive.last_stored_timestamp(stored_data)
+
+        historical_data = pd.DataFrame()
+        storable = True
+        if not NiftyLive.from_bhavcopy(last_timestamp):
             try:
-                historical_data = equity_history(
-                    symbol=symbol,
-                    series=NSE.STOCK_CODE,
-                    start_date=Utils.get_lookback_date(),
-                    end_date=Utils.get_ist_date(),
+                historical_data, storable = Providers.fetch_history(
+                    symbol, last_timestamp, base
                 )
-            except requests.exceptions.JSONDecodeError as jerr:
+            except ProviderError as err:
                 logging.error(f"failed to get any response for '{symbol}'.")
-                logging.error(str(jerr))
-                return {}
+                logging.error(str(err))
+
+        if store and storable:
+            historical_data = store.append(symbol, historical_data, stored_data)
+        elif store:
+            # the bars of the hedging provider only serve this call.
+            historical_data = store.merge(stored_data, historical_data)
 
         if historical_data.empty:
             logging.error(f"failed to get any data, check the symbol '{symbol}'.")
             return {}
 
-        sorter_col = NSE.YF_HISTCOL_SORTER
-        if Configuration.LIVE_DATA_LIB == LiveDataLibrary.NSEPYTHON:
-            sorter_col = NSE.HISTCOL_SORTER
-        historical_data.sort_values(by=sorter_col, ascending=True, inplace=True)
-        return historical_data
+        historical_data = HistoryStore.lookback_window(
+            historical_data.sort_index(), days
+        )
+        if Configuration.REPLAY_MODE == ReplayMode.RECORD:
+            ReplayProvider().record_history(symbol, historical_data, base)
+        return HistoryStore().bars(historical_data, timeframe)
+
+    @staticmethod
+    def get_long_history(symbol: str, years: int):
+        """get the daily bars of the last years, out of the history store when it holds
+        them, without the lookback window of the scans."""
+        start = pd.Timestamp.now() - pd.DateOffset(years=years)
+        if Configuration.REPLAY_MODE == ReplayMode.REPLAY:
+            historical_data = ReplayProvider().history(symbol)
+        else:
+            store = HistoryStore()
+            historical_data = pd.DataFrame(columns=store.columns)
+            if Configuration.HISTORY_CACHE:
+                historical_data = store.load(symbol)
+            first = historical_data.index.min() if len(historical_data) else None
+            if first is not None and first.tzinfo is not None:
+                first = first.tz_localize(None)
+            # a week of slack for the holidays at the start of the range.
+            if first is None or first > start + pd.Timedelta(days=7):
+                guard = ProviderGuard.shared(Configuration.LIVE_DATA_LIB)
+                fetched = pd.DataFrame()
+                try:
+                    if Configuration.LIVE_DATA_LIB == LiveDataLibrary.YFINANCE:
+                        import yfinance as yf
+
+                        fetched = guard.call(
+                            yf.Ticker(symbol).history, period=f"{years}y"
+                        )
+                    else:
+                        from nsepython import equity_history
+
+                        fetched = guard.call(
+                            equity_history,
+                            symbol=symbol,
+                            series=NSE.STOCK_CODE,
+                            start_date=Utils.get_ist_date(dateval=start),
+                            end_date=Utils.get_ist_date(),
+                        )
+                        if not fetched.empty:
+                            fetched = NSEProvider.index_history(fetched)
+                except ProviderError as err:
+                    logging.error(f"failed to get the long history of '{symbol}'.")
+                    logging.error(str(err))
+                if Configuration.HISTORY_CACHE:
+                    historical_data = store.append(symbol, fetched, historical_data)
+                else:
+                    historical_data = fetched
+        if historical_data.empty:
+            return historical_data
+        historical_data = historical_data.sort_index()
+        if historical_data.index.tz is not None:
+            start = start.tz_localize(historical_data.index.tz)
+        return historical_data[historical_data.index >= start]
+
+    @staticmethod
+    def get_historical_data_bulk(
+        symbols: list, chunk_size=None, downloader=None, timeframe=None
+    ):
+        """get historical data for a whole watchlist in chunked multi-ticker requests.
+
+        returns one wide frame with (symbol, column) columns of the bars of the
+        timeframe. the symbols of a failed chunk are left out, and so are all of them
+        for the providers without a multi-ticker endpoint; their history is fetched
+        per symbol by the workers then.
+        """
+        frames = {}
+        for _, chunk_frames in NiftyLive.iter_historical_data_bulk(
+            symbols, chunk_size, downloader, timeframe
+        ):
+            frames.update(chunk_frames)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, axis=1).sort_index()
+
+    @staticmethod
+    def iter_historical_data_bulk(
+        symbols: list, chunk_size=None, downloader=None, timeframe=None
+    ):
+        """yield each chunk of the symbols, in order, with the bars fetched for it.
+
+        the bars are a dict of the history frame of each symbol served by the chunk
+        request, the symbols left out are to be fetched on their own.
+        """
+        chunk_size = chunk_size or Configuration.BULK_CHUNK_SIZE
+        timeframe = timeframe or Configuration.TIMEFRAME
+        base = Timeframes.base(timeframe)
+        days = Timeframes.lookback_days(timeframe)
+        if (
+            Configuration.LIVE_DATA_LIB != LiveDataLibrary.YFINANCE
+            or Configuration.REPLAY_MODE == ReplayMode.REPLAY
+        ):
+            # nsepython has no multi-symbol history endpoint and the fixtures are per
+            # symbol, the workers fetch them in parallel, out of the store once the
+            # bhavcopy of the day is ingested.
+            NiftyLive.sync_bhavcopy(symbols)
+            yield symbols, {}
+            return
+
+        if downloader is None:
+            import yfinance as yf
+
+            downloader = yf.download
+        guard = ProviderGuard.shared(Configuration.LIVE_DATA_LIB)
+        store = HistoryStore(timeframe=base) if Configuration.HISTORY_CACHE else None
+        for chunk in Utils.chunks(symbols, chunk_size):
+            safe_symbols = {quote(symbol, safe="SBIN.NS"): symbol for symbol in chunk}
+            stored_data = {
+                safe_symbol: store.load(safe_symbol) if store else None
+                for safe_symbol in safe_symbols
+            }
+            last_timestamps = [
+                NiftyLive.last_stored_timestamp(stored)
+                for stored in stored_data.values()
+            ]
+
+            # a single request for the chunk, from the oldest of the latest stored bars.
+            period_args = {"period": Timeframes.yf_lookback_period(base)}
+            if None not in last_timestamps:
+                period_args = {"start": min(last_timestamps).date()}
+            chunk_data = None
+            try:
+                chunk_data = guard.call(
+                    downloader,
+                    tickers=list(safe_symbols),
+                    group_by="ticker",
+                    auto_adjust=True,
+                    threads=True,
+                    progress=False,
+                    interval=base,
+                    **period_args,
+                )
+            except ProviderError as err:
+                logging.error(str(err))
+            if chunk_data is None or chunk_data.empty:
+                logging.error(f"failed to get bulk data for {chunk}.")
+                yield chunk, {}
+                continue
+
+            frames = {}
+            for safe_symbol, symbol in safe_symbols.items():
+                if safe_symbol not in chunk_data.columns.get_level_values(0):
+                    continue
+                historical_data = chunk_data[safe_symbol].dropna(how="all")
+                if store:
+                    historical_data = store.append(
+                        safe_symbol, historical_data, stored_data[safe_symbol]
+                    )
+                if not historical_data.empty:
+                    historical_data = HistoryStore.lookback_window(
+                        historical_data.sort_index(), days
+                    )
+                    if Configuration.REPLAY_MODE == ReplayMode.RECORD:
+                        ReplayProvider().record_history(
+                            safe_symbol, historical_data, base
+                        )
+                    frames[symbol] = HistoryStore().bars(historical_data, timeframe)
+            yield chunk, frames
+
+    @staticmethod
+    def last_stored_timestamp(stored_data):
+        """return the timestamp of the latest stored bar, None if nothing is stored."""
+        if stored_data is None or stored_data.empty:
+            return None
+        return stored_data.index.max()
+
+    @staticmethod
+    def sync_bhavcopy(symbols: list):
+        """ingest the bhavcopy files published since the last sync, for nsepython; of
+        the symbols and of the ones already stored."""
+        if (
+            Configuration.LIVE_DATA_LIB == LiveDataLibrary.NSEPYTHON
+            and Configuration.BHAVCOPY_HISTORY
+            and Configuration.HISTORY_CACHE
+            and Configuration.REPLAY_MODE != ReplayMode.REPLAY
+        ):
+            Bhavcopy().sync(symbols=symbols)
+
+    @staticmethod
+    def from_bhavcopy(last_timestamp):
+        """return True if every bhavcopy since the latest stored nsepython bar is
+        ingested, no history call is needed then; never while a bhavcopy failed to
+        download.
+
+        the bars of a stored symbol are ingested from every bhavcopy, the symbol did not
+        trade on the days it has no bar of, e.g. while suspended.
+        """
+        if (
+            Configuration.LIVE_DATA_LIB != LiveDataLibrary.NSEPYTHON
+            or not Configuration.BHAVCOPY_HISTORY
+            or last_timestamp is None
+        ):
+            return False
+        dates = Bhavcopy().ingested_dates()
+        if dates is None:
+            return False
+        first, _ = dates
+        # no trading day between the stored bars and the ingested ones.
+        return pd.bdate_range(
+            last_timestamp.date() + datetime.timedelta(1),
+            first - datetime.timedelta(1),
+        ).empty
+
+    @staticmethod
+    def slice_historical_data(bulk_data, symbol: str):
+        """return the history of a single symbol out of the bulk frame, None if it is
+        not in it and is to be fetched on its own."""
+        if bulk_data.empty or symbol not in bulk_data.columns.get_level_values(0):
+            return None
+        return bulk_data[symbol].dropna(how="all")
+
+    @staticmethod
+    def get_live_bars(symbols: list, downloader=None):
+        """get the in-progress daily bar of every symbol, bypassing the quote cache.
+
+        yfinance serves the whole list in a few multi-ticker requests, nsepython and
+        the fixtures fall back to concurrent per symbol quotes.
+        """
+        bars = {}
+        if (
+            Configuration.LIVE_DATA_LIB == LiveDataLibrary.YFINANCE
+            and Configuration.REPLAY_MODE != ReplayMode.REPLAY
+        ):
+            if downloader is None:
+                import yfinance as yf
+
+                downloader = yf.download
+            guard = ProviderGuard.shared(Configuration.LIVE_DATA_LIB)
+            for chunk in Utils.chunks(symbols, Configuration.BULK_CHUNK_SIZE):
+                safe_symbols = {
+                    quote(symbol, safe="SBIN.NS"): symbol for symbol in chunk
+                }
+                try:
+                    chunk_data = guard.call(
+                        downloader,
+                        tickers=list(safe_symbols),
+                        period="1d",
+                        group_by="ticker",
+                        auto_adjust=True,
+                        threads=True,
+                        progress=False,
+                    )
+                except ProviderError as err:
+                    logging.error(f"failed to get the live bars for {chunk}: {err}")
+                    continue
+                if chunk_data is None or chunk_data.empty:
+                    continue
+                for safe_symbol, symbol in safe_symbols.items():
+                    if safe_symbol not in chunk_data.columns.get_level_values(0):
+                        continue
+                    day_data = chunk_data[safe_symbol].dropna(how="all")
+                    if not day_data.empty:
+                        last = day_data.iloc[-1]
+                        bars[symbol] = LiveBar(
+                            day_data.index[-1].date(),
+                            float(last[NSE.YF_HISTCOL_HIGH]),
+                            float(last[NSE.YF_HISTCOL_LOW]),
+                            float(last[NSE.YF_HISTCOL_CLOSE]),
+                        )
+            return bars
+
+        def fetch_bar(symbol):
+            return NiftyLive.quote_bar(
+                NiftyLive.fetch_stock_quotes(quote(symbol, safe="SBIN.NS"))
+            )
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=Configuration.LIVE_POLL_THREADS
+        ) as executor:
+            for symbol, bar in zip(symbols, executor.map(fetch_bar, symbols)):
+                if bar:
+                    bars[symbol] = bar
+        return bars
+
+    @staticmethod
+    def quote_bar(stock_quotes):
+        """return the in-progress daily bar out of the quotes, None if incomplete."""
+        if not stock_quotes:
+            return None
+        quotes = Providers.get().normalize_quotes(stock_quotes)
+        close = quotes[InfoKeys.LAST_PRICE]
+        high = quotes[RawInfoKeys.INTRADAY_HIGH.name]
+        low = quotes[RawInfoKeys.INTRADAY_LOW.name]
+        quote_time = quotes[Provider.QUOTE_TIME]
+        if not close or not high or not low:
+            return None
+        # the bar belongs to the session of the last trade, e.g. on the weekends.
+        quote_time = quote_time or datetime.datetime.now(IST)
+        return LiveBar(quote_time.date(), float(high), float(low), float(close))
@@ -0,0 +1,464 @@
+"""class to implement the data providers behind a single schema.
+Each provider maps its raw quotes and history to and from one schema: the quotes to
+the fields of the stock information, the history to OHLCV bars dated in IST. On top,
+the quotes and history calls can be hedged: when the provider expected to be faster
+has not answered within the quantile of its latency histogram, the other provider is
+asked too and the first answer wins, returned in the raw format of the configured
+library so that the caches and the replay fixtures are unchanged. The history of the
+other provider is differently adjusted, it serves the call but is not stored.
+"""
+
+import abc
+import concurrent.futures
+import datetime
+import logging
+import os
+import sys
+import threading
+import time
+from urllib.parse import quote, unquote
+from zoneinfo import ZoneInfo
+
+import pandas as pd
+
+from constants.config import Configuration, LiveDataLibrary
+from constants.stocks import NSE, InfoKeys, RawInfoKeys, RawInfoKeysYF
+from lib.resilience import ProviderError, ProviderGuard
+from lib.symbol_master import SymbolMaster
+from lib.timeframes import Timeframes
+from lib.utils import Utils
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+IST = ZoneInfo("Asia/Kolkata")
+
+
+class Provider(abc.ABC):
+    """Raw data of a provider to and from the single schema."""
+
+    NAME = None
+    # the columns of the raw history, in the OHLCV order.
+    HISTORY_COLUMNS = []
+    HISTORY_INDEX = None
+    OHLCV = ["open", "high", "low", "close", "volume"]
+    QUOTE_TIME = "QUOTE_TIME"
+    QUOTE_FIELDS = [key.name for key in RawInfoKeys] + [InfoKeys.NAME, QUOTE_TIME]
+
+    def guard(self):
+        return ProviderGuard.shared(self.NAME)
+
+    @abc.abstractmethod
+    def symbol(self, symbol):
+        """return the symbol of the provider for a watchlist symbol, None if not listed.
+
+        the symbols of the configured library are its own, the other provider is only
+        asked for the ones known to the symbol master as NSE listed.
+        """
+
+    def is_configured(self):
+        return self.NAME == Configuration.LIVE_DATA_LIB
+
+    def supports(self, base):
+        """return True if the provider serves bars of the base timeframe."""
+        return base in Timeframes.available(self.NAME)
+
+    def has_quotes(self, raw):
+        return bool(raw)
+
+    @abc.abstractmethod
+    def normalize_quotes(self, raw):
+        """return the fields of the stock information out of the raw quotes."""
+
+    @abc.abstractmethod
+    def raw_quotes(self, quotes):
+        """return the raw quotes of the fields of the stock information."""
+
+    def normalize_history(self, raw):
+        """return the OHLCV bars dated in IST out of the raw history."""
+        history = raw[self.HISTORY_COLUMNS].set_axis(self.OHLCV, axis=1)
+        if history.index.tz is None:
+            history.index = history.index.tz_localize(IST)
+        return history.rename_axis(None)
+
+    def raw_history(self, history):
+        """return the raw history of the OHLCV bars."""
+        return history.set_axis(self.HISTORY_COLUMNS, axis=1).rename_axis(
+            self.HISTORY_INDEX
+        )
+
+    @abc.abstractmethod
+    def fetch_quotes(self, symbol):
+        """fetch the raw quotes of the symbol."""
+
+    @abc.abstractmethod
+    def fetch_history(self, symbol, last_timestamp, base):
+        """fetch the bars of the base timeframe after the last stored one, the lookback
+        window of the timeframe if nothing is stored."""
+
+
+class YFinanceProvider(Provider):
+
+    NAME = LiveDataLibrary.YFINANCE
+    HISTORY_COLUMNS = [
+        NSE.YF_HISTCOL_OPEN,
+        NSE.YF_HISTCOL_HIGH,
+        NSE.YF_HISTCOL_LOW,
+        NSE.YF_HISTCOL_CLOSE,
+        NSE.YF_HISTCOL_VOLUME,
+    ]
+    HISTORY_INDEX = NSE.YF_HISTCOL_SORTER
+    NSE_SUFFIX = ".NS"
+
+    def symbol(self, symbol):
+        if self.is_configured():
+            return symbol
+        if SymbolMaster.shared().lookup(symbol) is None:
+            return None
+        return quote(f"{unquote(symbol)}{self.NSE_SUFFIX}", safe="SBIN.NS")
+
+    def normalize_quotes(self, raw):
+        # yfinance has no circuit limits.
+        quotes = dict.fromkeys(self.QUOTE_FIELDS)
+        quotes.update(
+            {
+                key.name: raw.get(key)
+                for key in RawInfoKeysYF
+                if key != RawInfoKeysYF.ETF_LAST_PRICE
+            }
+        )
+        # ETFs have no current price, only the regular market price.
+        if quotes[InfoKeys.LAST_PRICE] is None:
+            quotes[InfoKeys.LAST_PRICE] = raw.get(RawInfoKeysYF.ETF_LAST_PRICE)
+        quote_time = raw.get(NSE.YF_QUOTE_TIME)
+        quotes[self.QUOTE_TIME] = (
+            datetime.datetime.fromtimestamp(quote_time, IST) if quote_time else None
+        )
+        return quotes
+
+    def raw_quotes(self, quotes):
+        raw = {
+            key: quotes.get(key.name)
+            for key in RawInfoKeysYF
+            if key != RawInfoKeysYF.ETF_LAST_PRICE and quotes.get(key.name) is not None
+        }
+        if quotes.get(self.QUOTE_TIME):
+            raw[NSE.YF_QUOTE_TIME] = int(quotes[self.QUOTE_TIME].timestamp())
+        return raw
+
+    def fetch_quotes(self, symbol):
+        import yfinance as yf
+
+        return self.guard().call(lambda: yf.Ticker(symbol).info)
+
+    def fetch_history(self, symbol, last_timestamp, base):
+        import yfinance as yf
+
+        ticker = yf.Ticker(symbol)
+        if last_timestamp is None:
+            return self.guard().call(
+                ticker.history,
+                period=Timeframes.yf_lookback_period(base),
+                interval=base,
+            )
+        return self.guard().call(
+            ticker.history, start=last_timestamp.date(), interval=base
+        )
+
+
+class NSEProvider(Provider):
+
+    NAME = LiveDataLibrary.NSEPYTHON
+    HISTORY_COLUMNS = [
+        NSE.HISTCOL_OPEN,
+        NSE.HISTCOL_HIGH,
+        NSE.HISTCOL_LOW,
+        NSE.HISTCOL_CLOSE,
+        NSE.HISTCOL_VOLUME,
+    ]
+    HISTORY_INDEX = NSE.HISTCOL_SORTER
+
+    def symbol(self, symbol):
+        symbol = unquote(symbol)
+        if self.is_configured():
+            return symbol
+        # the other yfinance symbols, e.g. the indices or the US ones, are not NSE's.
+        if (
+            not symbol.endswith(YFinanceProvider.NSE_SUFFIX)
+            or SymbolMaster.shared().lookup(symbol) is None
+        ):
+            return None
+        return symbol.removesuffix(YFinanceProvider.NSE_SUFFIX)
+
+    def has_quotes(self, raw):
+        return bool(raw) and bool(raw.get("info"))
+
+    def normalize_quotes(self, raw):
+        quotes = {}
+        for key in RawInfoKeys:
+            value = raw
+            for path_key in key.value:
+                value = value.get(path_key) if isinstance(value, dict) else None
+            quotes[key.name] = value
+        quotes[InfoKeys.NAME] = raw.get("info", {}).get("companyName")
+        quote_time = raw.get("metadata", {}).get(NSE.QUOTE_TIME)
+        quotes[self.QUOTE_TIME] = (
+            datetime.datetime.strptime(quote_time, NSE.QUOTE_TIME_FORMAT).replace(
+                tzinfo=IST
+            )
+            if quote_time
+            else None
+        )
+        return quotes
+
+    def raw_quotes(self, quotes):
+        raw = {"info": {"companyName": quotes.get(InfoKeys.NAME)}, "metadata": {}}
+        for key in RawInfoKeys:
+            if quotes.get(key.name) is None:
+                continue
+            parent = raw
+            for path_key in key.value[:-1]:
+                parent = parent.setdefault(path_key, {})
+            parent[key.value[-1]] = quotes[key.name]
+        if quotes.get(self.QUOTE_TIME):
+            raw["metadata"][NSE.QUOTE_TIME] = (
+                quotes[self.QUOTE_TIME].astimezone(IST).strftime(NSE.QUOTE_TIME_FORMAT)
+            )
+        return raw
+
+    def raw_history(self, history):
+        history = super().raw_history(history)
+        history.index = history.index.tz_localize(None)
+        return history
+
+    @staticmethod
+    def index_history(historical_data):
+        """index the nsepython history by its timestamp column."""
+        historical_data = historical_data.set_index(NSE.HISTCOL_SORTER)
+        historical_data.index = pd.to_datetime(historical_data.index)
+        return historical_data
+
+    def fetch_quotes(self, symbol):
+        from nsepython import nse_eq
+
+        return self.guard().call(nse_eq, symbol)
+
+    def fetch_history(self, symbol, last_timestamp, base):
+        from nsepython import equity_history
+
+        start_date = Utils.get_lookback_date()
+        if last_timestamp is not None:
+            start_date = Utils.get_ist_date(dateval=last_timestamp)
+        historical_data = self.guard().call(
+            equity_history,
+            symbol=symbol,
+            series=NSE.STOCK_CODE,
+            start_date=start_date,
+            end_date=Utils.get_ist_date(),
+        )
+        if historical_data.empty:
+            return historical_data
+        return self.index_history(historical_data)
+
+
+class Providers:
+    """The providers of the process, and the hedged calls across them."""
+
+    _providers = {
+        provider.NAME: provider() for provider in (YFinanceProvider, NSEProvider)
+    }
+    # the threads of the calls and of the hedges, with their free slots, per process.
+    _executors = {}
+    _executor_lock = threading.Lock()
+
+    @staticmethod
+    def get(name=None):
+        """return the provider, the configured one by default."""
+        return Providers._providers[name or Configuration.LIVE_DATA_LIB]
+
+    @staticmethod
+    def executor(hedge=False):
+        """return the threads of the hedged calls of the current process and their
+        free slots; the hedges have their own, they never hold up the first calls."""
+        name, size = ("call", Configuration.LIVE_POLL_THREADS)
+        if hedge:
+            name, size = ("hedge", Configuration.HEDGE_THREADS)
+        with Providers._executor_lock:
+            pid, executor, slots = Providers._executors.get(name, (None, None, None))
+            if pid != os.getpid():
+                executor = concurrent.futures.ThreadPoolExecutor(
+                    size, thread_name_prefix=name
+                )
+                slots = threading.BoundedSemaphore(size)
+                Providers._executors[name] = (os.getpid(), executor, slots)
+            return executor, slots
+
+    @staticmethod
+    def deadline(provider, kind):
+        """return the seconds to wait on the provider before hedging."""
+        quantile = provider.guard().latency_quantile(kind)
+        if quantile is None or quantile == float("inf"):
+            return Configuration.HEDGE_DEFAULT_DEADLINE
+        return max(Configuration.HEDGE_MIN_DEADLINE, quantile)
+
+    @staticmethod
+    def ranked(symbol, kind, base=None):
+        """return the providers able to answer for the symbol with their symbols.
+
+        the configured provider goes first until the histograms tell another one is
+        faster.
+        """
+        providers = [Providers.get()]
+        if Configuration.HEDGED_REQUESTS:
+            providers += [
+                provider
+                for provider in Providers._providers.values()
+                if provider is not providers[0]
+            ]
+        candidates = [
+            (provider, provider.symbol(symbol))
+            for provider in providers
+            if base is None or provider.supports(base)
+        ]
+        candidates = [
+            (provider, provider_symbol)
+            for provider, provider_symbol in candidates
+            if provider_symbol is not None
+        ]
+        quantiles = [
+            provider.guard().latency_quantile(kind) for provider, _ in candidates
+        ]
+        if None in quantiles:
+            return candidates
+        order = sorted(range(len(candidates)), key=quantiles.__getitem__)
+        return [candidates[idx] for idx in order]
+
+    @staticmethod
+    def timed_call(provider, kind, func, *args):
+        """call the provider, counting the answered call in its latency histogram."""
+        start = time.perf_counter()
+        result = func(provider, *args)
+        provider.guard().record_latency(kind, time.perf_counter() - start)
+        return result
+
+    @staticmethod
+    def hedged(kind, candidates, call, answered):
+        """return the provider answering first and its answer, (None, None) if none does.
+
+        the next candidate is only called once the previous ones are past their
+        deadline or failed, and while a hedge thread is free; the last failure is
+        raised if no one answered. the calls losing the race are dropped.
+        """
+        if len(candidates) == 1:
+            provider, provider_symbol = candidates[0]
+            result = Providers.timed_call(provider, kind, call, provider_symbol)
+            return (provider, result) if answered(provider, result) else (None, None)
+
+        pending = {}
+        errors = []
+
+        def first_answer(timeout):
+            """return the first pending call to answer within the timeout, None if none
+            does or all of them failed."""
+            while pending:
+                done, _ = concurrent.futures.wait(
+                    pending, timeout, concurrent.futures.FIRST_COMPLETED
+                )
+                if not done:
+                    return None
+                for future in done:
+                    answering = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except ProviderError as err:
+                        logging.error(str(err))
+                        errors.append(err)
+                        continue
+                    if answered(answering, result):
+                        return answering, result
+                if timeout is not None:
+                    # no answer from the failed one, hedge now.
+                    return None
+            return None
+
+        answer = None
+        try:
+            for position, (provider, provider_symbol) in enumerate(candidates):
+                executor, slots = Providers.executor(hedge=position > 0)
+                if position:
+                    if not slots.acquire(blocking=False):
+                        # the hedge threads are busy, e.g. with the losers of earlier
+                        # calls; wait on the calls already made.
+                        provider.guard().add_metric(f"hedges_skipped_{kind}")
+                        answer = first_answer(None)
+                        break
+                    provider.guard().add_metric(f"hedged_{kind}")
+                future = executor.submit(
+                    Providers.timed_call, provider, kind, call, provider_symbol
+                )
+                if position:
+                    future.add_done_callback(lambda _, slots=slots: slots.release())
+                pending[future] = provider
+                is_last = position == len(candidates) - 1
+                answer = first_answer(
+                    None if is_last else Providers.deadline(provider, kind)
+                )
+                if answer is not None:
+                    break
+        finally:
+            # the queued losers are cancelled, the running ones finish unread.
+            for future in pending:
+                future.cancel()
+
+        if answer is not None:
+            answering, _ = answer
+            if answering is not candidates[0][0]:
+                answering.guard().add_metric(f"hedge_answers_{kind}")
+            return answer
+        if errors:
+            raise errors[-1]
+        return None, None
+
+    @staticmethod
+    def fetch_quotes(symbol):
+        """return the raw quotes of the configured library, from the first provider to
+        answer; None if none does."""
+        candidates = Providers.ranked(symbol, "quotes")
+        if not candidates:
+            return None
+        provider, raw = Providers.hedged(
+            "quotes",
+            candidates,
+            lambda provider, provider_symbol: provider.fetch_quotes(provider_symbol),
+            lambda provider, raw: provider.has_quotes(raw),
+        )
+        configured = Providers.get()
+        if provider is None or provider is configured:
+            return raw
+        return configured.raw_quotes(provider.normalize_quotes(raw))
+
+    @staticmethod
+    def fetch_history(symbol, last_timestamp, base):
+        """return the raw history of the configured library after the last stored bar,
+        from the first provider to answer, empty if none does; and whether it is the
+        configured provider's.
+
+        the bars of the other provider are adjusted differently, they are not to be
+        stored with the configured provider's.
+        """
+        candidates = Providers.ranked(symbol, "history", base)
+        if not candidates:
+            return pd.DataFrame(), True
+        provider, history = Providers.hedged(
+            "history",
+            candidates,
+            lambda provider, provider_symbol: provider.fetch_history(
+                provider_symbol, last_timestamp, base
+            ),
+            lambda provider, history: history is not None and not history.empty,
+        )
+        configured = Providers.get()
+        if provider is None:
+            return pd.DataFrame(), True
+        if provider is configured:
+            return history, True
+        return configured.raw_history(provider.normalize_history(history)), False
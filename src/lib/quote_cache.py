@@ -0,0 +1,276 @@
+"""class to implement the shared quote cache.
+Quotes are kept in a local SQLite database, so that all the worker processes
+and the streamlit sessions share the same entries and counters. The hits only touch
+memory, their counters and access times are flushed to the database periodically.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+
+from constants.config import Configuration, ReplayMode
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class QuoteCache:
+    """TTL + LRU quote cache with single-flight fetching across processes."""
+
+    _shared = None
+
+    def __init__(self, path=None, max_entries=None, default_ttl=None, field_ttl=None):
+        self.path = path or Configuration.QUOTE_CACHE_PATH
+        self.max_entries = max_entries or Configuration.QUOTE_CACHE_SIZE
+        self.default_ttl = default_ttl or Configuration.QUOTE_TTL
+        self.field_ttl = field_ttl or Configuration.QUOTE_FIELD_TTL
+        self.source = Configuration.LIVE_DATA_LIB
+        # the replayed fixtures are never served as live quotes, nor the other way.
+        self.mode = (
+            ReplayMode.REPLAY
+            if Configuration.REPLAY_MODE == ReplayMode.REPLAY
+            else "live"
+        )
+        self.pid = os.getpid()
+        self.db_lock = threading.Lock()
+        self.inflight = {}
+        self.inflight_lock = threading.Lock()
+        # the fetches in flight on the event loop, awaited by the concurrent ones.
+        self.inflight_tasks = {}
+        # counters and access times of the entries not flushed yet.
+        self.unflushed_lock = threading.Lock()
+        self.counts = Counter()
+        self.accessed = {}
+        self.flushed_at = time.monotonic()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        with self.db_lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS quotes (key TEXT PRIMARY KEY, "
+                "quote TEXT, fetched_at REAL, accessed_at REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS inflight (key TEXT PRIMARY KEY, "
+                "pid INTEGER, started_at REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, count INTEGER)"
+            )
+
+    @classmethod
+    def shared(cls):
+        """return the cache instance of the current process."""
+        if cls._shared is None or cls._shared.pid != os.getpid():
+            cls._shared = cls()
+            atexit.register(cls._shared.flush)
+        return cls._shared
+
+    def key(self, symbol: str):
+        return f"{self.source}:{self.mode}:{symbol}"
+
+    def ttl(self, fields=None):
+        """return the TTL of the entry, the shortest one among the requested fields."""
+        if not fields:
+            return self.default_ttl
+        return min(self.field_ttl.get(field, self.default_ttl) for field in fields)
+
+    def get(self, symbol: str, fields=None):
+        """return the cached quote if it is still fresh for the fields, else None."""
+        key = self.key(symbol)
+        now = time.time()
+        with self.db_lock:
+            row = self.conn.execute(
+                "SELECT quote, fetched_at FROM quotes WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or now - row[1] > self.ttl(fields):
+            return None
+        with self.unflushed_lock:
+            self.accessed[key] = now
+        return json.loads(row[0])
+
+    def put(self, symbol: str, quote):
+        """store the quote and evict the least recently used entries."""
+        now = time.time()
+        with self.db_lock, self.conn:
+            # the access times decide the evictions, flush them first.
+            self.flush_unlocked()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO quotes VALUES (?, ?, ?, ?)",
+                (self.key(symbol), json.dumps(quote, default=str), now, now),
+            )
+            self.conn.execute(
+                "DELETE FROM quotes WHERE key NOT IN "
+                "(SELECT key FROM quotes ORDER BY accessed_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+    def get_or_fetch(self, symbol: str, fetcher, fields=None):
+        """return the cached quote or fetch it, coalescing concurrent fetches."""
+        quote = self.get_counted(symbol, fields, "hits")
+        if quote is not None:
+            return quote
+
+        # only one thread of this process asks the other processes or the provider.
+        with self.inflight_lock:
+            event = self.inflight.get(symbol)
+            leader = event is None
+            if leader:
+                event = self.inflight[symbol] = threading.Event()
+        if not leader:
+            event.wait(Configuration.LIVE_DATA_TIMEOUT)
+            quote = self.get_counted(symbol, fields, "coalesced")
+            if quote is not None:
+                return quote
+
+        try:
+            return self.fetch_single_flight(symbol, fetcher, fields)
+        finally:
+            if leader:
+                with self.inflight_lock:
+                    self.inflight.pop(symbol, None)
+                event.set()
+
+    async def get_or_fetch_async(self, symbol: str, fetcher, fields=None):
+        """get_or_fetch for a coroutine fetcher, the database is read off the loop."""
+        quote = await asyncio.to_thread(self.get_counted, symbol, fields, "hits")
+        if quote is not None:
+            return quote
+
+        # only one coroutine of this process asks the other processes or the provider.
+        task = self.inflight_tasks.get(symbol)
+        if task is None:
+            task = asyncio.ensure_future(
+                self.fetch_single_flight_async(symbol, fetcher, fields)
+            )
+            self.inflight_tasks[symbol] = task
+            task.add_done_callback(lambda _: self.inflight_tasks.pop(symbol, None))
+            return await asyncio.shield(task)
+        quote = await asyncio.shield(task)
+        if quote:
+            await asyncio.to_thread(self.count, "coalesced")
+        return quote
+
+    def get_counted(self, symbol: str, fields, name):
+        """return the fresh cached quote counted under the name, None if there is none."""
+        quote = self.get(symbol, fields)
+        if quote is not None:
+            self.count(name)
+        return quote
+
+    def fetch_single_flight(self, symbol: str, fetcher, fields=None):
+        """fetch the quote unless another process is already fetching it."""
+        key = self.key(symbol)
+        deadline = time.time() + Configuration.QUOTE_INFLIGHT_TIMEOUT
+        while not self.claim(key):
+            if time.time() > deadline:
+                logging.warning(
+                    f"gave up waiting on the in-flight quote of '{symbol}'."
+                )
+                break
+            time.sleep(0.05)
+            quote = self.get_counted(symbol, fields, "coalesced")
+            if quote is not None:
+                return quote
+
+        self.count("misses")
+        try:
+            quote = fetcher(symbol)
+            if quote:
+                self.put(symbol, quote)
+            return quote
+        finally:
+            self.release(key)
+
+    async def fetch_single_flight_async(self, symbol: str, fetcher, fields=None):
+        """fetch_single_flight awaiting the fetcher and the other processes."""
+        key = self.key(symbol)
+        deadline = time.time() + Configuration.QUOTE_INFLIGHT_TIMEOUT
+        while not await asyncio.to_thread(self.claim, key):
+            if time.time() > deadline:
+                logging.warning(
+                    f"gave up waiting on the in-flight quote of '{symbol}'."
+                )
+                break
+            await asyncio.sleep(0.05)
+            quote = await asyncio.to_thread(
+                self.get_counted, symbol, fields, "coalesced"
+            )
+            if quote is not None:
+                return quote
+
+        await asyncio.to_thread(self.count, "misses")
+        try:
+            quote = await fetcher(symbol)
+            if quote:
+                await asyncio.to_thread(self.put, symbol, quote)
+            return quote
+        finally:
+            await asyncio.to_thread(self.release, key)
+
+    def claim(self, key):
+        """claim the fetch of the key, stale claims of dead fetches are taken over."""
+        now = time.time()
+        with self.db_lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM inflight WHERE key = ? AND started_at < ?",
+                (key, now - Configuration.QUOTE_INFLIGHT_TIMEOUT),
+            )
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO inflight VALUES (?, ?, ?)", (key, self.pid, now)
+            )
+        return cursor.rowcount == 1
+
+    def release(self, key):
+        """drop the claim of this process on the fetch of the key."""
+        with self.db_lock, self.conn:
+            self.conn.execute(
+                "DELETE FROM inflight WHERE key = ? AND pid = ?", (key, self.pid)
+            )
+
+    def count(self, name):
+        """count in memory, flushed with the others once the flush interval is over."""
+        with self.unflushed_lock:
+            self.counts[name] += 1
+        if time.monotonic() - self.flushed_at > Configuration.QUOTE_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        """write the counters and access times of this process to the database."""
+        with self.db_lock, self.conn:
+            self.flush_unlocked()
+
+    def flush_unlocked(self):
+        """flush inside the transaction already holding the database lock."""
+        with self.unflushed_lock:
+            counts, self.counts = self.counts, Counter()
+            accessed, self.accessed = self.accessed, {}
+            self.flushed_at = time.monotonic()
+        if counts:
+            self.conn.executemany(
+                "INSERT INTO stats VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET count = count + excluded.count",
+                counts.items(),
+            )
+        if accessed:
+            self.conn.executemany(
+                "UPDATE quotes SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                [(at, key) for key, at in accessed.items()],
+            )
+
+    def stats(self):
+        """return the hit, miss and coalesced counters across all the processes, the
+        ones of the others as of their last flush."""
+        self.flush()
+        with self.db_lock:
+            rows = self.conn.execute("SELECT name, count FROM stats").fetchall()
+        counters = {"hits": 0, "misses": 0, "coalesced": 0}
+        counters.update(dict(rows))
+        return counters
@@ -0,0 +1,110 @@
+"""class to implement the replay data provider.
+Serves the quotes and the historical data recorded from the live providers out of
+local fixtures, so that scans and benchmarks run the same way without the network.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from constants.config import Configuration, ReplayMode, Timeframe
+from lib.wathclists import Watchlists
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class ReplayProvider:
+    """Recorded quotes (json) and OHLC history (parquet) keyed by symbol and data source."""
+
+    def __init__(self, fixtures_dir=None, source=None, latency=None):
+        self.fixtures_dir = fixtures_dir or Configuration.REPLAY_DIR
+        self.source = source or Configuration.LIVE_DATA_LIB
+        self.latency = Configuration.REPLAY_LATENCY if latency is None else latency
+
+    def path(self, symbol: str, kind: str):
+        """return the fixture file path of the symbol, for both quoted and plain symbols."""
+        extension = "json" if kind == "quotes" else "parquet"
+        name = quote(unquote(symbol), safe="")
+        return os.path.join(self.fixtures_dir, self.source, kind, f"{name}.{extension}")
+
+    def symbols(self):
+        """return the symbols having recorded quotes."""
+        quotes_dir = os.path.join(self.fixtures_dir, self.source, "quotes")
+        if not os.path.isdir(quotes_dir):
+            return []
+        return sorted(
+            unquote(entry.name[: -len(".json")])
+            for entry in os.scandir(quotes_dir)
+            if entry.name.endswith(".json")
+        )
+
+    def wait(self):
+        """mimic the response time of the provider."""
+        if self.latency:
+            time.sleep(self.latency)
+
+    def quotes(self, symbol: str):
+        """return the recorded quotes of the symbol, None if not recorded."""
+        self.wait()
+        path = self.path(symbol, "quotes")
+        if not os.path.isfile(path):
+            logging.error(f"no recorded quotes for '{symbol}'.")
+            return None
+        with open(path) as fh:
+            return json.load(fh)
+
+    @staticmethod
+    def history_kind(timeframe=None):
+        """return the kind of the recorded bars, the daily ones are plain history."""
+        if not timeframe or timeframe == Timeframe.D1:
+            return "history"
+        return f"history-{timeframe}"
+
+    def history(self, symbol: str, timeframe=None):
+        """return the recorded history of the symbol, empty if not recorded."""
+        self.wait()
+        path = self.path(symbol, self.history_kind(timeframe))
+        if not os.path.isfile(path):
+            logging.error(f"no recorded history for '{symbol}'.")
+            return pd.DataFrame()
+        return pd.read_parquet(path)
+
+    def record_quotes(self, symbol: str, stock_quotes):
+        """atomically write the quotes of the symbol."""
+        path = self.path(symbol, "quotes")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(stock_quotes, fh, default=str)
+        os.replace(tmp_path, path)
+
+    def record_history(self, symbol: str, history, timeframe=None):
+        """atomically write the history of the symbol."""
+        path = self.path(symbol, self.history_kind(timeframe))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        history.to_parquet(tmp_path)
+        os.replace(tmp_path, path)
+
+
+if __name__ == "__main__":
+    # record the fixtures of the watchlists from the live provider.
+    from lib.nifty_live import NiftyLive
+
+    parser = argparse.ArgumentParser(description="record the replay fixtures.")
+    parser.add_argument("watchlists", nargs="+", help="watchlist files to record.")
+    args = parser.parse_args()
+
+    Configuration.REPLAY_MODE = ReplayMode.RECORD
+    Configuration.QUOTE_CACHE = False
+    for watchlist in args.watchlists:
+        for symbol in Watchlists.read_symbols(watchlist):
+            if symbol:
+                NiftyLive.get_stock_quotes(quote(symbol, safe="SBIN.NS"))
+                NiftyLive.get_historical_data(quote(symbol, safe="SBIN.NS"))
@@ -0,0 +1,339 @@
+"""class to implement the rate limiting, retries and circuit breaking of the data providers.
+The state lives in a local SQLite database, so that all the worker processes share
+the same token bucket, breaker and metrics of each provider.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+
+from constants.config import Configuration
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class ProviderError(Exception):
+    """the provider call failed, after retrying the retryable failures."""
+
+    def __init__(self, provider, kind, message=""):
+        super().__init__(f"{provider} call failed ({kind}) {message}".strip())
+        self.provider = provider
+        self.kind = kind
+
+
+class CircuitOpenError(ProviderError):
+    """the provider is failing, calls are rejected until the cool down is over."""
+
+    def __init__(self, provider):
+        super().__init__(provider, "circuit open")
+
+
+class FailureKind:
+    THROTTLED = "throttled"
+    SERVER = "server"
+    CLIENT = "client"
+    NETWORK = "network"
+    DECODE = "decode"
+
+    # failures worth another attempt after a back off.
+    RETRYABLE = {THROTTLED, SERVER, NETWORK, DECODE}
+
+
+class ProviderGuard:
+    """token bucket, jittered exponential back off and circuit breaker for a provider."""
+
+    _shared = {}
+
+    def __init__(self, provider, path=None, rate=None, burst=None):
+        self.provider = provider
+        self.path = path or Configuration.PROVIDER_STATE_PATH
+        self.rate = rate or Configuration.PROVIDER_RATE.get(provider, 10)
+        self.burst = burst or Configuration.PROVIDER_BURST
+        self.pid = os.getpid()
+        self.db_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(
+            self.path, timeout=30, check_same_thread=False, isolation_level=None
+        )
+        with self.db_lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets (provider TEXT PRIMARY KEY, "
+                "tokens REAL, updated_at REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS breakers (provider TEXT PRIMARY KEY, "
+                "failures INTEGER, opened_until REAL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS metrics (provider TEXT, name TEXT, "
+                "value REAL, PRIMARY KEY (provider, name))"
+            )
+
+    @classmethod
+    def shared(cls, provider):
+        """return the guard of the provider for the current process."""
+        guard = cls._shared.get(provider)
+        if guard is None or guard.pid != os.getpid():
+            guard = cls._shared[provider] = cls(provider)
+        return guard
+
+    def transaction(self, statements):
+        """run the function on the connection inside an immediate transaction."""
+        with self.db_lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(self.conn)
+                self.conn.execute("COMMIT")
+                return result
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def admit(self):
+        """check the breaker, take a token and count the call in one transaction.
+
+        returns the seconds to wait before calling, raises if the breaker is open;
+        after the cool down one trial call goes through.
+        """
+
+        def admit_call(conn):
+            now = time.time()
+            row = conn.execute(
+                "SELECT opened_until FROM breakers WHERE provider = ?",
+                (self.provider,),
+            ).fetchone()
+            if row is not None and row[0] != 0:
+                if now < row[0]:
+                    self.increment(conn, "rejected")
+                    return None
+                # half open, hold the others off while the trial call runs.
+                conn.execute(
+                    "UPDATE breakers SET opened_until = ? WHERE provider = ?",
+                    (now + Configuration.BREAKER_COOLDOWN, self.provider),
+                )
+
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM buckets WHERE provider = ?",
+                (self.provider,),
+            ).fetchone()
+            tokens = self.burst if row is None else row[0]
+            updated_at = now if row is None else row[1]
+            tokens = min(self.burst, tokens + (now - updated_at) * self.rate) - 1
+            conn.execute(
+                "INSERT OR REPLACE INTO buckets VALUES (?, ?, ?)",
+                (self.provider, tokens, now),
+            )
+            self.increment(conn, "calls")
+            # a negative balance is a reservation of a future token.
+            wait = max(0.0, -tokens / self.rate)
+            if wait:
+                self.increment(conn, "throttle_wait_seconds", wait)
+            return wait
+
+        wait = self.transaction(admit_call)
+        if wait is None:
+            raise CircuitOpenError(self.provider)
+        return wait
+
+    def record_success(self):
+        self.transaction(
+            lambda conn: conn.execute(
+                "UPDATE breakers SET failures = 0, opened_until = 0 "
+                "WHERE provider = ? AND (failures != 0 OR opened_until != 0)",
+                (self.provider,),
+            )
+        )
+
+    def record_failure(self, kind):
+        """count the failure, only the retryable kinds count towards the breaker."""
+
+        def record(conn):
+            self.increment(conn, f"failures_{kind}")
+            if kind not in FailureKind.RETRYABLE:
+                # the provider answered, the request itself was wrong.
+                return 0
+            row = conn.execute(
+                "SELECT failures FROM breakers WHERE provider = ?", (self.provider,)
+            ).fetchone()
+            failures = (row[0] if row else 0) + 1
+            opened_until = 0
+            if failures >= Configuration.BREAKER_THRESHOLD:
+                opened_until = time.time() + Configuration.BREAKER_COOLDOWN
+            conn.execute(
+                "INSERT OR REPLACE INTO breakers VALUES (?, ?, ?)",
+                (self.provider, failures, opened_until),
+            )
+            return opened_until
+
+        if self.transaction(record):
+            logging.error(f"{self.provider} keeps failing, pausing the calls to it.")
+
+    def add_metric(self, name, value=1):
+        self.transaction(lambda conn: self.increment(conn, name, value))
+
+    def increment(self, conn, name, value=1):
+        """add to the metric inside the transaction of the connection."""
+        conn.execute(
+            "INSERT INTO metrics VALUES (?, ?, ?) ON CONFLICT(provider, name) "
+            "DO UPDATE SET value = value + excluded.value",
+            (self.provider, name, value),
+        )
+
+    def record_latency(self, kind, seconds):
+        """count the answered call in the latency histogram of its kind of call."""
+        bound = next(
+            (b for b in Configuration.LATENCY_BUCKETS if seconds <= b), float("inf")
+        )
+        self.add_metric(f"latency_{kind}_le_{bound:g}")
+
+    def latency_quantile(self, kind, quantile=None):
+        """return the upper bound of the latency bucket of the quantile, None until
+        enough calls are counted."""
+        quantile = quantile or Configuration.HEDGE_QUANTILE
+        prefix = f"latency_{kind}_le_"
+        with self.db_lock:
+            rows = self.conn.execute(
+                "SELECT name, value FROM metrics WHERE provider = ? AND name LIKE ?",
+                (self.provider, f"{prefix}%"),
+            ).fetchall()
+        counts = sorted((float(name[len(prefix) :]), value) for name, value in rows)
+        total = sum(value for _, value in counts)
+        if total < Configuration.HEDGE_MIN_SAMPLES:
+            return None
+        seen = 0
+        for bound, value in counts:
+            seen += value
+            if seen >= quantile * total:
+                return bound
+        return counts[-1][0]
+
+    def metrics(self):
+        """return the retry, throttle and failure counters and the breaker state."""
+        with self.db_lock:
+            rows = self.conn.execute(
+                "SELECT name, value FROM metrics WHERE provider = ?", (self.provider,)
+            ).fetchall()
+            breaker = self.conn.execute(
+                "SELECT failures, opened_until FROM breakers WHERE provider = ?",
+                (self.provider,),
+            ).fetchone()
+        metrics = {"calls": 0, "retries": 0, "throttle_wait_seconds": 0.0}
+        metrics.update(
+            {
+                name: value if name.endswith("seconds") else int(value)
+                for name, value in rows
+            }
+        )
+        failures, opened_until = breaker or (0, 0)
+        metrics["consecutive_failures"] = failures
+        metrics["breaker"] = "open" if opened_until > time.time() else "closed"
+        if opened_until and opened_until <= time.time():
+            metrics["breaker"] = "half open"
+        return metrics
+
+    @staticmethod
+    def loaded(*names):
+        """return the exception classes of the names, of the modules already imported.
+
+        the provider libraries are imported on their first call, an error can only be
+        raised by one already imported.
+        """
+        classes = []
+        for name in names:
+            module_name, class_name = name.rsplit(".", 1)
+            module = sys.modules.get(module_name)
+            if module is not None:
+                classes.append(getattr(module, class_name))
+        return tuple(classes)
+
+    @staticmethod
+    def classify(err):
+        """return the kind of the failure, None for the errors that are not the provider's."""
+        if isinstance(
+            err, ProviderGuard.loaded("yfinance.exceptions.YFRateLimitError")
+        ):
+            return FailureKind.THROTTLED
+        response = getattr(err, "response", None)
+        status = getattr(response, "status_code", None)
+        if status == 429:
+            return FailureKind.THROTTLED
+        if status is not None and status >= 500:
+            return FailureKind.SERVER
+        if status is not None and status >= 400:
+            return FailureKind.CLIENT
+        if isinstance(err, json.JSONDecodeError) or isinstance(
+            err, ProviderGuard.loaded("requests.exceptions.JSONDecodeError")
+        ):
+            return FailureKind.DECODE
+        if isinstance(
+            err,
+            ProviderGuard.loaded(
+                "requests.exceptions.ConnectionError",
+                "requests.exceptions.Timeout",
+                "curl_cffi.requests.exceptions.ConnectionError",
+                "curl_cffi.requests.exceptions.Timeout",
+            ),
+        ):
+            return FailureKind.NETWORK
+        return None
+
+    @staticmethod
+    def backoff(attempt, err=None):
+        """return the full jitter exponential back off, honouring Retry-After."""
+        response = getattr(err, "response", None)
+        retry_after = getattr(response, "headers", {}).get("Retry-After")
+        if retry_after and str(retry_after).isdigit():
+            return min(float(retry_after), Configuration.RETRY_MAX_DELAY)
+        ceiling = Configuration.RETRY_BASE_DELAY * 2**attempt
+        return random.uniform(0, min(Configuration.RETRY_MAX_DELAY, ceiling))
+
+    def handle_failure(self, err, attempt):
+        """record the failure, return the back off before the next attempt or raise."""
+        kind = self.classify(err)
+        if kind is None:
+            raise err
+        self.record_failure(kind)
+        if (
+            kind not in FailureKind.RETRYABLE
+            or attempt + 1 >= Configuration.RETRY_ATTEMPTS
+        ):
+            raise ProviderError(self.provider, kind, str(err)) from err
+        self.add_metric("retries")
+        return self.backoff(attempt, err)
+
+    def call(self, func, *args, **kwargs):
+        """call the provider function under the rate limit, retries and breaker."""
+        for attempt in range(Configuration.RETRY_ATTEMPTS):
+            time.sleep(self.admit())
+            try:
+                result = func(*args, **kwargs)
+            except Exception as err:
+                time.sleep(self.handle_failure(err, attempt))
+                continue
+            self.record_success()
+            return result
+
+    async def call_async(self, func, *args, **kwargs):
+        """await the provider coroutine under the rate limit, retries and breaker.
+
+        the shared state is read and written in a thread, off the event loop.
+        """
+        for attempt in range(Configuration.RETRY_ATTEMPTS):
+            await asyncio.sleep(await asyncio.to_thread(self.admit))
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as err:
+                await asyncio.sleep(
+                    await asyncio.to_thread(self.handle_failure, err, attempt)
+                )
+                continue
+            await asyncio.to_thread(self.record_success)
+            return result
@@ -0,0 +1,133 @@
+"""class to implement the columnar scan result buffer.
+The numeric stock information of a scan is written by the worker processes straight
+into a preallocated float matrix in shared memory, one row per symbol, so that only
+the few text fields travel back pickled. The scan frame is a zero-copy view of it.
+"""
+
+import logging
+import os
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from constants.config import Configuration
+from constants.stocks import InfoKeys, RawInfoKeys
+from lib.nifty import Nifty
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+# the matrix of the last scan attached by this (worker) process.
+_attached = (None, None)
+
+
+class ResultBuffer:
+    """Fixed schema matrix of the numeric stock information, with the text on the side."""
+
+    NUMERIC = [
+        InfoKeys.RSI,
+        InfoKeys.ADX,
+        InfoKeys.EMA_DELTA,
+        InfoKeys.STOCH_K,
+        InfoKeys.STOCH_D,
+        InfoKeys.LAST_PRICE,
+        RawInfoKeys.INTRADAY_HIGH.name,
+        RawInfoKeys.INTRADAY_LOW.name,
+        RawInfoKeys.LAST_CLOSE.name,
+        RawInfoKeys.YEAR_HIGH.name,
+        RawInfoKeys.YEAR_LOW.name,
+        RawInfoKeys.UPPER_CKT.name,
+        RawInfoKeys.LOWER_CKT.name,
+        InfoKeys.EMA_20,
+        InfoKeys.BB_HIGH,
+        InfoKeys.BB_AVG,
+        InfoKeys.BB_LOW,
+    ]
+    # the symbol is known upfront, the other text fields are sent back by the workers.
+    TEXT = [InfoKeys.SYMBOL, InfoKeys.NAME, InfoKeys.SIGNAL, InfoKeys.STOCH_DELTA]
+
+    def __init__(self, symbols, buffer_dir=None):
+        self.size = len(symbols)
+        # a name never used before, the workers keep the matrix of the last scan mapped.
+        self.path = os.path.join(
+            buffer_dir or Configuration.RESULT_BUFFER_DIR,
+            f"niveshak-scan-{uuid.uuid4().hex}",
+        )
+        self.values = np.memmap(
+            self.path,
+            dtype=np.float64,
+            mode="w+",
+            shape=(max(self.size, 1), len(self.NUMERIC)),
+        )[: self.size]
+        self.values[:] = np.nan
+        self.text = {key: np.full(self.size, None, dtype=object) for key in self.TEXT}
+        self.text[InfoKeys.SYMBOL][:] = symbols
+
+    @staticmethod
+    def attach(path, size):
+        """return the matrix of the scan, mapped once per process."""
+        global _attached
+        if _attached[0] != path:
+            _attached = (
+                path,
+                np.memmap(
+                    path,
+                    dtype=np.float64,
+                    mode="r+",
+                    shape=(max(size, 1), len(ResultBuffer.NUMERIC)),
+                ),
+            )
+        return _attached[1]
+
+    @staticmethod
+    def to_float(value):
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+
+    @staticmethod
+    def write(values, index, row):
+        """write the numeric fields of the row, return its text fields."""
+        values[index] = [
+            ResultBuffer.to_float(row.get(key)) for key in ResultBuffer.NUMERIC
+        ]
+        return tuple(row.get(key) for key in ResultBuffer.TEXT[1:])
+
+    @staticmethod
+    def compute_into(path, size, index, symbol, stock_history=None, timeframe=None):
+        """compute the stock information in a worker, into the row of the symbol."""
+        row = Nifty().get_stock_info(symbol, stock_history, timeframe=timeframe)
+        if not row:
+            return None
+        return ResultBuffer.write(ResultBuffer.attach(path, size), index, row)
+
+    def add(self, index, row):
+        """write a row computed in this process."""
+        self.store(index, self.write(self.values, index, row))
+
+    def store(self, index, text):
+        """set the text fields sent back for the row."""
+        for key, value in zip(self.TEXT[1:], text):
+            self.text[key][index] = value
+
+    def row(self, index):
+        """return the row as the dict of stock information."""
+        row = {key: self.text[key][index] for key in self.TEXT}
+        row.update(zip(self.NUMERIC, self.values[index].tolist()))
+        return row
+
+    def frame(self):
+        """return the scan results, the numeric columns are a view of the matrix."""
+        scan_df = pd.DataFrame(self.values, columns=self.NUMERIC, copy=False)
+        for position, key in enumerate(self.TEXT):
+            scan_df.insert(position, key, self.text[key])
+        return scan_df
+
+    def release(self):
+        """remove the shared file, the mapping of this process stays valid."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,262 @@
+"""class to implement the watchlist scanning.
+Streams the stock information of a list of symbols, and runs headless scans of
+all the watchlists into columnar snapshots that the streamlit page can read.
+"""
+
+import concurrent.futures
+import datetime
+import glob
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+
+from constants.config import Configuration, FetchBackend, LiveDataLibrary
+from constants.datafiles import DataFiles
+from constants.stocks import InfoKeys
+from lib.instrumentation import Instrumentation
+from lib.nifty import Nifty
+from lib.nifty_async import NiftyAsync
+from lib.nifty_live import NiftyLive
+from lib.result_buffer import ResultBuffer
+from lib.signal_rules import SignalRules
+from lib.symbol_master import SymbolMaster
+from lib.wathclists import Watchlists
+from lib.worker_pool import WorkerPool
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class Scanner:
+    """Scans symbols into rows of stock information."""
+
+    SNAPSHOT_PREFIX = "scan-"
+    SNAPSHOT_TIME_FORMAT = "%Y%m%d-%H%M%S"
+
+    @staticmethod
+    def stream(symbols: list, timeframe=None):
+        """yield the stock information for each of the symbols once it completes.
+
+        symbols that fail or do not complete within the timeout are marked in the signal.
+        """
+        if Configuration.FETCH_BACKEND == FetchBackend.ASYNC:
+            return Scanner.stream_async(symbols, timeframe)
+        return Scanner.stream_process(symbols, timeframe=timeframe)
+
+    @staticmethod
+    def stream_async(symbols: list, timeframe=None):
+        """fetch the whole list from one event loop and compute each symbol as it arrives."""
+        SymbolMaster.sync()
+        pending = set(symbols)
+        try:
+            for symbol, raw_info, history in NiftyAsync.iter_fetch(
+                symbols, timeframe=timeframe, fields=Nifty.QUOTE_FIELDS
+            ):
+                pending.discard(symbol)
+                row = None
+                if raw_info:
+                    row = Nifty().get_stock_info(symbol, history, raw_info)
+                yield row or {InfoKeys.SYMBOL: symbol, InfoKeys.SIGNAL: "No data"}
+        except TimeoutError:
+            for symbol in pending:
+                logging.error(f"timed out fetching information on '{symbol}'.")
+                Instrumentation.count("symbols_timed_out")
+                yield {InfoKeys.SYMBOL: symbol, InfoKeys.SIGNAL: "Timed out"}
+        finally:
+            Instrumentation.flush()
+
+    @staticmethod
+    def stream_process(symbols: list, buffer=None, timeframe=None):
+        """fetch and compute the list in the shared pool of worker processes.
+
+        the workers write the numeric results into the result buffer, a temporary
+        one unless given. symbols time out when no result completes within the
+        timeout, however long the whole list takes.
+        """
+        # the workers only read the symbol master.
+        SymbolMaster.sync()
+        owned = buffer is None
+        buffer = buffer or ResultBuffer(symbols)
+        futures = {}
+        try:
+            # fetch the history of the list a chunk at a time in a few requests, each
+            # chunk is computed while the next one is fetched; the workers fetch the
+            # quotes and the history of the symbols left out.
+            offset = 0
+            chunks = NiftyLive.iter_historical_data_bulk(symbols, timeframe=timeframe)
+            while True:
+                with Instrumentation.stage("fetch_history_bulk"):
+                    chunk, frames = next(chunks, (None, None))
+                if chunk is None:
+                    break
+                tasks = [
+                    (
+                        buffer.path,
+                        len(symbols),
+                        offset + index,
+                        symbol,
+                        frames.get(symbol),
+                        timeframe,
+                    )
+                    for index, symbol in enumerate(chunk)
+                ]
+                pool_futures = WorkerPool.shared().submit_all(
+                    ResultBuffer.compute_into, tasks
+                )
+                futures.update(zip(pool_futures, range(offset, offset + len(chunk))))
+                offset += len(chunk)
+                del frames
+                for future in [future for future in futures if future.done()]:
+                    yield Scanner.completed_row(
+                        symbols, buffer, futures.pop(future), future
+                    )
+
+            while futures:
+                done, _ = concurrent.futures.wait(
+                    futures,
+                    timeout=Configuration.LIVE_DATA_TIMEOUT,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                if not done:
+                    break
+                for future in done:
+                    yield Scanner.completed_row(
+                        symbols, buffer, futures.pop(future), future
+                    )
+
+            for index in futures.values():
+                logging.error(f"timed out fetching information on '{symbols[index]}'.")
+                Instrumentation.count("symbols_timed_out")
+                buffer.store(index, (None, "Timed out", None))
+                yield buffer.row(index)
+        finally:
+            # the pool outlives the scan, only drop what has not started yet.
+            for future in futures:
+                future.cancel()
+            if owned:
+                buffer.release()
+            Instrumentation.flush()
+
+    @staticmethod
+    def completed_row(symbols, buffer, index, future):
+        """store the text fields of the completed future, return its row."""
+        buffer.store(index, Scanner.completed_text(symbols[index], future))
+        return buffer.row(index)
+
+    @staticmethod
+    def completed_text(symbol, future):
+        """return the text fields of the completed future, marked if it failed."""
+        try:
+            text = future.result().value
+        except Exception as err:
+            logging.error(f"failed to get information on '{symbol}': {err}")
+            Instrumentation.count("symbols_failed")
+            return None, "Failed", None
+        return text or (None, "No data", None)
+
+    @staticmethod
+    def scan_frame(symbols: list):
+        """scan the symbols into a frame, its numeric columns view the result buffer."""
+        buffer = ResultBuffer(symbols)
+        try:
+            if Configuration.FETCH_BACKEND == FetchBackend.ASYNC:
+                positions = {symbol: index for index, symbol in enumerate(symbols)}
+                for row in Scanner.stream_async(symbols):
+                    buffer.add(positions[row[InfoKeys.SYMBOL]], row)
+            else:
+                for _ in Scanner.stream_process(symbols, buffer):
+                    pass
+            scan_df = buffer.frame()
+        finally:
+            buffer.release()
+        # label all the rows at once, the signal and its groups are categorical.
+        signals = SignalRules.shared().signal_frame(scan_df, scan_df[InfoKeys.SIGNAL])
+        for column in signals:
+            scan_df[column] = signals[column]
+        return scan_df
+
+    @staticmethod
+    def watchlists_dir():
+        """return the watchlists directory holding symbols of the configured library."""
+        if Configuration.LIVE_DATA_LIB == LiveDataLibrary.NSEPYTHON:
+            return DataFiles.NSE_WATCHLISTS
+        return DataFiles.WATCHLISTS
+
+    @staticmethod
+    def unique_symbols(watchlists):
+        """return the symbols of all the watchlists, each one only once."""
+        symbols = {}
+        for list_symbols in watchlists.values():
+            symbols.update(dict.fromkeys(symbol for symbol in list_symbols if symbol))
+        return list(symbols)
+
+    @staticmethod
+    def scan_all():
+        """scan every symbol of every watchlist once and write the snapshot."""
+        wl = Watchlists()
+        wl.get_all_lists(Scanner.watchlists_dir())
+        symbols = Scanner.unique_symbols(wl.watchlists)
+        logging.info(f"scanning {len(symbols)} symbols of {len(wl.watchlists)} lists.")
+
+        start = time.monotonic()
+        scan_df = Scanner.scan_frame(symbols)
+        logging.info(f"scanned in {time.monotonic() - start:.1f} seconds.")
+        return Scanner.write_snapshot(scan_df)
+
+    @staticmethod
+    def run(every=0):
+        """scan all the watchlists, repeating every given seconds if not zero."""
+        while True:
+            Scanner.scan_all()
+            if not every:
+                return
+            time.sleep(every)
+
+    @staticmethod
+    def write_snapshot(scan_df, snapshot_dir=None):
+        """write the scan results as a parquet snapshot, return its path."""
+        snapshot_dir = snapshot_dir or Configuration.SNAPSHOT_DIR
+        os.makedirs(snapshot_dir, exist_ok=True)
+        scanned_at = datetime.datetime.now().strftime(Scanner.SNAPSHOT_TIME_FORMAT)
+        path = os.path.join(
+            snapshot_dir, f"{Scanner.SNAPSHOT_PREFIX}{scanned_at}.parquet"
+        )
+
+        scan_df = scan_df.rename(columns=str)
+        tmp_path = f"{path}.tmp"
+        scan_df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+        Scanner.prune_snapshots(snapshot_dir)
+        logging.info(f"wrote the snapshot '{path}'.")
+        return path
+
+    @staticmethod
+    def prune_snapshots(snapshot_dir):
+        """keep only the most recent snapshots."""
+        paths = sorted(
+            glob.glob(os.path.join(snapshot_dir, f"{Scanner.SNAPSHOT_PREFIX}*.parquet"))
+        )
+        for path in paths[: -Configuration.SNAPSHOT_KEEP]:
+            os.remove(path)
+
+    @staticmethod
+    def latest_snapshot(max_age=None, snapshot_dir=None):
+        """return the latest snapshot and its scan time, (None, None) if none is fresh."""
+        snapshot_dir = snapshot_dir or Configuration.SNAPSHOT_DIR
+        max_age = max_age or Configuration.SNAPSHOT_MAX_AGE
+        paths = sorted(
+            glob.glob(os.path.join(snapshot_dir, f"{Scanner.SNAPSHOT_PREFIX}*.parquet"))
+        )
+        if not paths:
+            return None, None
+
+        name = os.path.basename(paths[-1])
+        scanned_at = datetime.datetime.strptime(
+            name[len(Scanner.SNAPSHOT_PREFIX) : -len(".parquet")],
+            Scanner.SNAPSHOT_TIME_FORMAT,
+        )
+        if (datetime.datetime.now() - scanned_at).total_seconds() > max_age:
+            return None, None
+        return pd.read_parquet(paths[-1]), scanned_at
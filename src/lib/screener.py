@@ -0,0 +1,171 @@
+"""class to implement the cross-sectional screening of the whole universe.
+The latest stock information of every scanned symbol is stacked into one matrix, out
+of which the percentile ranks of the symbols and the market breadth are computed
+column-wise at once; the top symbols of a rank are found by partial sorting, so
+that screening thousands of symbols takes milliseconds once they are scanned.
+"""
+
+import argparse
+import logging
+import sys
+
+import numpy as np
+import pandas as pd
+
+from constants.config import Configuration
+from constants.stocks import InfoKeys, RawInfoKeys
+from lib.result_buffer import ResultBuffer
+from lib.signal_rules import SignalRules
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class Screener:
+    """Percentile ranks, breadth and top symbols of a frame of stock information."""
+
+    FROM_YEAR_HIGH = "FROM_YEAR_HIGH"
+    # the ranked columns, a higher value ranks higher.
+    RANKS = {
+        "RSI_RANK": InfoKeys.RSI,
+        "EMA_DELTA_RANK": InfoKeys.EMA_DELTA,
+        "YEAR_HIGH_RANK": FROM_YEAR_HIGH,
+    }
+
+    def __init__(self, scan_df):
+        scan_df = scan_df.drop_duplicates(InfoKeys.SYMBOL).reset_index(drop=True)
+        self.text = scan_df.reindex(columns=ResultBuffer.TEXT)
+        self.columns = (
+            list(ResultBuffer.NUMERIC) + [self.FROM_YEAR_HIGH] + list(self.RANKS)
+        )
+        # symbols x fields, the fields missing from the frame are NaN.
+        self.values = np.full((len(scan_df), len(self.columns)), np.nan)
+        self.values[:, : len(ResultBuffer.NUMERIC)] = (
+            scan_df.reindex(columns=ResultBuffer.NUMERIC)
+            .apply(pd.to_numeric, errors="coerce")
+            .to_numpy(dtype=np.float64)
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.field(self.FROM_YEAR_HIGH)[:] = (
+                self.field(InfoKeys.LAST_PRICE) / self.field(RawInfoKeys.YEAR_HIGH.name)
+                - 1
+            ) * 100
+        ranked = [self.columns.index(key) for key in self.RANKS.values()]
+        self.values[:, -len(self.RANKS) :] = self.percentile_ranks(
+            self.values[:, ranked]
+        )
+
+    def field(self, key):
+        """return the column of the field, a view of the matrix."""
+        return self.values[:, self.columns.index(key)]
+
+    @staticmethod
+    def percentile_ranks(values):
+        """return the percentile rank of every value within its column, NaN for NaN.
+
+        a value ranks at the share of the valid values below it, the ties counted half.
+        """
+        ranks = np.full(values.shape, np.nan)
+        # NaN sorts last, out of the first count values of each column.
+        ordered = np.sort(values, axis=0)
+        counts = np.count_nonzero(~np.isnan(values), axis=0)
+        for col, count in enumerate(counts):
+            if not count:
+                continue
+            valid = ~np.isnan(values[:, col])
+            below = np.searchsorted(ordered[:count, col], values[valid, col], "left")
+            upto = np.searchsorted(ordered[:count, col], values[valid, col], "right")
+            ranks[valid, col] = np.round((below + upto) * 50 / count, 2)
+        return ranks
+
+    @staticmethod
+    def share(mask, valid):
+        """return the percentage of the valid rows in the mask, NaN if none is valid."""
+        count = np.count_nonzero(valid)
+        if not count:
+            return np.nan
+        return round(float(np.count_nonzero(mask & valid) * 100 / count), 2)
+
+    def breadth(self):
+        """return the share of the symbols above their 20-EMA, advancing, and in the buy
+        zone of the signal rules, in percent of the symbols having the inputs."""
+        price = self.field(InfoKeys.LAST_PRICE)
+        rules = SignalRules.shared()
+        codes, has_signal = rules.evaluate(
+            {key: self.field(key) for key in rules.inputs.values()}
+        )
+        buy_zone = has_signal & rules.matches(codes, rules.screener["buy_zone"])
+
+        with np.errstate(invalid="ignore"):
+            ema_20 = self.field(InfoKeys.EMA_20)
+            last_close = self.field(RawInfoKeys.LAST_CLOSE.name)
+            return {
+                "SYMBOLS": len(price),
+                "ABOVE_EMA_20": Screener.share(
+                    price > ema_20, ~np.isnan(price + ema_20)
+                ),
+                "ADVANCING": Screener.share(
+                    price > last_close, ~np.isnan(price + last_close)
+                ),
+                "BUY_ZONE": Screener.share(buy_zone, has_signal),
+            }
+
+    def top(self, by, k=None, ascending=False):
+        """return the k symbols ranking the highest by the column, the lowest when
+        ascending; the symbols without a value come last."""
+        k = min(k or Configuration.SCREENER_TOP_K, len(self.values))
+        if not k:
+            return self.frame().iloc[:0]
+        keys = self.field(by) if ascending else -self.field(by)
+        keys = np.where(np.isnan(keys), np.inf, keys)
+        # only the k first are sorted.
+        rows = np.argpartition(keys, k - 1)[:k]
+        rows = rows[np.argsort(keys[rows], kind="stable")]
+        return self.frame(rows)
+
+    def frame(self, rows=None):
+        """return the stock information with the ranks, of the given rows or all."""
+        rows = slice(None) if rows is None else rows
+        screen_df = pd.DataFrame(self.values[rows], columns=self.columns)
+        for position, key in enumerate(ResultBuffer.TEXT):
+            screen_df.insert(position, key, self.text[key].to_numpy()[rows])
+        return screen_df
+
+    @staticmethod
+    def universe():
+        """return the stock information of the symbols of all the watchlists, out of
+        the latest snapshot when it covers them, else scanned."""
+        from lib.scanner import Scanner
+        from lib.symbol_registry import SymbolRegistry
+
+        registry = SymbolRegistry.shared()
+        registry.sync()
+        symbols = [
+            symbol for symbol in registry.symbols(SymbolRegistry.ALL_LISTS) if symbol
+        ]
+        snapshot_df, _ = Scanner.latest_snapshot()
+        if snapshot_df is not None and set(snapshot_df[InfoKeys.SYMBOL]) >= set(
+            symbols
+        ):
+            return snapshot_df[snapshot_df[InfoKeys.SYMBOL].isin(symbols)]
+        return Scanner.scan_frame(symbols)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="screen all the watchlists.")
+    parser.add_argument("--by", choices=list(Screener.RANKS), default="RSI_RANK")
+    parser.add_argument("--top", type=int, default=Configuration.SCREENER_TOP_K)
+    parser.add_argument(
+        "--bottom", action="store_true", help="the lowest ranking symbols instead."
+    )
+    args = parser.parse_args()
+
+    screener = Screener(Screener.universe())
+    print(pd.Series(screener.breadth()).to_string())
+    top_df = screener.top(args.by, args.top, ascending=args.bottom)
+    print(
+        top_df[
+            [InfoKeys.SYMBOL, InfoKeys.SIGNAL, InfoKeys.LAST_PRICE]
+            + [Screener.FROM_YEAR_HIGH]
+            + list(Screener.RANKS)
+        ].to_string(index=False)
+    )
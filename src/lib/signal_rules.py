@@ -0,0 +1,301 @@
+"""class to implement the trade signal rules.
+The rules are read from a TOML file and compiled once into functions computing
+NumPy boolean masks, so that all the scanned symbols are labelled in one pass. Each
+group of rules yields a categorical code per symbol, the signal combines them.
+"""
+
+import ast
+import logging
+import operator
+import sys
+import tomllib
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from constants.config import Configuration
+from constants.stocks import InfoKeys
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class RuleGroup(NamedTuple):
+    """rules labelling a symbol by the first one matching, the default last."""
+
+    name: str
+    conditions: list
+    labels: list
+
+
+class RuleCompiler:
+    """Compiles the rule expressions into functions of the named arrays."""
+
+    COMPARISONS = {
+        ast.Lt: np.less,
+        ast.LtE: np.less_equal,
+        ast.Gt: np.greater,
+        ast.GtE: np.greater_equal,
+        ast.Eq: np.equal,
+        ast.NotEq: np.not_equal,
+    }
+    ARITHMETIC = {
+        ast.Add: operator.add,
+        ast.Sub: operator.sub,
+        ast.Mult: operator.mul,
+        ast.Div: operator.truediv,
+    }
+    FUNCTIONS = {
+        "abs": np.abs,
+        "max": np.maximum,
+        "min": np.minimum,
+        "round": np.round,
+        "where": np.where,
+    }
+
+    def __init__(self, names):
+        self.names = set(names)
+
+    def compile(self, text):
+        """return the function computing the expression out of a dict of arrays."""
+        try:
+            tree = ast.parse(text, mode="eval")
+        except SyntaxError as err:
+            raise ValueError(f"invalid signal rule '{text}': {err.msg}") from err
+        return self.node(tree.body, text)
+
+    def node(self, node, text):
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            value = float(node.value)
+            return lambda env: value
+        if isinstance(node, ast.Name):
+            if node.id not in self.names:
+                raise ValueError(f"unknown name '{node.id}' in signal rule '{text}'.")
+            name = node.id
+            return lambda env: env[name]
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            operand = self.node(node.operand, text)
+            return lambda env: -operand(env)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            operand = self.node(node.operand, text)
+            return lambda env: np.logical_not(operand(env))
+        if isinstance(node, ast.BoolOp):
+            combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+            operands = [self.node(value, text) for value in node.values]
+            return lambda env: combine.reduce([operand(env) for operand in operands])
+        if isinstance(node, ast.BinOp) and type(node.op) in self.ARITHMETIC:
+            func = self.ARITHMETIC[type(node.op)]
+            left, right = self.node(node.left, text), self.node(node.right, text)
+            return lambda env: func(left(env), right(env))
+        if isinstance(node, ast.Compare) and all(
+            type(op) in self.COMPARISONS for op in node.ops
+        ):
+            # a chained comparison holds when every one of its pairs holds.
+            operands = [self.node(node.left, text)] + [
+                self.node(value, text) for value in node.comparators
+            ]
+            funcs = [self.COMPARISONS[type(op)] for op in node.ops]
+
+            def compare(env):
+                values = [operand(env) for operand in operands]
+                masks = [
+                    func(left, right)
+                    for func, left, right in zip(funcs, values, values[1:])
+                ]
+                return masks[0] if len(masks) == 1 else np.logical_and.reduce(masks)
+
+            return compare
+        if (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Name)
+            and node.func.id in self.FUNCTIONS
+            and not node.keywords
+        ):
+            func = self.FUNCTIONS[node.func.id]
+            args = [self.node(arg, text) for arg in node.args]
+            if node.func.id == "round":
+                # the digits are not an array.
+                digits = int(node.args[1].value) if len(node.args) > 1 else 0
+                args = args[:1]
+                return lambda env: func(args[0](env), digits)
+            return lambda env: func(*[arg(env) for arg in args])
+        raise ValueError(
+            f"unsupported expression '{ast.unparse(node)}' in signal rule '{text}'."
+        )
+
+
+class SignalRules:
+    """Trade signal rules evaluated over columns of stock information."""
+
+    _shared = None
+
+    def __init__(self, path=None):
+        with open(path or Configuration.SIGNAL_RULES, "rb") as fh:
+            rules = tomllib.load(fh)
+
+        self.inputs = rules["inputs"]
+        self.signal_format = rules["signal"]
+        compiler = RuleCompiler(list(self.inputs) + list(rules.get("derived", {})))
+        self.derived = {
+            name: compiler.compile(text)
+            for name, text in rules.get("derived", {}).items()
+        }
+        self.requires = rules.get("requires", list(self.inputs))
+        self.backtest = rules.get("backtest", {})
+        self.screener = rules.get("screener", {})
+        self.groups = []
+        for group in rules["groups"]:
+            labels = [rule["label"] for rule in group["rules"]] + [group["default"]]
+            if len(set(labels)) != len(labels):
+                raise ValueError(f"duplicate labels in the '{group['name']}' rules.")
+            self.groups.append(
+                RuleGroup(
+                    group["name"],
+                    [compiler.compile(rule["when"]) for rule in group["rules"]],
+                    labels,
+                )
+            )
+        labels = {group.name: group.labels for group in self.groups}
+        for section in ("backtest", "screener"):
+            for side, spec in getattr(self, section).items():
+                for name, wanted in spec.items():
+                    if name not in labels or set(wanted) - set(labels[name]):
+                        raise ValueError(
+                            f"unknown labels in the {section} {side} rule."
+                        )
+
+    @classmethod
+    def shared(cls):
+        """return the rules of the process, read once."""
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    @staticmethod
+    def column(name, group_name):
+        return f"{name}_{group_name.upper()}"
+
+    def evaluate(self, columns, groups=None):
+        """return the label codes of every group and the mask of the rows having a signal.
+
+        the columns map the stock information keys to equally long arrays; only the
+        named groups are labelled when given.
+        """
+        env = {
+            name: np.asarray(columns[key], dtype=float)
+            for name, key in self.inputs.items()
+        }
+        size = len(next(iter(env.values())))
+        codes = {}
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for name, func in self.derived.items():
+                env[name] = func(env)
+            for group in self.groups:
+                if groups is not None and group.name not in groups:
+                    continue
+                masks = [
+                    np.broadcast_to(condition(env), size)
+                    for condition in group.conditions
+                ]
+                codes[group.name] = np.select(
+                    masks, np.arange(len(masks)), default=len(masks)
+                ).astype(np.int8)
+        has_signal = ~np.logical_and.reduce(
+            [np.isnan(env[name]) for name in self.requires]
+        )
+        return codes, has_signal
+
+    def matches(self, codes, spec):
+        """return the mask of the rows labelled as the spec, group names to labels."""
+        mask = True
+        for group in self.groups:
+            if group.name in spec:
+                wanted = [group.labels.index(label) for label in spec[group.name]]
+                mask = mask & np.isin(codes[group.name], wanted)
+        return np.broadcast_to(mask, len(next(iter(codes.values()))))
+
+    def combined(self, codes):
+        """return a single code per row, ordered by the groups then by their rules."""
+        combined = np.zeros(len(next(iter(codes.values()))), dtype=np.int64)
+        for group in self.groups:
+            combined = combined * len(group.labels) + codes[group.name]
+        return combined
+
+    def label(self, combined_code):
+        """return the signal text of a combined code."""
+        labels = {}
+        for group in reversed(self.groups):
+            combined_code, code = divmod(int(combined_code), len(group.labels))
+            labels[group.name] = group.labels[code]
+        return self.signal_format.format(**labels)
+
+    def signal_row(self, row):
+        """return the signal text of a single row of stock information, None if none.
+
+        the rules are evaluated on scalars, stopping at the first match of each group.
+        """
+        env = {}
+        for name, key in self.inputs.items():
+            value = row.get(key)
+            env[name] = np.float64(np.nan if value is None else value)
+        if all(np.isnan(env[name]) for name in self.requires):
+            return None
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for name, func in self.derived.items():
+                env[name] = func(env)
+            labels = {
+                group.name: next(
+                    (
+                        label
+                        for condition, label in zip(group.conditions, group.labels)
+                        if condition(env)
+                    ),
+                    group.labels[-1],
+                )
+                for group in self.groups
+            }
+        return self.signal_format.format(**labels)
+
+    def signal_frame(self, frame, status=None):
+        """return the categorical signal and group columns of the rows of the frame.
+
+        rows without a signal keep their status, e.g. the scan failures.
+        """
+        codes, has_signal = self.evaluate(frame)
+        signals = pd.DataFrame(index=frame.index)
+        for group in self.groups:
+            signals[self.column(InfoKeys.SIGNAL, group.name)] = (
+                pd.Categorical.from_codes(
+                    np.where(has_signal, codes[group.name], -1), group.labels
+                )
+            )
+
+        # label each distinct combination once, in the order of the groups.
+        combined, inverse = np.unique(self.combined(codes), return_inverse=True)
+        categories = {}
+        category_codes = np.array(
+            [
+                categories.setdefault(self.label(code), len(categories))
+                for code in combined
+            ],
+            dtype=np.int64,
+        )[inverse]
+        if status is not None:
+            status = np.asarray(status, dtype=object)
+            for text in pd.unique(status[~has_signal]):
+                if text is not None and text == text:
+                    categories.setdefault(text, len(categories))
+            status_codes = np.array(
+                [
+                    categories.get(text, -1) if text is not None else -1
+                    for text in status
+                ]
+            )
+        else:
+            status_codes = np.full(len(frame), -1)
+        signals[InfoKeys.SIGNAL] = pd.Categorical.from_codes(
+            np.where(has_signal, category_codes, status_codes),
+            list(categories),
+            ordered=True,
+        )
+        return signals
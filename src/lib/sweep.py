@@ -0,0 +1,362 @@
+"""class to implement the parameter sweeps of the indicator settings.
+The price arrays of the watchlist are stacked once into a matrix in shared memory,
+the grid of indicator parameters is split over the worker pool, and every worker
+backtests its parameter sets over blocks of symbols, computing the indicators out of
+memoized intermediates (true range, directional moves, rolling extremes and bands)
+shared by all the parameter sets using them. The sets are ranked by their backtests.
+"""
+
+import argparse
+import itertools
+import logging
+import math
+import os
+import sys
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from constants.config import Configuration, Timeframe
+from lib.backtest import Backtester
+from lib.indicators import IndicatorEngine
+from lib.utils import Utils
+from lib.worker_pool import WorkerPool
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+# the price matrix of the last sweep attached by this (worker) process.
+_attached = (None, None)
+
+
+class IndicatorCache:
+    """Indicator series of a block of symbols x bars, matching talib, with the
+    intermediates memoized across the parameter sets."""
+
+    def __init__(self, high, low, close):
+        self.high = high
+        self.low = low
+        self.close = close
+        self.memo = {}
+
+    def cached(self, key, func, *args):
+        if key not in self.memo:
+            self.memo[key] = func(*args)
+        return self.memo[key]
+
+    def blank(self):
+        return np.full(self.close.shape, np.nan)
+
+    def moves(self):
+        """return the +DM, -DM and true range of the bars after the first one, as
+        bars x 3 x symbols to walk the bars."""
+        return self.cached("moves", self._moves)
+
+    def _moves(self):
+        high, low, close = self.high.T, self.low.T, self.close.T
+        diff_plus = high[1:] - high[:-1]
+        diff_minus = low[:-1] - low[1:]
+        is_minus = (diff_minus > 0) & (diff_plus < diff_minus)
+        is_plus = ~is_minus & (diff_plus > 0) & (diff_plus > diff_minus)
+        moves = np.empty((len(diff_plus), 3, high.shape[1]))
+        np.multiply(diff_plus, is_plus, out=moves[:, 0])
+        np.multiply(diff_minus, is_minus, out=moves[:, 1])
+        np.subtract(high[1:], low[1:], out=moves[:, 2])
+        np.maximum(moves[:, 2], np.abs(high[1:] - close[:-1]), out=moves[:, 2])
+        np.maximum(moves[:, 2], np.abs(low[1:] - close[:-1]), out=moves[:, 2])
+        return moves
+
+    def adx(self, period):
+        return self.cached(("adx", period), self._adx, period)
+
+    def _adx(self, period):
+        moves = self.moves()
+        # Wilder smoothed moves, from the sum of the first period - 1 ones.
+        smoothed = np.empty_like(moves[period - 1 :])
+        running = moves[: period - 1].sum(axis=0)
+        for idx, bar in enumerate(moves[period - 1 :]):
+            running -= running / period
+            running += bar
+            smoothed[idx] = running
+
+        plus, minus, ranges = smoothed.transpose(1, 0, 2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # talib skips the bars where the range or the DI sum is zero.
+            ranges = np.where(np.abs(ranges) < 1e-8, np.nan, ranges)
+            plus_di = 100 * plus / ranges
+            minus_di = 100 * minus / ranges
+            di_sum = plus_di + minus_di
+            di_sum = np.where(np.abs(di_sum) < 1e-8, np.nan, di_sum)
+            dx = 100 * np.abs(minus_di - plus_di) / di_sum
+
+        adx = self.blank()
+        if len(dx) < period:
+            return adx
+        latest = np.nan_to_num(dx[:period]).sum(axis=0) / period
+        adx[:, 2 * period - 1] = latest
+        skipped = np.isnan(dx[period:])
+        for bar, (bar_dx, bar_skipped) in enumerate(
+            zip(dx[period:], skipped), start=2 * period
+        ):
+            latest = np.where(
+                bar_skipped, latest, (latest * (period - 1) + bar_dx) / period
+            )
+            adx[:, bar] = latest
+        return adx
+
+    def extremes(self, period):
+        """return the rolling highest high and lowest low of the period."""
+        return self.cached(("extremes", period), self._extremes, period)
+
+    def _extremes(self, period):
+        highest, lowest = self.blank(), self.blank()
+        highest[:, period - 1 :] = np.lib.stride_tricks.sliding_window_view(
+            self.high, period, axis=1
+        ).max(axis=2)
+        lowest[:, period - 1 :] = np.lib.stride_tricks.sliding_window_view(
+            self.low, period, axis=1
+        ).min(axis=2)
+        return highest, lowest
+
+    @staticmethod
+    def rolling_mean(values, period):
+        mean = np.full(values.shape, np.nan)
+        mean[:, period - 1 :] = np.lib.stride_tricks.sliding_window_view(
+            values, period, axis=1
+        ).mean(axis=2)
+        return mean
+
+    def fast_k(self, period):
+        return self.cached(("fast_k", period), self._fast_k, period)
+
+    def _fast_k(self, period):
+        highest, lowest = self.extremes(period)
+        ranges = highest - lowest
+        with np.errstate(invalid="ignore"):
+            return np.where(
+                ranges != 0,
+                (self.close - lowest) * 100 / np.where(ranges, ranges, 1),
+                np.where(np.isnan(ranges), np.nan, 0.0),
+            )
+
+    def stoch(self, fastk_period, slowk_period, slowd_period):
+        """return the slow %K and %D, both from the first bar having a %D as talib."""
+        slow_k = self.cached(
+            ("slow_k", fastk_period, slowk_period),
+            self.rolling_mean,
+            self.fast_k(fastk_period),
+            slowk_period,
+        )
+        slow_d = self.cached(
+            ("slow_d", fastk_period, slowk_period, slowd_period),
+            self.rolling_mean,
+            slow_k,
+            slowd_period,
+        )
+        slow_k = slow_k.copy()
+        slow_k[:, : fastk_period + slowk_period + slowd_period - 3] = np.nan
+        return slow_k, slow_d
+
+    def bbands(self, period):
+        """return the upper and lower Bollinger bands, two deviations wide."""
+        return self.cached(("bbands", period), self._bbands, period)
+
+    def _bbands(self, period):
+        mean = self.rolling_mean(self.close, period)
+        variance = self.rolling_mean(self.close * self.close, period) - mean * mean
+        deviation = np.sqrt(np.maximum(variance, 0.0))
+        return mean + 2 * deviation, mean - 2 * deviation
+
+    def series(self, params):
+        """return the indicator series of the signal rules for the parameter set."""
+        stoch_k, stoch_d = self.stoch(
+            params["fastk_period"], params["slowk_period"], params["slowd_period"]
+        )
+        bb_high, bb_low = self.bbands(params["bb_period"])
+        return {
+            "adx": self.adx(params["adx_period"]),
+            "stoch_k": stoch_k,
+            "stoch_d": stoch_d,
+            "bb_high": bb_high,
+            "bb_low": bb_low,
+        }
+
+
+class ParameterSweep:
+    """Backtests of every parameter set of the grid over the symbols of the watchlists."""
+
+    PARAMS = [
+        "adx_period",
+        "bb_period",
+        "fastk_period",
+        "slowk_period",
+        "slowd_period",
+    ]
+
+    def __init__(self, grid=None, years=None, cost_bps=None, timeframe=None):
+        grid = {**Configuration.SWEEP_GRID, **(grid or {})}
+        unknown = set(grid) - set(self.PARAMS)
+        if unknown:
+            raise ValueError(f"the signal rules do not depend on {sorted(unknown)}.")
+        defaults = vars(IndicatorEngine())
+        # the sets sharing the leading parameters are next to each other, so that the
+        # workers reuse their intermediates.
+        self.param_sets = [
+            dict(zip(self.PARAMS, values))
+            for values in itertools.product(
+                *(sorted(grid.get(name, [defaults[name]])) for name in self.PARAMS)
+            )
+        ]
+        self.backtester = Backtester(years, cost_bps, timeframe)
+
+    @staticmethod
+    def share(prices, buffer_dir=None):
+        """stack the open, high, low and close arrays of the symbols into a shared
+        matrix, right aligned and NaN padded; return its path and shape."""
+        bars = max(len(close) for _, _, _, close in prices)
+        shape = (4, len(prices), bars)
+        path = os.path.join(
+            buffer_dir or Configuration.RESULT_BUFFER_DIR,
+            f"niveshak-sweep-{uuid.uuid4().hex}",
+        )
+        matrix = np.memmap(path, dtype=np.float64, mode="w+", shape=shape)
+        matrix[:] = np.nan
+        for row, symbol_prices in enumerate(prices):
+            for field, values in enumerate(symbol_prices):
+                matrix[field, row, bars - len(values) :] = values
+        matrix.flush()
+        return path, shape
+
+    @staticmethod
+    def attach(path, shape):
+        """return the price matrix of the sweep, mapped once per process."""
+        global _attached
+        if _attached[0] != path:
+            _attached = (
+                path,
+                np.memmap(path, dtype=np.float64, mode="r", shape=shape),
+            )
+        return _attached[1]
+
+    @staticmethod
+    def run_part(path, shape, rows, param_sets, years, cost_bps, timeframe):
+        """backtest the parameter sets over the rows of the matrix, in a worker.
+
+        the rows starting at the same bar are computed together, their indicator
+        cache lives for all the parameter sets of the part.
+        """
+        open_, high, low, close = ParameterSweep.attach(path, shape)
+        backtester = Backtester(years, cost_bps, timeframe)
+        rows = np.asarray(rows)
+        starts = np.isnan(close[rows]).sum(axis=1)
+        results = [{} for _ in param_sets]
+        for start in np.unique(starts):
+            block = rows[starts == start]
+            prices = [
+                np.array(field[block, start:]) for field in (open_, high, low, close)
+            ]
+            cache = IndicatorCache(*prices[1:])
+            for metrics, params in zip(results, param_sets):
+                block_metrics = backtester.simulate_block(*prices, cache.series(params))
+                for key, values in block_metrics.items():
+                    metrics.setdefault(key, []).append(values)
+        return [
+            {key: np.concatenate(values) for key, values in metrics.items()}
+            for metrics in results
+        ]
+
+    def run(self, symbols):
+        """return the summary of the backtests of every parameter set, best first."""
+        # the histories are loaded in the workers too, a chunk of symbols each.
+        loaded = self.backtester.load_all(symbols)
+        if not loaded:
+            return pd.DataFrame()
+        path, shape = self.share(list(loaded.values()))
+        try:
+            pool = WorkerPool.shared()
+            parts = Utils.chunks(
+                self.param_sets, math.ceil(len(self.param_sets) / pool.target_size())
+            )
+            row_chunks = Utils.chunks(
+                range(len(loaded)), Configuration.SWEEP_CHUNK_SIZE
+            )
+            tasks = [(part, rows) for part in parts for rows in row_chunks]
+            futures = pool.submit_all(
+                ParameterSweep.run_part,
+                [
+                    (
+                        path,
+                        shape,
+                        rows,
+                        part,
+                        self.backtester.years,
+                        self.backtester.cost * 10000,
+                        self.backtester.timeframe,
+                    )
+                    for part, rows in tasks
+                ],
+            )
+            results = {}
+            for (part, _), future in zip(tasks, futures):
+                for params, metrics in zip(part, future.result().value):
+                    results.setdefault(tuple(params.values()), []).append(
+                        pd.DataFrame(metrics)
+                    )
+        finally:
+            os.remove(path)
+
+        ranking = [
+            {
+                **dict(zip(self.PARAMS, values)),
+                **Backtester.summary(pd.concat(frames, ignore_index=True)),
+            }
+            for values, frames in results.items()
+        ]
+        return pd.DataFrame(ranking).sort_values(
+            Configuration.SWEEP_RANK_BY, ascending=False, ignore_index=True
+        )
+
+    @staticmethod
+    def parse_grid(texts):
+        """return the grid of the name=v1,v2,... texts."""
+        grid = {}
+        for text in texts:
+            name, _, values = text.partition("=")
+            grid[name.strip()] = [int(value) for value in values.split(",")]
+        return grid
+
+
+if __name__ == "__main__":
+    from lib.symbol_registry import SymbolRegistry
+
+    parser = argparse.ArgumentParser(
+        description="sweep the indicator parameters of the trade signal rules."
+    )
+    parser.add_argument("watchlists", nargs="+", help="watchlists to backtest.")
+    parser.add_argument(
+        "--grid",
+        nargs="*",
+        default=[],
+        help="parameter values overriding the configured grid, e.g. adx_period=7,10,14",
+    )
+    parser.add_argument("--years", type=int, default=Configuration.BACKTEST_YEARS)
+    parser.add_argument(
+        "--cost-bps", type=float, default=Configuration.BACKTEST_COST_BPS
+    )
+    parser.add_argument(
+        "--timeframe", choices=Backtester.TIMEFRAMES, default=Timeframe.D1
+    )
+    parser.add_argument("--top", type=int, default=20, help="parameter sets shown.")
+    args = parser.parse_args()
+
+    registry = SymbolRegistry.shared()
+    registry.sync()
+    symbols = [symbol for name in args.watchlists for symbol in registry.symbols(name)]
+    sweep = ParameterSweep(
+        ParameterSweep.parse_grid(args.grid), args.years, args.cost_bps, args.timeframe
+    )
+    ranking_df = sweep.run(symbols)
+    if ranking_df.empty:
+        logging.error("nothing to backtest.")
+        sys.exit(1)
+    print(ranking_df.head(args.top).to_string(index=False))
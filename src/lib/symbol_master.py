@@ -0,0 +1,160 @@
+"""class to implement the local symbol master index.
+Maps every NSE listed equity and ETF symbol to its ISIN, name and series, read
+from the NSE security lists, so that validating a symbol needs no network call.
+"""
+
+import csv
+import logging
+import os
+import sys
+import time
+from typing import NamedTuple
+from urllib.parse import unquote
+
+from constants.config import Configuration, LiveDataLibrary, ReplayMode
+from constants.datafiles import DataFiles
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class SymbolInfo(NamedTuple):
+    isin: str
+    name: str
+    series: str
+
+
+class SymbolMaster:
+    """O(1) symbol to ISIN, name and series lookups over the NSE security lists."""
+
+    # security list file, download url and the columns of symbol, isin, name and series.
+    SOURCES = [
+        (
+            DataFiles.SYMBOL_MASTER_EQUITY,
+            "https://nsearchives.nseindia.com/content/equities/EQUITY_L.csv",
+            ("SYMBOL", "ISIN NUMBER", "NAME OF COMPANY", "SERIES"),
+        ),
+        (
+            DataFiles.SYMBOL_MASTER_ETF,
+            "https://nsearchives.nseindia.com/content/equities/eq_etfseclist.csv",
+            ("Symbol", "ISINNumber", "SecurityName", None),
+        ),
+    ]
+    NSE_SUFFIX = ".NS"
+
+    _shared = None
+
+    def __init__(self):
+        self.symbols = {}
+        self.loaded_at = 0
+
+    @classmethod
+    def shared(cls):
+        """return the index of the current process, reloaded once the security lists
+        on disk are newer.
+
+        it never downloads them, the worker processes would all race to; the process
+        submitting the scans refreshes them beforehand, see sync.
+        """
+        if cls._shared is None:
+            cls._shared = cls()
+        if cls._shared.is_stale():
+            cls._shared.load()
+        return cls._shared
+
+    @classmethod
+    def sync(cls):
+        """download the stale security lists, once before the workers look symbols up."""
+        if Configuration.REPLAY_MODE != ReplayMode.REPLAY:
+            cls().refresh()
+
+    def is_stale(self):
+        """return True if never loaded or a security list changed since."""
+        for csv_name, _, _ in self.SOURCES:
+            try:
+                if os.path.getmtime(csv_name) > self.loaded_at:
+                    return True
+            except OSError:
+                continue
+        return not self.loaded_at
+
+    @staticmethod
+    def read_symbols(csv_name, columns):
+        """return the symbol to info mapping of a security list csv."""
+        symbol_col, isin_col, name_col, series_col = columns
+        symbols = {}
+        with open(csv_name, "r") as csv_file:
+            csv_reader = csv.DictReader(csv_file)
+            for row in csv_reader:
+                # NSE pads some of the column names with spaces.
+                row = {col.strip(): value.strip() for col, value in row.items() if col}
+                symbols[row[symbol_col]] = SymbolInfo(
+                    isin=row[isin_col],
+                    name=row[name_col],
+                    series=row[series_col] if series_col else "ETF",
+                )
+        return symbols
+
+    def load(self):
+        """load all the security lists that are available locally."""
+        symbols = {}
+        for csv_name, _, columns in self.SOURCES:
+            if not os.path.isfile(csv_name):
+                logging.warning(f"symbol master '{csv_name}' is not downloaded yet.")
+                continue
+            try:
+                symbols.update(self.read_symbols(csv_name, columns))
+            except (OSError, KeyError, csv.Error) as err:
+                logging.error(f"failed to read the symbol master '{csv_name}'.")
+                logging.error(str(err))
+        self.symbols = symbols
+        self.loaded_at = time.time()
+        logging.info(f"symbol master has {len(self.symbols)} symbols.")
+
+    def refresh(self, force=False):
+        """download the security lists that are older than the refresh interval."""
+        import requests
+
+        for csv_name, url, _ in self.SOURCES:
+            if (
+                not force
+                and os.path.isfile(csv_name)
+                and time.time() - os.path.getmtime(csv_name)
+                < Configuration.SYMBOL_MASTER_REFRESH
+            ):
+                continue
+            try:
+                response = requests.get(
+                    url, headers={"User-Agent": "Mozilla/5.0"}, timeout=30
+                )
+                response.raise_for_status()
+            except requests.exceptions.RequestException as err:
+                logging.error(f"failed to refresh the symbol master from '{url}'.")
+                logging.error(str(err))
+                continue
+            os.makedirs(os.path.dirname(csv_name), exist_ok=True)
+            tmp_name = f"{csv_name}.{os.getpid()}.tmp"
+            with open(tmp_name, "wb") as csv_file:
+                csv_file.write(response.content)
+            os.replace(tmp_name, csv_name)
+
+    def is_covered(self, symbol: str):
+        """return True if the symbol is an NSE symbol of the configured data library."""
+        if not self.symbols:
+            return False
+        if Configuration.LIVE_DATA_LIB == LiveDataLibrary.NSEPYTHON:
+            return True
+        return symbol.endswith(self.NSE_SUFFIX)
+
+    def lookup(self, symbol: str):
+        """return the info of the NSE symbol, with or without the '.NS' suffix."""
+        symbol = unquote(symbol)
+        if symbol.endswith(self.NSE_SUFFIX):
+            symbol = symbol[: -len(self.NSE_SUFFIX)]
+        return self.symbols.get(symbol)
+
+
+if __name__ == "__main__":
+    # refresh the security lists, e.g. from a daily cron job.
+    master = SymbolMaster()
+    master.refresh(force=True)
+    master.load()
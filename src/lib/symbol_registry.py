@@ -0,0 +1,161 @@
+"""class to implement the symbol registry shared by all the watchlists.
+The symbols of all the lists are interned once and indexed by the lists holding them,
+and the computed stock information of each symbol is kept for the refresh epoch, so
+that every list and every session showing a symbol reuses a single scan of it.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from constants.config import Configuration
+from constants.stocks import InfoKeys
+from lib.scanner import Scanner
+from lib.wathclists import Watchlists
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class SymbolRegistry:
+    """Watchlists reloaded on change, the inverted symbol index and the epoch results."""
+
+    # the view of the symbols of all the lists.
+    ALL_LISTS = "all lists"
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # list name to (path, mtime) of its file, and to its interned symbols.
+        self.files = {}
+        self.lists = {}
+        # symbol to the names of the lists holding it.
+        self.index = {}
+        # (symbol, timeframe) to (epoch, stock information), and to the event of a scan
+        # in flight.
+        self.results = {}
+        self.inflight = {}
+
+    @classmethod
+    def shared(cls):
+        """return the registry of the process, shared by the streamlit sessions."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def sync(self, path=None):
+        """reload the watchlist files added, changed or removed since the last sync."""
+        path = path or Scanner.watchlists_dir()
+        exclude_list = Watchlists().exclude_list
+        with self.lock:
+            seen = set()
+            for entry in os.scandir(path):
+                if not entry.is_file() or entry.name in exclude_list:
+                    continue
+                seen.add(entry.name)
+                stamp = (entry.path, entry.stat().st_mtime_ns)
+                if self.files.get(entry.name) != stamp:
+                    logging.info(f"reading {entry.name}")
+                    self.files[entry.name] = stamp
+                    self.lists[entry.name] = [
+                        sys.intern(symbol)
+                        for symbol in Watchlists.read_symbols(entry.path)
+                        if symbol
+                    ]
+            for name in set(self.lists) - seen:
+                del self.files[name], self.lists[name]
+            self.index = {}
+            for name, symbols in self.lists.items():
+                for symbol in symbols:
+                    self.index.setdefault(symbol, set()).add(name)
+            return dict(self.lists)
+
+    def list_names(self):
+        with self.lock:
+            return sorted(self.lists)
+
+    def symbols(self, list_name):
+        """return the symbols of the list, each one once, the view of all of them too."""
+        with self.lock:
+            if list_name == self.ALL_LISTS:
+                return list(self.index)
+            return list(dict.fromkeys(self.lists.get(list_name, [])))
+
+    def lists_of(self, symbol):
+        """return the names of the lists holding the symbol."""
+        with self.lock:
+            return sorted(self.index.get(symbol, ()))
+
+    @staticmethod
+    def epoch():
+        return int(time.time() // Configuration.SCAN_EPOCH)
+
+    def cached(self, key, epoch):
+        result = self.results.get(key)
+        if result and result[0] == epoch:
+            return result[1]
+        return None
+
+    def store(self, epoch, timeframe, row):
+        # only the rows having quotes are worth sharing, the failures are scanned again.
+        if pd.notna(row.get(InfoKeys.LAST_PRICE)):
+            with self.lock:
+                self.results[(row[InfoKeys.SYMBOL], timeframe)] = (epoch, row)
+
+    def stream(self, symbols, timeframe=None):
+        """yield the stock information of the symbols, each one scanned once per epoch
+        and timeframe.
+
+        the symbols another session is already scanning are waited for.
+        """
+        timeframe = timeframe or Configuration.TIMEFRAME
+        epoch = self.epoch()
+        ready, pending, waiting = [], [], {}
+        with self.lock:
+            for symbol in dict.fromkeys(symbols):
+                key = (symbol, timeframe)
+                row = self.cached(key, epoch)
+                if row is not None:
+                    ready.append(row)
+                elif key in self.inflight:
+                    waiting[symbol] = self.inflight[key]
+                else:
+                    self.inflight[key] = threading.Event()
+                    pending.append(symbol)
+            # results of the earlier epochs are not needed anymore.
+            self.results = {
+                key: result
+                for key, result in self.results.items()
+                if result[0] == epoch
+            }
+
+        # the rows are copied, as the live mode updates its rows in place.
+        for row in ready:
+            yield dict(row)
+        try:
+            for row in Scanner.stream(pending, timeframe) if pending else []:
+                self.store(epoch, timeframe, row)
+                yield dict(row)
+        finally:
+            with self.lock:
+                for symbol in pending:
+                    self.inflight.pop((symbol, timeframe)).set()
+
+        missing = []
+        for symbol, event in waiting.items():
+            event.wait(Configuration.LIVE_DATA_TIMEOUT)
+            with self.lock:
+                row = self.cached((symbol, timeframe), epoch)
+            if row is None:
+                missing.append(symbol)
+            else:
+                yield dict(row)
+        if missing:
+            # the other scan failed on them, try once more.
+            yield from Scanner.stream(missing, timeframe)
@@ -0,0 +1,71 @@
+"""class to implement the bar timeframes.
+Only the finest timeframe of a family is fetched and stored, 15 minutes for the
+intraday ones and a day for the others; the higher timeframes are resampled out of
+it, so that every timeframe costs the provider calls of one.
+"""
+
+import logging
+import sys
+
+from constants.config import Configuration, LiveDataLibrary, Timeframe
+from constants.stocks import NSE
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class Timeframes:
+    """Timeframe helpers, all static."""
+
+    @staticmethod
+    def available(library=None):
+        """return the timeframes the library can serve, the configured one by default."""
+        if (library or Configuration.LIVE_DATA_LIB) == LiveDataLibrary.NSEPYTHON:
+            # nsepython has no intraday bars.
+            return [Timeframe.D1, Timeframe.W1]
+        return list(Timeframe.ALL)
+
+    @staticmethod
+    def base(timeframe=None):
+        """return the timeframe fetched and stored for the timeframe."""
+        return Timeframe.BASE[timeframe or Configuration.TIMEFRAME]
+
+    @staticmethod
+    def is_intraday(timeframe=None):
+        return Timeframes.base(timeframe) != Timeframe.D1
+
+    @staticmethod
+    def lookback_days(timeframe=None):
+        if Timeframes.is_intraday(timeframe):
+            return int(NSE.INTRADAY_LOOKBACK_DAYS)
+        return int(NSE.LOOKBACK_DAYS)
+
+    @staticmethod
+    def yf_lookback_period(timeframe=None):
+        if Timeframes.is_intraday(timeframe):
+            return NSE.YF_INTRADAY_LOOKBACK_PERIOD
+        return NSE.YF_LOOKBACK_PERIOD
+
+    @staticmethod
+    def resample(history, timeframe, columns):
+        """return the bars of the timeframe out of the bars of its base timeframe.
+
+        the columns are the open, high, low, close and volume ones, in that order.
+        """
+        if timeframe == Timeframes.base(timeframe) or len(history) == 0:
+            return history
+        open_col, high_col, low_col, close_col, volume_col = columns
+        aggregations = {
+            open_col: "first",
+            high_col: "max",
+            low_col: "min",
+            close_col: "last",
+            volume_col: "sum",
+        }
+        aggregations = {
+            col: func for col, func in aggregations.items() if col in history.columns
+        }
+        return (
+            history.resample(**Timeframe.RESAMPLE[timeframe])
+            .agg(aggregations)
+            .dropna(subset=[close_col])
+        )
@@ -25,3 +25,9 @@ class Utils:
             return 0.0
 
         return round((a - b) * 100 / a, 2)
+
+    @staticmethod
+    def chunks(items, size):
+        """split the items into consecutive chunks of the given size."""
+        items = list(items)
+        return [items[idx : idx + size] for idx in range(0, len(items), size)]
@@ -24,9 +24,9 @@ class Watchlists:
             symbols = [symbol.strip() for symbol in fh.readlines() if len(symbol) != 0]
         return symbols
 
-    def get_all_lists(self):
+    def get_all_lists(self, path=DataFiles.WATCHLISTS):
         """Get all the nse-watchlists."""
-        for entry in os.scandir(DataFiles.WATCHLISTS):
+        for entry in os.scandir(path):
             if entry.is_file() and entry.name not in self.exclude_list:
                 logging.info(f"reading {entry.name}")
                 self.watchlists[entry.name] = self.read_symbols(entry.path)
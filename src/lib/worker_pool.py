@@ -0,0 +1,227 @@
+"""class to implement the long lived worker pool.
+The worker processes are forked from a server that has already imported the
+data and indicator libraries, live across the scans of all the streamlit sessions,
+are recycled after a number of tasks and are sized after the I/O wait of the tasks.
+"""
+
+import atexit
+import concurrent.futures
+import logging
+import math
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, NamedTuple
+
+from constants.config import Configuration, ReplayMode
+
+logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
+
+
+class TimedResult(NamedTuple):
+    """result of a task with the wall and the CPU seconds it took in the worker."""
+
+    value: Any
+    wall: float
+    cpu: float
+
+
+def init_worker(settings):
+    """apply the settings of the parent and open the per-process provider state."""
+    for name, value in settings.items():
+        setattr(Configuration, name, value)
+
+    from lib.quote_cache import QuoteCache
+    from lib.resilience import ProviderGuard
+
+    ProviderGuard.shared(Configuration.LIVE_DATA_LIB)
+    if Configuration.QUOTE_CACHE:
+        QuoteCache.shared()
+
+
+def run_timed(func, *args):
+    wall, cpu = time.perf_counter(), time.process_time()
+    value = func(*args)
+    return TimedResult(value, time.perf_counter() - wall, time.process_time() - cpu)
+
+
+def ping():
+    return os.getpid()
+
+
+class WorkerPool:
+    """Process pool shared by all the scans of the process, rebuilt when unhealthy."""
+
+    # modules imported once by the fork server instead of by every worker, the main
+    # module included so that the workers do not import it again; the data library
+    # of the configured provider is added, the other one is imported when hedging.
+    PRELOAD = ["__main__", "pandas", "talib", "lib.nifty"]
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, size=None):
+        self.lock = threading.Lock()
+        self.executor = None
+        self.size = size or Configuration.WORKER_POOL_SIZE or self.cpus()
+        self.checked_at = 0.0
+        # tasks submitted and not done yet, of all the scans sharing the pool.
+        self.pending = 0
+        # moving averages of the wall and CPU seconds of the tasks.
+        self.wall = None
+        self.cpu = None
+
+    @classmethod
+    def shared(cls):
+        """return the pool of the current process, streamlit reruns and sessions share it."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+                atexit.register(cls._shared.shutdown)
+            return cls._shared
+
+    @staticmethod
+    def cpus():
+        return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else 1
+
+    @staticmethod
+    def preload():
+        """return the modules for the fork server to import."""
+        if Configuration.REPLAY_MODE == ReplayMode.REPLAY:
+            # the fixtures need no data library.
+            return WorkerPool.PRELOAD
+        return WorkerPool.PRELOAD + [Configuration.LIVE_DATA_LIB]
+
+    @staticmethod
+    def settings():
+        """return the configuration to apply in the workers, which do not fork from us."""
+        return {
+            name: value
+            for name, value in vars(Configuration).items()
+            if name.isupper() and not callable(value)
+        }
+
+    def start(self):
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(self.preload())
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.size,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(self.settings(),),
+            max_tasks_per_child=Configuration.WORKER_MAX_TASKS,
+        )
+        self.checked_at = time.monotonic()
+        logging.info(f"started a pool of {self.size} workers.")
+
+    def shutdown(self):
+        with self.lock:
+            if self.executor:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+
+    def target_size(self):
+        """return the number of workers keeping the CPUs busy while the others wait on I/O."""
+        if Configuration.WORKER_POOL_SIZE or not self.wall or not self.cpu:
+            return self.size
+        io_wait = max(0.0, self.wall - self.cpu) / max(self.cpu, 1e-3)
+        return max(
+            1,
+            min(Configuration.WORKER_POOL_MAX, math.ceil(self.cpus() * (1 + io_wait))),
+        )
+
+    def healthy(self):
+        """return True if the pool is not broken and, when idle, a worker answers within
+        the health check timeout.
+
+        a busy pool is not pinged, the ping would queue behind the tasks of the other
+        scans and time out.
+        """
+        if getattr(self.executor, "_broken", False):
+            logging.error("the worker pool is broken.")
+            return False
+        if self.pending:
+            return True
+        try:
+            self.executor.submit(ping).result(
+                timeout=Configuration.WORKER_HEALTH_TIMEOUT
+            )
+        except (
+            BrokenProcessPool,
+            concurrent.futures.TimeoutError,
+            RuntimeError,
+        ) as err:
+            logging.error(f"the worker pool is unhealthy: {err!r}")
+            return False
+        return True
+
+    def acquire(self):
+        """return the executor, (re)started when missing, broken, unhealthy or mis-sized."""
+        with self.lock:
+            return self.acquire_locked()
+
+    def acquire_locked(self):
+        """acquire with the lock held.
+
+        a replaced executor is shut down without cancelling anything, the tasks already
+        submitted by the other scans still run to completion in it.
+        """
+        target = self.target_size()
+        if self.executor and abs(target - self.size) >= max(2, self.size // 4):
+            logging.info(f"resizing the worker pool to {target} workers.")
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self.size = target
+        if (
+            self.executor
+            and time.monotonic() - self.checked_at
+            > Configuration.WORKER_HEALTH_INTERVAL
+        ):
+            self.checked_at = time.monotonic()
+            if not self.healthy():
+                self.executor.shutdown(wait=False)
+                self.executor = None
+        if self.executor is None:
+            self.start()
+        return self.executor
+
+    def submit_all(self, func, args_list):
+        """run the function in the workers once per arguments, return the futures.
+
+        each future results in a TimedResult; the pool is checked and resized only
+        here, between the scans, and the tasks are queued before another scan can
+        replace the executor.
+        """
+        with self.lock:
+            executor = self.acquire_locked()
+            try:
+                futures = [
+                    executor.submit(run_timed, func, *args) for args in args_list
+                ]
+            except BrokenProcessPool:
+                self.executor = None
+                executor = self.acquire_locked()
+                futures = [
+                    executor.submit(run_timed, func, *args) for args in args_list
+                ]
+            self.pending += len(futures)
+        for future in futures:
+            future.add_done_callback(self.record)
+        return futures
+
+    def record(self, future):
+        """fold the timings of the completed task into the moving averages."""
+        with self.lock:
+            self.pending -= 1
+        if future.cancelled() or future.exception():
+            return
+        result = future.result()
+        with self.lock:
+            if self.wall is None:
+                self.wall, self.cpu = result.wall, result.cpu
+            else:
+                self.wall = 0.9 * self.wall + 0.1 * result.wall
+                self.cpu = 0.9 * self.cpu + 0.1 * result.cpu
@@ -1,15 +1,21 @@
-import concurrent.futures
+import argparse
 import logging
 import sys
+import time
 
 import pandas as pd
-import pyinstrument
 import streamlit as st
 
-from constants.config import Configuration
+from constants.config import Configuration, Timeframe
 from constants.stocks import InfoKeys, RawInfoKeys
-from lib.nifty import Nifty
-from lib.wathclists import Watchlists
+from lib.instrumentation import Instrumentation
+from lib.live import LiveBoard
+from lib.quote_cache import QuoteCache
+from lib.resilience import ProviderGuard
+from lib.scanner import Scanner
+from lib.screener import Screener
+from lib.symbol_registry import SymbolRegistry
+from lib.timeframes import Timeframes
 
 logging.basicConfig(stream=sys.stdout, level=Configuration.LOG_LEVEL)
 
@@ -19,36 +25,162 @@ class Niveshak:
     def __init__(self):
         self.list_name = None
         self.list_symbols = None
+        self.live = False
+        self.timeframe = Configuration.TIMEFRAME
 
     def select_list(self):
         """Show the main page to start the scanners."""
-        wl = Watchlists()
-        wl.get_all_lists()
+        registry = SymbolRegistry.shared()
+        registry.sync()
         self.list_name = st.selectbox(
             "Which list to scan?",
-            sorted(wl.watchlists.keys()),
+            [SymbolRegistry.ALL_LISTS] + registry.list_names(),
             index=None,
             placeholder="select a list",
         )
         st.write("displaying watchlist: ", self.list_name)
+        timeframes = Timeframes.available()
+        self.timeframe = st.radio(
+            "timeframe",
+            timeframes,
+            index=timeframes.index(Configuration.TIMEFRAME),
+            horizontal=True,
+        )
+        # the live bars are daily ones.
+        self.live = st.toggle(
+            "live updates",
+            help=f"poll the quotes every {Configuration.LIVE_POLL_INTERVAL} seconds.",
+            disabled=self.timeframe != Timeframe.D1,
+        ) and (self.timeframe == Timeframe.D1)
         if self.list_name:
-            self.list_symbols = wl.watchlists[self.list_name]
-            st.write(self.show_list_info())
+            self.list_symbols = registry.symbols(self.list_name)
+            display_df = self.show_list_info()
+            if self.list_name == SymbolRegistry.ALL_LISTS:
+                self.show_universe(display_df)
 
-    @pyinstrument.profile(use_timing_thread=True)
     def show_list_info(self):
-        """display the stock information for each of the list element."""
-        with concurrent.futures.ProcessPoolExecutor(
-            max_workers=Configuration.CONCURRENCY
-        ) as executor:
-            results = executor.map(
-                Nifty().get_stock_info,
-                self.list_symbols,
-                timeout=Configuration.LIVE_DATA_TIMEOUT,
+        """display the stock information for each of the list element as it arrives.
+
+        a fresh snapshot of the headless scanner is displayed instead, when it covers the list.
+        in the live mode the displayed rows are then kept up to date.
+        """
+        board = st.session_state.get("live_board")
+        if self.live and board is not None and board.name == self.list_name:
+            # the live board already follows the list, no need to scan it again.
+            display_df = self.arrange_display_columns(board.table)
+            table = st.empty()
+            table.dataframe(display_df, hide_index=True)
+            self.show_live_updates(board, table)
+            return display_df
+
+        snapshot_df, scanned_at = None, None
+        if self.timeframe == Configuration.TIMEFRAME:
+            snapshot_df, scanned_at = Scanner.latest_snapshot()
+        if snapshot_df is not None:
+            list_df = snapshot_df[snapshot_df[InfoKeys.SYMBOL].isin(self.list_symbols)]
+            if set(list_df[InfoKeys.SYMBOL]) >= {s for s in self.list_symbols if s}:
+                st.caption(f"from the scan at {scanned_at:%H:%M:%S}")
+                display_df = self.arrange_display_columns(list_df)
+                table = st.empty()
+                table.dataframe(display_df)
+                self.follow_live(list_df.to_dict("records"), table)
+                return display_df
+
+        stages_before = None
+        if Configuration.INSTRUMENTATION:
+            stages_before = Instrumentation.shared().snapshot()
+        progress = st.progress(0.0, text="scanning the watchlist")
+        table = st.empty()
+        rows = []
+        last_render = 0.0
+        for row in self.stream_list_info():
+            rows.append(row)
+            progress.progress(
+                len(rows) / len(self.list_symbols),
+                text=f"scanned {len(rows)}/{len(self.list_symbols)} symbols",
             )
+            # re-rendering the whole table for every row costs more than the row itself.
+            if time.monotonic() - last_render > Configuration.STREAM_REFRESH_INTERVAL:
+                table.dataframe(self.arrange_display_columns(pd.DataFrame(rows)))
+                last_render = time.monotonic()
+
+        progress.empty()
+        display_df = self.arrange_display_columns(pd.DataFrame(rows))
+        table.dataframe(display_df)
+        self.show_provider_metrics()
+        if stages_before:
+            self.show_stage_breakdown(stages_before)
+        self.follow_live(rows, table)
+        return display_df
 
-        data = list(results)
-        return self.arrange_display_columns(pd.DataFrame(data))
+    def follow_live(self, rows, table):
+        """start the live updates of the displayed rows, when the live mode is on."""
+        st.session_state.pop("live_board", None)
+        if self.live:
+            board = LiveBoard(self.list_name, rows)
+            st.session_state["live_board"] = board
+            self.show_live_updates(board, table)
+
+    @staticmethod
+    @st.fragment(run_every=Configuration.LIVE_POLL_INTERVAL)
+    def show_live_updates(board, table):
+        """poll the live quotes, the table is only sent again when some rows changed.
+
+        only this fragment reruns on every poll, not the whole page.
+        """
+        changed = board.poll()
+        if changed:
+            table.dataframe(
+                Niveshak.arrange_display_columns(board.table), hide_index=True
+            )
+        st.caption(
+            f"live: {len(changed)} of {len(board.rows)} symbols moved "
+            f"at {board.polled_at:%H:%M:%S}"
+        )
+
+    @staticmethod
+    def show_universe(display_df):
+        """display the market breadth and the top ranking symbols of all the lists."""
+        screener = Screener(display_df)
+        breadth = screener.breadth()
+        st.subheader("universe")
+        for column, (name, value) in zip(st.columns(len(breadth)), breadth.items()):
+            column.metric(name.replace("_", " ").lower(), value)
+        rank_column, k_column, order_column = st.columns(3)
+        by = rank_column.selectbox("rank by", list(Screener.RANKS))
+        k = k_column.number_input(
+            "symbols", min_value=1, value=Configuration.SCREENER_TOP_K
+        )
+        bottom = order_column.toggle("lowest first")
+        st.dataframe(
+            screener.top(by, k, ascending=bottom)[
+                [InfoKeys.SYMBOL, InfoKeys.NAME, InfoKeys.SIGNAL, InfoKeys.LAST_PRICE]
+                + [Screener.FROM_YEAR_HIGH]
+                + list(Screener.RANKS)
+            ],
+            hide_index=True,
+        )
+
+    @staticmethod
+    def show_provider_metrics():
+        """display the provider throughput counters to tune the rate limits."""
+        with st.expander("provider metrics"):
+            st.write(ProviderGuard.shared(Configuration.LIVE_DATA_LIB).metrics())
+            if Configuration.QUOTE_CACHE:
+                st.write("quote cache", QuoteCache.shared().stats())
+
+    @staticmethod
+    def show_stage_breakdown(stages_before):
+        """display where the time of the scan went, summed over all the processes."""
+        breakdown = Instrumentation.breakdown(
+            stages_before, Instrumentation.shared().snapshot()
+        )
+        with st.expander("scan stages"):
+            st.dataframe(pd.DataFrame(breakdown), hide_index=True)
+
+    def stream_list_info(self):
+        """yield the stock information for each of the list element once it completes."""
+        return SymbolRegistry.shared().stream(self.list_symbols, self.timeframe)
 
     @staticmethod
     def arrange_display_columns(df):
@@ -89,4 +221,17 @@ class Niveshak:
 
 
 if __name__ == "__main__":
-    Niveshak().display_welcome_page()
+    parser = argparse.ArgumentParser(description="NSE India trade signal scanner.")
+    commands = parser.add_subparsers(dest="command")
+    scan_parser = commands.add_parser(
+        "scan", help="scan all the watchlists headless and write a snapshot."
+    )
+    scan_parser.add_argument(
+        "--every", type=int, default=0, help="repeat the scan every given seconds."
+    )
+    args = parser.parse_args()
+
+    if args.command == "scan":
+        Scanner.run(args.every)
+    else:
+        Niveshak().display_welcome_page()
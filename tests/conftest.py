@@ -0,0 +1,26 @@
+import os
+import sys
+
+import pytest
+
+# the modules are imported from src, the way the app runs.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
+
+from constants.config import Configuration, LiveDataLibrary, ReplayMode  # noqa: E402
+from lib.resilience import ProviderGuard  # noqa: E402
+
+
+@pytest.fixture
+def configuration(tmp_path, monkeypatch):
+    """point the stores of the app into the test directory, yfinance live data."""
+    monkeypatch.setattr(Configuration, "LIVE_DATA_LIB", LiveDataLibrary.YFINANCE)
+    monkeypatch.setattr(Configuration, "REPLAY_MODE", ReplayMode.OFF)
+    monkeypatch.setattr(Configuration, "HISTORY_CACHE", True)
+    monkeypatch.setattr(Configuration, "HISTORY_CACHE_DIR", str(tmp_path / "history"))
+    monkeypatch.setattr(Configuration, "BHAVCOPY_DIR", str(tmp_path / "bhavcopy"))
+    monkeypatch.setattr(
+        Configuration, "PROVIDER_STATE_PATH", str(tmp_path / "providers.sqlite")
+    )
+    monkeypatch.setattr(Configuration, "INSTRUMENTATION", False)
+    monkeypatch.setattr(ProviderGuard, "_shared", {})
+    return Configuration
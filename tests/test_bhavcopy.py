@@ -0,0 +1,130 @@
+import datetime
+import os
+import zipfile
+
+import pandas as pd
+import pytest
+
+from constants.config import LiveDataLibrary
+from constants.stocks import NSE
+from lib.bhavcopy import Bhavcopy
+from lib.history_store import HistoryStore
+from lib.nifty_live import NiftyLive
+from lib.resilience import ProviderError
+
+FIXTURE = os.path.join(
+    os.path.dirname(__file__), "data", "BhavCopy_NSE_CM_0_0_0_20240708_F_0000.csv"
+)
+
+
+@pytest.fixture
+def nsepython(configuration, monkeypatch):
+    monkeypatch.setattr(configuration, "LIVE_DATA_LIB", LiveDataLibrary.NSEPYTHON)
+    monkeypatch.setattr(configuration, "BHAVCOPY_READY_HOUR", 0)
+    return configuration
+
+
+class StubDownload:
+    """Bhavcopy.download writing the fixture dated as the day, failing on some days,
+    without the symbols suspended from a given day."""
+
+    def __init__(self, bhavcopy, failing=(), suspended=None):
+        self.bhavcopy = bhavcopy
+        self.failing = set(failing)
+        self.suspended = suspended or {}
+        self.dates = []
+
+    def __call__(self, date):
+        self.dates.append(date)
+        if date in self.failing:
+            raise ProviderError(LiveDataLibrary.NSEPYTHON, "server")
+        with open(FIXTURE) as fh:
+            lines = fh.read().replace("2024-07-08", f"{date}").splitlines()
+        lines = [
+            line
+            for line in lines
+            if not any(
+                f",{symbol},EQ," in line and date >= since
+                for symbol, since in self.suspended.items()
+            )
+        ]
+        path = self.bhavcopy.path(date)
+        os.makedirs(self.bhavcopy.bhavcopy_dir, exist_ok=True)
+        with zipfile.ZipFile(path, "w") as archive:
+            archive.writestr(os.path.basename(FIXTURE), "\n".join(lines) + "\n")
+        return path
+
+
+def trading_days(count):
+    """return the last trading days up to today, and the days to sync back to them."""
+    today = datetime.date.today()
+    days = [day.date() for day in pd.bdate_range(end=today, periods=count)]
+    return days, (today - days[0]).days
+
+
+def test_read_the_equity_series(nsepython):
+    bars = Bhavcopy.read(FIXTURE)
+
+    assert list(bars[Bhavcopy.SYMBOL]) == ["SBIN", "M&M", "INFY"]
+    assert (bars[NSE.HISTCOL_SORTER] == pd.Timestamp("2024-07-08")).all()
+    assert bars.set_index(Bhavcopy.SYMBOL).loc["SBIN", NSE.HISTCOL_CLOSE] == 845.45
+
+
+def test_ingest_keyed_like_the_fetches(nsepython):
+    bhavcopy = Bhavcopy()
+    keys = [Bhavcopy.store_key("SBIN"), Bhavcopy.store_key("M&M")]
+
+    assert bhavcopy.ingest([FIXTURE], keys) == 2
+
+    assert sorted(bhavcopy.store.symbols()) == sorted(keys)
+    mm = bhavcopy.store.load(Bhavcopy.store_key("M&M"))
+    assert list(mm[NSE.HISTCOL_CLOSE]) == [2889.9]
+
+
+def test_sync_ingests_the_stored_and_given_symbols(nsepython, monkeypatch):
+    bhavcopy = Bhavcopy()
+    bhavcopy.store.save("INFY", pd.DataFrame(columns=bhavcopy.store.columns))
+    download = StubDownload(bhavcopy)
+    monkeypatch.setattr(bhavcopy, "download", download)
+
+    paths = bhavcopy.sync(days=7, symbols=["SBIN"])
+
+    assert len(paths) == len(download.dates) > 0
+    assert sorted(bhavcopy.store.symbols()) == ["INFY", "SBIN"]
+    assert len(bhavcopy.store.load("SBIN")) == len(paths)
+    assert bhavcopy.ingested_dates() == (download.dates[0], download.dates[-1])
+
+
+def test_sync_resumes_from_a_failed_day(nsepython, monkeypatch):
+    bhavcopy = Bhavcopy()
+    days, back = trading_days(4)
+    download = StubDownload(bhavcopy, failing=[days[2]])
+    monkeypatch.setattr(bhavcopy, "download", download)
+
+    bhavcopy.sync(days=back, symbols=["SBIN"])
+    assert download.dates == days[:3]
+    assert bhavcopy.ingested_dates() is None
+
+    download.failing.clear()
+    download.dates.clear()
+    bhavcopy.sync(days=back, symbols=["SBIN"])
+    assert download.dates == days[2:]
+    assert bhavcopy.ingested_dates() == (days[0], days[-1])
+    assert len(bhavcopy.store.load("SBIN")) == 4
+
+
+def test_suspended_symbol_served_from_the_store(nsepython, monkeypatch):
+    bhavcopy = Bhavcopy()
+    days, back = trading_days(6)
+    # INFY stops trading after the second day.
+    download = StubDownload(bhavcopy, suspended={"INFY": days[2]})
+    monkeypatch.setattr(bhavcopy, "download", download)
+    bhavcopy.sync(days=back, symbols=["SBIN", "INFY"])
+    monkeypatch.setattr("lib.nifty_live.Bhavcopy", lambda: bhavcopy)
+
+    suspended = bhavcopy.store.load("INFY").index.max()
+    assert suspended.date() == days[1]
+    assert NiftyLive.from_bhavcopy(suspended)
+    assert NiftyLive.from_bhavcopy(bhavcopy.store.load("SBIN").index.max())
+    # bars older than the ingested bhavcopy files are fetched.
+    assert not NiftyLive.from_bhavcopy(pd.Timestamp(days[0]) - pd.Timedelta(days=7))
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+import talib
+
+from constants.stocks import NSE
+from lib.incremental import IncrementalIndicators
+
+
+@pytest.fixture(scope="module")
+def bars():
+    """a fixed random walk of 200 daily bars."""
+    rng = np.random.default_rng(7)
+    close = 100 + rng.standard_normal(200).cumsum()
+    spread = np.abs(rng.standard_normal(200))
+    return close + spread, close - spread, close
+
+
+@pytest.fixture(scope="module")
+def reference(bars):
+    """the talib series of every indicator, as the scans compute them."""
+    high, low, close = bars
+    bb_high, bb_mid, bb_low = talib.BBANDS(close, int(NSE.BB_TIMEPERIOD))
+    stoch_k, stoch_d = talib.STOCH(
+        high,
+        low,
+        close,
+        fastk_period=int(NSE.STOCH_FASTK_PERIOD),
+        slowk_period=int(NSE.STOCH_SLOWK_PERIOD),
+        slowd_period=int(NSE.STOCH_SLOWD_PERIOD),
+    )
+    return {
+        "rsi": talib.RSI(close, int(NSE.DEFAULT_TIMEPERIOD)),
+        "adx": talib.ADX(high, low, close, int(NSE.ADX_TIMEPERIOD)),
+        "bb_high": bb_high,
+        "bb_mid": bb_mid,
+        "bb_low": bb_low,
+        "stoch_k": stoch_k,
+        "stoch_d": stoch_d,
+        "ema_20": talib.EMA(close, int(NSE.EMA_TIMEPERIOD)),
+    }
+
+
+def assert_matches(values, reference, index):
+    for name, series in reference.items():
+        assert getattr(values, name) == pytest.approx(
+            round(series[index], 2), abs=0.011
+        ), f"{name} at bar {index}"
+
+
+def test_update_matches_talib(bars, reference):
+    state = IncrementalIndicators()
+    for index, bar in enumerate(zip(*bars)):
+        values = state.update(*bar)
+        # past the longest warm up, the ADX one.
+        if index >= 3 * int(NSE.ADX_TIMEPERIOD):
+            assert_matches(values, reference, index)
+
+
+def test_peek_matches_talib_without_changing_the_state(bars, reference):
+    state = IncrementalIndicators()
+    for bar in zip(*(series[:150] for series in bars)):
+        state.update(*bar)
+
+    for index in range(150, 200):
+        bar = [series[index] for series in bars]
+        # the in-progress bar is peeked at as it moves, then completed.
+        state.peek(bar[0] + 1, bar[1] - 1, bar[2] + 0.5)
+        assert_matches(state.peek(*bar), reference, index)
+        assert_matches(state.update(*bar), reference, index)
@@ -0,0 +1,35 @@
+import sys
+
+import pytest
+
+from constants.config import LiveDataLibrary
+from lib.nifty import Nifty
+from lib.symbol_master import SymbolInfo, SymbolMaster
+
+
+@pytest.fixture
+def master(configuration, monkeypatch):
+    """symbol master listing SBIN only, the provider libraries cannot be imported."""
+    master = SymbolMaster()
+    master.symbols = {"SBIN": SymbolInfo("INE062A01020", "State Bank of India", "EQ")}
+    master.loaded_at = float("inf")
+    monkeypatch.setattr(SymbolMaster, "_shared", master)
+    monkeypatch.setitem(sys.modules, "yfinance", None)
+    return master
+
+
+@pytest.mark.parametrize(
+    "library", [LiveDataLibrary.YFINANCE, LiveDataLibrary.NSEPYTHON]
+)
+def test_unlisted_symbol_has_no_data_without_network_calls(
+    master, configuration, monkeypatch, library
+):
+    monkeypatch.setattr(configuration, "LIVE_DATA_LIB", library)
+    suffix = ".NS" if library == LiveDataLibrary.YFINANCE else ""
+
+    assert Nifty().get_stock_info(f"NOSUCH{suffix}") is None
+
+    nifty = Nifty()
+    nifty.safe_symbol = f"SBIN{suffix}"
+    assert nifty.validate_symbol()
+    assert nifty.symbol_info.name == "State Bank of India"
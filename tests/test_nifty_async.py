@@ -0,0 +1,33 @@
+import asyncio
+
+import pytest
+
+from lib.nifty_async import NiftyAsync
+
+
+class FlakySession:
+    """session whose first GET fails, like a dropped connection."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def get(self, url, params=None):
+        self.calls += 1
+        if self.calls == 1:
+            raise ConnectionError("dropped")
+        return url
+
+
+def test_failed_warm_up_is_retried(configuration):
+    fetcher = NiftyAsync()
+    fetcher.session = FlakySession()
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(fetcher.warm_up_nse())
+
+    async def warm_up_twice():
+        await fetcher.warm_up_nse()
+        await fetcher.warm_up_nse()
+
+    asyncio.run(warm_up_twice())
+    assert fetcher.session.calls == 2
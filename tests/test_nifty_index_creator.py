@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from constants.config import LiveDataLibrary
+from lib.nifty_index_creator import NiftyIndexCreator
+
+
+def index_csv(tmp_path, name, symbols):
+    """write an NSE index constituent CSV of the symbols."""
+    path = tmp_path / name
+    rows = [
+        f"Company {symbol}, Industry,{symbol} ,EQ,INE{idx:07d}"
+        for idx, symbol in enumerate(symbols)
+    ]
+    path.write_text(
+        "Company Name,Industry,Symbol,Series,ISIN Code\n" + "\n".join(rows) + "\n"
+    )
+    return str(path)
+
+
+@pytest.fixture
+def creator(tmp_path):
+    return NiftyIndexCreator(str(tmp_path / "watchlists"), LiveDataLibrary.YFINANCE)
+
+
+@pytest.fixture
+def indices(tmp_path):
+    return [
+        index_csv(tmp_path, "nifty2.csv", ["SBIN", "INFY"]),
+        index_csv(tmp_path, "nifty4.csv", ["INFY", "TCS", "SBIN", "M&M", "TCS"]),
+        index_csv(tmp_path, "nifty5.csv", ["M&M", "WIPRO", "TCS", "SBIN", "INFY"]),
+    ]
+
+
+def test_bands_of_nested_indices(creator, indices):
+    assert creator.bands(indices) == [
+        ["SBIN.NS", "INFY.NS"],
+        ["TCS.NS", "M&M.NS"],
+        ["WIPRO.NS"],
+    ]
+
+
+def test_union_and_difference(creator, indices):
+    assert creator.union(indices[:2]) == ["SBIN.NS", "INFY.NS", "TCS.NS", "M&M.NS"]
+    assert creator.difference(indices[2], indices[:1]) == [
+        "M&M.NS",
+        "WIPRO.NS",
+        "TCS.NS",
+    ]
+
+
+def test_nsepython_symbols_have_no_suffix(tmp_path, indices):
+    creator = NiftyIndexCreator(str(tmp_path), LiveDataLibrary.NSEPYTHON)
+
+    assert creator.union(indices[:1]) == ["SBIN", "INFY"]
+
+
+def test_write_reports_the_added_and_removed_symbols(creator):
+    assert creator.write("list", ["SBIN.NS", "INFY.NS"]).added == ["SBIN.NS", "INFY.NS"]
+
+    diff = creator.write("list", ["INFY.NS", "TCS.NS"])
+
+    assert (diff.added, diff.removed) == (["TCS.NS"], ["SBIN.NS"])
+    with open(creator.path("list")) as fh:
+        assert fh.read() == "INFY.NS\nTCS.NS\n"
+
+
+def test_dry_run_and_unchanged_lists_are_not_written(creator):
+    creator.write("list", ["SBIN.NS"])
+    written_at = os.path.getmtime(creator.path("list"))
+
+    assert creator.write("list", ["TCS.NS"], dry_run=True).added == ["TCS.NS"]
+    diff = creator.write("list", ["SBIN.NS"])
+
+    assert (diff.added, diff.removed) == ([], [])
+    assert os.path.getmtime(creator.path("list")) == written_at
+    with open(creator.path("list")) as fh:
+        assert fh.read() == "SBIN.NS\n"
+
+
+def test_failed_write_keeps_the_old_list(creator, monkeypatch):
+    creator.write("list", ["SBIN.NS"])
+
+    def failing_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        creator.write("list", ["TCS.NS"])
+
+    with open(creator.path("list")) as fh:
+        assert fh.read() == "SBIN.NS\n"
@@ -0,0 +1,112 @@
+import pandas as pd
+
+from constants.config import LiveDataLibrary
+from constants.stocks import NSE
+from lib.history_store import HistoryStore
+from lib.nifty_live import NiftyLive
+
+COLUMNS = [
+    NSE.YF_HISTCOL_OPEN,
+    NSE.YF_HISTCOL_HIGH,
+    NSE.YF_HISTCOL_LOW,
+    NSE.YF_HISTCOL_CLOSE,
+    NSE.YF_HISTCOL_VOLUME,
+]
+
+
+def bars(days, end=None):
+    """return daily bars of a constant price up to the end day, tz-naive like yf.download."""
+    index = pd.date_range(end=end or pd.Timestamp.now().normalize(), periods=days)
+    return pd.DataFrame(100.0, index=index, columns=COLUMNS)
+
+
+class StubDownloader:
+    """yf.download counting its calls, returning the bars of every ticker asked."""
+
+    def __init__(self, days=5):
+        self.days = days
+        self.calls = []
+
+    def __call__(self, tickers, **kwargs):
+        self.calls.append({"tickers": tickers, **kwargs})
+        return pd.concat({ticker: bars(self.days) for ticker in tickers}, axis=1)
+
+
+def test_bulk_history_one_request_per_chunk(configuration):
+    symbols = [f"S{idx}.NS" for idx in range(120)]
+    downloader = StubDownloader()
+
+    bulk_df = NiftyLive.get_historical_data_bulk(
+        symbols, chunk_size=50, downloader=downloader
+    )
+
+    assert [len(call["tickers"]) for call in downloader.calls] == [50, 50, 20]
+    assert all("period" in call and "start" not in call for call in downloader.calls)
+    assert set(bulk_df.columns.get_level_values(0)) == set(symbols)
+
+
+def test_bulk_history_warm_store_fetches_from_the_last_bar(configuration):
+    symbols = [f"S{idx}.NS" for idx in range(10)]
+    last_day = pd.Timestamp.now().normalize() - pd.Timedelta(days=3)
+    store = HistoryStore()
+    for symbol in symbols:
+        store.save(symbol, bars(30, end=last_day))
+    downloader = StubDownloader()
+
+    NiftyLive.get_historical_data_bulk(symbols, chunk_size=50, downloader=downloader)
+
+    assert len(downloader.calls) == 1
+    assert downloader.calls[0]["start"] == last_day.date()
+    assert "period" not in downloader.calls[0]
+    assert store.load(symbols[0]).index.max() == pd.Timestamp.now().normalize()
+
+
+class FailingDownloader(StubDownloader):
+    """yf.download failing for the chunks holding a given ticker."""
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = failing
+
+    def __call__(self, tickers, **kwargs):
+        data = super().__call__(tickers, **kwargs)
+        return pd.DataFrame() if self.failing in tickers else data
+
+
+def test_bulk_history_leaves_failed_chunks_to_the_workers(configuration):
+    symbols = [f"S{idx}.NS" for idx in range(6)]
+    downloader = FailingDownloader("S4.NS")
+
+    bulk_df = NiftyLive.get_historical_data_bulk(
+        symbols, chunk_size=3, downloader=downloader
+    )
+
+    assert len(downloader.calls) == 2
+    for symbol in symbols[:3]:
+        assert len(NiftyLive.slice_historical_data(bulk_df, symbol)) == 5
+    for symbol in symbols[3:]:
+        assert NiftyLive.slice_historical_data(bulk_df, symbol) is None
+
+
+def test_bulk_history_without_multi_ticker_endpoint(configuration, monkeypatch):
+    monkeypatch.setattr(configuration, "LIVE_DATA_LIB", LiveDataLibrary.NSEPYTHON)
+    monkeypatch.setattr(configuration, "BHAVCOPY_HISTORY", False)
+
+    bulk_df = NiftyLive.get_historical_data_bulk(["SBIN", "INFY"])
+
+    assert bulk_df.empty
+    assert NiftyLive.slice_historical_data(bulk_df, "SBIN") is None
+
+
+def test_bulk_history_yields_each_chunk_as_it_is_fetched(configuration):
+    symbols = [f"S{idx}.NS" for idx in range(6)]
+    downloader = FailingDownloader("S4.NS")
+
+    chunks = NiftyLive.iter_historical_data_bulk(
+        symbols, chunk_size=3, downloader=downloader
+    )
+    chunk, frames = next(chunks)
+
+    assert len(downloader.calls) == 1
+    assert chunk == symbols[:3] and set(frames) == set(symbols[:3])
+    assert [frames for _, frames in chunks] == [{}]
@@ -0,0 +1,85 @@
+import threading
+import time
+
+import pytest
+
+from lib.providers import Provider, Providers
+
+
+class StubProvider(Provider):
+    """provider answering its quotes after the given seconds."""
+
+    def __init__(self, name, seconds):
+        self.NAME = name
+        self.seconds = seconds
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def symbol(self, symbol):
+        return symbol
+
+    def normalize_quotes(self, raw):
+        return raw
+
+    def raw_quotes(self, quotes):
+        return quotes
+
+    def fetch_quotes(self, symbol):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.seconds)
+        return {"provider": self.NAME}
+
+    def fetch_history(self, symbol, last_timestamp, base):
+        return None
+
+
+@pytest.fixture
+def hedging(configuration, monkeypatch):
+    monkeypatch.setattr(configuration, "HEDGED_REQUESTS", True)
+    monkeypatch.setattr(configuration, "HEDGE_DEFAULT_DEADLINE", 0.05)
+    monkeypatch.setattr(configuration, "HEDGE_THREADS", 1)
+    monkeypatch.setattr(Providers, "_executors", {})
+    return configuration
+
+
+def hedged_quotes(*providers):
+    provider, raw = Providers.hedged(
+        "quotes",
+        [(provider, "SBIN.NS") for provider in providers],
+        lambda provider, symbol: provider.fetch_quotes(symbol),
+        lambda provider, raw: bool(raw),
+    )
+    return provider.NAME, raw
+
+
+def test_hedge_answers_when_the_first_provider_is_slow(hedging):
+    slow, fast = StubProvider("slow", 0.5), StubProvider("fast", 0)
+
+    start = time.monotonic()
+    assert hedged_quotes(slow, fast)[0] == "fast"
+    assert time.monotonic() - start < 0.4
+    assert fast.guard().metrics()["hedge_answers_quotes"] == 1
+
+
+def test_no_hedge_while_the_hedge_threads_are_busy(hedging):
+    first, hedge = StubProvider("first", 0.2), StubProvider("hedge", 1)
+
+    # the hedge of the first call loses, it keeps the only hedge thread busy.
+    assert hedged_quotes(first, hedge)[0] == "first"
+    assert hedged_quotes(first, hedge)[0] == "first"
+
+    assert hedge.calls == 1
+    assert hedge.guard().metrics()["hedges_skipped_quotes"] == 1
+
+
+def test_providers_implement_the_whole_schema():
+    with pytest.raises(TypeError):
+        Provider()
+
+    class Partial(Provider):
+        def symbol(self, symbol):
+            return symbol
+
+    with pytest.raises(TypeError):
+        Partial()
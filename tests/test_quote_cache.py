@@ -0,0 +1,114 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from constants.config import ReplayMode
+from lib.quote_cache import QuoteCache
+
+
+@pytest.fixture
+def cache(tmp_path, configuration):
+    return QuoteCache(
+        path=str(tmp_path / "quotes.sqlite"),
+        max_entries=2,
+        default_ttl=60,
+        field_ttl={"NAME": 3600},
+    )
+
+
+def age(cache, symbol, seconds):
+    """make the cached quote of the symbol older by the seconds."""
+    with cache.db_lock, cache.conn:
+        cache.conn.execute(
+            "UPDATE quotes SET fetched_at = fetched_at - ? WHERE key = ?",
+            (seconds, cache.key(symbol)),
+        )
+
+
+def test_ttl_of_the_fields_read(cache):
+    cache.put("SBIN.NS", {"price": 1})
+    age(cache, "SBIN.NS", 120)
+
+    assert cache.get("SBIN.NS") is None
+    assert cache.get("SBIN.NS", ["NAME"]) == {"price": 1}
+    assert cache.get("SBIN.NS", ["NAME", "LAST_PRICE"]) is None
+
+
+def test_least_recently_used_evicted(cache):
+    cache.put("A.NS", {"price": 1})
+    cache.put("B.NS", {"price": 2})
+    time.sleep(0.01)
+    assert cache.get("A.NS") == {"price": 1}
+    cache.put("C.NS", {"price": 3})
+
+    assert cache.get("A.NS") == {"price": 1}
+    assert cache.get("B.NS") is None
+    assert cache.get("C.NS") == {"price": 3}
+
+
+def test_concurrent_misses_fetch_once(cache):
+    calls = []
+    started = threading.Barrier(8)
+
+    def fetcher(symbol):
+        calls.append(symbol)
+        time.sleep(0.2)
+        return {"price": 1}
+
+    def ask():
+        started.wait()
+        results.append(cache.get_or_fetch("SBIN.NS", fetcher))
+
+    results = []
+    threads = [threading.Thread(target=ask) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert calls == ["SBIN.NS"]
+    assert results == [{"price": 1}] * 8
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["coalesced"] + stats["hits"] == 7
+
+
+def test_hits_counted_in_memory_until_flushed(cache):
+    cache.get_or_fetch("SBIN.NS", lambda symbol: {"price": 1})
+    cache.get_or_fetch("SBIN.NS", lambda symbol: {"price": 2})
+
+    with cache.db_lock:
+        stored = dict(cache.conn.execute("SELECT name, count FROM stats").fetchall())
+    assert "hits" not in stored
+    assert cache.stats()["hits"] == 1
+
+
+def test_replayed_quotes_not_served_live(cache, tmp_path, configuration, monkeypatch):
+    cache.put("SBIN.NS", {"price": 1})
+    monkeypatch.setattr(configuration, "REPLAY_MODE", ReplayMode.REPLAY)
+    replay_cache = QuoteCache(path=str(tmp_path / "quotes.sqlite"))
+
+    assert replay_cache.get("SBIN.NS") is None
+
+
+def test_concurrent_async_misses_fetch_once(cache):
+    calls = []
+
+    async def fetcher(symbol):
+        calls.append(symbol)
+        await asyncio.sleep(0.2)
+        return {"price": 1}
+
+    async def ask_all():
+        return await asyncio.gather(
+            *(cache.get_or_fetch_async("SBIN.NS", fetcher, ["NAME"]) for _ in range(8))
+        )
+
+    results = asyncio.run(ask_all())
+
+    assert calls == ["SBIN.NS"]
+    assert results == [{"price": 1}] * 8
+    assert cache.stats() == {"hits": 0, "misses": 1, "coalesced": 7}
+    assert cache.inflight_tasks == {}
@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import pytest
+
+from lib.resilience import (
+    CircuitOpenError,
+    FailureKind,
+    ProviderError,
+    ProviderGuard,
+)
+
+
+class Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class HTTPError(Exception):
+    """an HTTP error of the provider library, carrying its response."""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status {status_code}")
+        self.response = Response(status_code, headers)
+
+
+class Flaky:
+    """provider function failing with the given errors before answering."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "answer"
+
+
+@pytest.fixture
+def guard(configuration, monkeypatch):
+    monkeypatch.setattr(configuration, "RETRY_BASE_DELAY", 0)
+    monkeypatch.setattr(configuration, "RETRY_ATTEMPTS", 3)
+    monkeypatch.setattr(configuration, "BREAKER_THRESHOLD", 3)
+    monkeypatch.setattr(configuration, "BREAKER_COOLDOWN", 0.2)
+    return ProviderGuard("stub", rate=1000, burst=100)
+
+
+def test_backoff_full_jitter_capped(configuration, monkeypatch):
+    monkeypatch.setattr(configuration, "RETRY_BASE_DELAY", 1)
+    monkeypatch.setattr(configuration, "RETRY_MAX_DELAY", 30)
+
+    delays = [ProviderGuard.backoff(attempt) for attempt in range(8) for _ in range(50)]
+
+    assert all(0 <= delay <= 30 for delay in delays)
+    assert max(delays[:50]) <= 1
+    assert max(delays[-50:]) > 1
+
+
+def test_backoff_honours_retry_after(configuration, monkeypatch):
+    monkeypatch.setattr(configuration, "RETRY_MAX_DELAY", 30)
+
+    assert ProviderGuard.backoff(0, HTTPError(429, {"Retry-After": "7"})) == 7
+    assert ProviderGuard.backoff(0, HTTPError(429, {"Retry-After": "120"})) == 30
+
+
+def test_retryable_failures_retried(guard):
+    func = Flaky(HTTPError(503), HTTPError(429))
+
+    assert guard.call(func) == "answer"
+    assert func.calls == 3
+    metrics = guard.metrics()
+    assert metrics["calls"] == 3 and metrics["retries"] == 2
+    assert metrics["consecutive_failures"] == 0
+
+
+def test_client_failures_not_retried_nor_counted_by_the_breaker(guard):
+    for _ in range(3):
+        with pytest.raises(ProviderError) as err:
+            guard.call(Flaky(HTTPError(404)))
+        assert err.value.kind == FailureKind.CLIENT
+
+    metrics = guard.metrics()
+    assert metrics["failures_client"] == 3
+    assert metrics["consecutive_failures"] == 0
+    assert metrics["breaker"] == "closed"
+
+
+def test_breaker_opens_half_opens_and_closes(guard):
+    with pytest.raises(ProviderError):
+        guard.call(Flaky(HTTPError(500), HTTPError(500), HTTPError(500)))
+    assert guard.metrics()["breaker"] == "open"
+
+    # open, the calls are rejected without reaching the provider.
+    func = Flaky()
+    with pytest.raises(CircuitOpenError):
+        guard.call(func)
+    assert func.calls == 0
+
+    # half open after the cool down, a single trial call goes through.
+    time.sleep(0.25)
+    assert guard.metrics()["breaker"] == "half open"
+    guard.admit()
+    with pytest.raises(CircuitOpenError):
+        guard.admit()
+
+    # the trial call answering closes the breaker.
+    guard.record_success()
+    assert guard.call(func) == "answer"
+    assert guard.metrics()["breaker"] == "closed"
+    assert guard.metrics()["rejected"] == 2
+
+
+def test_async_calls_share_the_guard(guard):
+    attempts = []
+
+    async def fetch():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise HTTPError(502)
+        return "answer"
+
+    assert asyncio.run(guard.call_async(fetch)) == "answer"
+    assert guard.metrics()["retries"] == 1
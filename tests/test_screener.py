@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from constants.stocks import InfoKeys, RawInfoKeys
+from lib.screener import Screener
+
+NAN = float("nan")
+
+
+def naive_ranks(values):
+    """share of the valid values below each one, the ties counted half."""
+    valid = values[~np.isnan(values)]
+    return np.array(
+        [
+            (
+                NAN
+                if np.isnan(value)
+                else round(
+                    ((valid < value).sum() + (valid == value).sum() / 2)
+                    * 100
+                    / len(valid),
+                    2,
+                )
+            )
+            for value in values
+        ]
+    )
+
+
+@pytest.fixture
+def scan_df():
+    # price, EMA 20, last close, year high, RSI, EMA delta, bands and ADX, stochastic.
+    rows = [
+        ("A", 100, 90, 95, 200, 70, 11.1, 120, 80, 30, 60, 50),
+        ("B", 80, 90, 85, 100, 30, -11.1, 120, 85, 30, 60, 50),
+        ("C", 50, 40, 50, 50, 30, 25.0, 60, 45, 30, 60, 50),
+        ("D", NAN, 40, 50, NAN, NAN, NAN, NAN, NAN, NAN, NAN, NAN),
+        ("A", 1, 1, 1, 1, 1, 1, 1, 1, 1, 1, 1),
+    ]
+    return pd.DataFrame(
+        rows,
+        columns=[
+            InfoKeys.SYMBOL,
+            InfoKeys.LAST_PRICE,
+            InfoKeys.EMA_20,
+            RawInfoKeys.LAST_CLOSE.name,
+            RawInfoKeys.YEAR_HIGH.name,
+            InfoKeys.RSI,
+            InfoKeys.EMA_DELTA,
+            InfoKeys.BB_HIGH,
+            InfoKeys.BB_LOW,
+            InfoKeys.ADX,
+            InfoKeys.STOCH_K,
+            InfoKeys.STOCH_D,
+        ],
+    )
+
+
+def test_percentile_ranks_match_the_naive_ones():
+    rng = np.random.default_rng(3)
+    values = rng.integers(0, 10, size=(200, 3)).astype(float)
+    values[rng.random(values.shape) < 0.1] = NAN
+    values[:, 2] = NAN
+
+    ranks = Screener.percentile_ranks(values)
+
+    for col in range(2):
+        np.testing.assert_array_equal(ranks[:, col], naive_ranks(values[:, col]))
+    assert np.isnan(ranks[:, 2]).all()
+
+
+def test_ranks_of_the_scan(scan_df):
+    screen_df = Screener(scan_df).frame()
+
+    assert list(screen_df[InfoKeys.SYMBOL]) == ["A", "B", "C", "D"]
+    assert list(screen_df["RSI_RANK"].fillna(-1)) == [83.33, 33.33, 33.33, -1]
+    assert list(screen_df[Screener.FROM_YEAR_HIGH].fillna(-1)) == pytest.approx(
+        [-50, -20, 0, -1]
+    )
+    assert list(screen_df["YEAR_HIGH_RANK"].fillna(-1)) == [16.67, 50, 83.33, -1]
+
+
+def test_breadth_of_the_symbols_having_the_inputs(scan_df):
+    breadth = Screener(scan_df).breadth()
+
+    assert breadth == {
+        "SYMBOLS": 4,
+        "ABOVE_EMA_20": pytest.approx(66.67),
+        "ADVANCING": pytest.approx(33.33),
+        "BUY_ZONE": pytest.approx(33.33),
+    }
+
+
+def test_top_symbols_without_a_value_last(scan_df):
+    screener = Screener(scan_df)
+
+    assert list(screener.top("EMA_DELTA_RANK", 2)[InfoKeys.SYMBOL]) == ["C", "A"]
+    assert list(screener.top("EMA_DELTA_RANK", 4, ascending=True)[InfoKeys.SYMBOL]) == [
+        "B",
+        "A",
+        "C",
+        "D",
+    ]
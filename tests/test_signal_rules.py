@@ -0,0 +1,110 @@
+import pandas as pd
+import pytest
+
+from constants.stocks import InfoKeys
+from lib.signal_rules import SignalRules
+from lib.utils import Utils
+
+
+def baseline_signal(info):
+    """the trade signal as Nifty.guess_trade_signal labelled it before the rules."""
+    signal = ""
+    if 0 < info[InfoKeys.ADX] <= 25:
+        signal = "Weak"
+    elif 25 < info[InfoKeys.ADX] <= 50:
+        signal = "Strong"
+    elif 50 < info[InfoKeys.ADX] <= 75:
+        signal = "Fairly Strong"
+    elif info[InfoKeys.ADX] > 75:
+        signal = "Extremely Strong"
+
+    msg = ""
+    stoch_diff = Utils.percentage_diff(info[InfoKeys.STOCH_D], info[InfoKeys.STOCH_K])
+    if -7.5 <= stoch_diff <= 7.5:
+        msg = "Breakout"
+    elif info[InfoKeys.STOCH_K] > 80 or info[InfoKeys.STOCH_K] < 20:
+        msg = "Reversal"
+    elif 20 < info[InfoKeys.STOCH_K] < 80:
+        if stoch_diff < -7.5:
+            msg = "Uptrend"
+        else:
+            msg = "Downtrend"
+    if info[InfoKeys.STOCH_K] > info[InfoKeys.STOCH_D]:
+        msg += " Rise"
+    else:
+        msg += " Fall"
+    signal += f" {msg}"
+
+    if info[InfoKeys.LAST_PRICE] > info[InfoKeys.BB_HIGH]:
+        msg = "Sell."
+    elif info[InfoKeys.LAST_PRICE] < info[InfoKeys.BB_LOW]:
+        msg = "Buy."
+    else:
+        msg = "."
+    signal += f" {msg}"
+    return signal
+
+
+# adx, %K, %D, price, upper and lower band.
+CASES = {
+    "weak breakout rise": (20, 52, 50, 100, 110, 90),
+    "adx at 25 is weak": (25, 30, 50, 100, 110, 90),
+    "adx past 25 is strong": (25.01, 30, 50, 100, 110, 90),
+    "adx at 50 is strong": (50, 90, 50, 111, 110, 90),
+    "fairly strong": (75, 10, 50, 89, 110, 90),
+    "extremely strong": (75.01, 60, 40, 100, 110, 90),
+    "no adx, leading space": (0, 52, 50, 100, 110, 90),
+    "negative adx": (-3, 52, 50, 100, 110, 90),
+    "breakout at -7.5": (30, 86, 80, 100, 110, 90),
+    "breakout at 7.5": (30, 74, 80, 100, 110, 90),
+    "uptrend": (30, 70, 50, 100, 110, 90),
+    "downtrend": (30, 40, 60, 100, 110, 90),
+    "reversal above 80": (30, 95, 60, 100, 110, 90),
+    "reversal below 20": (30, 10, 40, 100, 110, 90),
+    "%K at 80, no momentum, double space": (30, 80, 50, 100, 110, 90),
+    "%K at 20, no momentum, double space": (30, 20, 50, 100, 110, 90),
+    "%K equal to %D falls": (30, 50, 50, 100, 110, 90),
+    "%D zero": (30, 50, 0, 100, 110, 90),
+    "price on the upper band": (30, 52, 50, 110, 110, 90),
+    "price on the lower band": (30, 52, 50, 90, 110, 90),
+    "sell": (30, 52, 50, 110.01, 110, 90),
+    "buy": (30, 52, 50, 89.99, 110, 90),
+}
+
+
+def info(adx, stoch_k, stoch_d, price, bb_high, bb_low):
+    return {
+        InfoKeys.ADX: adx,
+        InfoKeys.STOCH_K: stoch_k,
+        InfoKeys.STOCH_D: stoch_d,
+        InfoKeys.LAST_PRICE: price,
+        InfoKeys.BB_HIGH: bb_high,
+        InfoKeys.BB_LOW: bb_low,
+    }
+
+
+@pytest.fixture(scope="module")
+def rules():
+    return SignalRules()
+
+
+@pytest.mark.parametrize("case", CASES.values(), ids=list(CASES))
+def test_row_signal_matches_the_baseline(rules, case):
+    row = info(*case)
+
+    assert rules.signal_row(row) == baseline_signal(row)
+
+
+def test_frame_signal_matches_the_baseline(rules):
+    frame = pd.DataFrame([info(*case) for case in CASES.values()])
+
+    signals = rules.signal_frame(frame)
+
+    assert list(signals[InfoKeys.SIGNAL].astype(str)) == [
+        baseline_signal(info(*case)) for case in CASES.values()
+    ]
+
+
+def test_double_space_signals(rules):
+    assert rules.signal_row(info(30, 80, 50, 100, 110, 90)) == "Strong  Rise ."
+    assert rules.signal_row(info(0, 52, 50, 100, 110, 90)) == " Breakout Rise ."